@@ -8,7 +8,7 @@ from .models import (
     UsuarioPersonalizado, Rol, Farmacia, Motorista, Moto, 
     Comuna, Region, ContactoEmergencia, LicenciaMotorista,
     DocumentacionMoto, AsignacionMotoristaFarmacia, Despacho,
-    TipoDespacho, RecetaDespacho, Incidencia
+    TipoDespacho, RecetaDespacho, Incidencia, DespachoEvento, DespachoResumenDiario
 )
 
 
@@ -88,6 +88,17 @@ class IncidenciaInline(admin.TabularInline):
     readonly_fields = ['fecha_incidencia']
 
 
+class DespachoEventoInline(admin.TabularInline):
+    model = DespachoEvento
+    extra = 0
+    fields = ['fecha', 'estado_anterior', 'estado_nuevo', 'usuario', 'datos']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Despacho)
 class DespachoAdmin(admin.ModelAdmin):
     list_display = ['id_despacho', 'fecha_creacion', 'id_tipo_despacho', 'get_estado_badge', 
@@ -96,7 +107,7 @@ class DespachoAdmin(admin.ModelAdmin):
     search_fields = ['id_despacho', 'codigo_orden_farmacia', 'direccion_entrega']
     date_hierarchy = 'fecha_creacion'
     readonly_fields = ['fecha_creacion', 'fecha_finalizacion']
-    inlines = [IncidenciaInline]
+    inlines = [IncidenciaInline, DespachoEventoInline]
     
     fieldsets = (
         ('Información General', {
@@ -229,6 +240,16 @@ class RecetaDespachoAdmin(admin.ModelAdmin):
     date_hierarchy = 'fecha_emision'
 
 
+@admin.register(DespachoResumenDiario)
+class DespachoResumenDiarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'id_farmacia', 'id_region', 'id_tipo_despacho', 'estado',
+                    'total_despachos', 'total_incidencias']
+    list_filter = ['estado', 'id_tipo_despacho', 'id_region']
+    date_hierarchy = 'fecha'
+    readonly_fields = ['fecha', 'id_farmacia', 'id_region', 'id_tipo_despacho', 'estado',
+                       'total_despachos', 'total_incidencias']
+
+
 # Personalizar el título del admin
 admin.site.site_header = "LogiCo - Administración"
 admin.site.site_title = "LogiCo Admin"
@@ -0,0 +1,259 @@
+"""
+API JSON v1 sobre Despacho, Incidencia, Farmacia, Motorista y Moto
+
+Para las integraciones que hoy leen las páginas HTML. Cada recurso declara
+sus campos públicos (nombre -> ruta del ORM); los de otra tabla van con
+punto y salen anidados ("farmacia_origen.nombre" -> {"farmacia_origen":
+{"nombre": ...}}). Con ?campos=a,b se pide un subconjunto y la consulta
+hace solo los JOIN de esos campos (.values() con las rutas pedidas).
+
+Listados paginados por cursor sobre la clave primaria (?despues=<id>), como
+autocompletar.Fuente.
+
+ETag: antes de serializar se leen solo las claves y las columnas VERSION
+(models.Versionado) de la fila y de las tablas relacionadas que aparecen en
+los campos pedidos. Si coincide con If-None-Match la vista responde 304 sin
+leer ni serializar el resto; PATCH y DELETE aceptan If-Match: la VERSION
+leída con el ETag va en la condición del UPDATE (estados.transicionar), así
+que responden 412 si el despacho cambió, aunque sea entre la comprobación y
+la escritura.
+
+Uso:
+    recurso = RECURSOS['despachos']
+    campos = recurso.elegir(request.GET.get('campos'))
+    etag, claves, siguiente = recurso.version_pagina(queryset, campos, despues)
+    filas = recurso.filas(queryset, campos, claves)
+"""
+import hashlib
+
+from .models import Despacho, Farmacia, Incidencia, Moto, Motorista, Versionado
+
+VERSION_API = 'v1'
+TAMANO_PAGINA = 50
+MAX_TAMANO_PAGINA = 200
+
+
+class CampoInvalido(Exception):
+    """Se pidió un campo o filtro que el recurso no publica"""
+
+
+# ============= RECURSOS =============
+
+class Recurso:
+    """Modelo publicado en la API con sus campos, filtros y campos por defecto"""
+
+    def __init__(self, modelo, campos, por_defecto, filtros=None):
+        self.modelo = modelo
+        self.campos = campos
+        self.por_defecto = por_defecto
+        self.filtros = filtros or {}
+
+    @property
+    def clave(self):
+        return self.modelo._meta.pk.name
+
+    def queryset(self):
+        return self.modelo._default_manager.all()
+
+    def elegir(self, parametro):
+        """Campos pedidos en ?campos= (separados por coma) o los por defecto"""
+        if not parametro:
+            return list(self.por_defecto)
+        campos = list(dict.fromkeys(c.strip() for c in parametro.split(',') if c.strip()))
+        desconocidos = [c for c in campos if c not in self.campos]
+        if desconocidos:
+            raise CampoInvalido(f'Campos desconocidos: {", ".join(desconocidos)}')
+        return campos
+
+    def filtrar(self, queryset, params):
+        """Filtros exactos declarados (?estado=ASIGNADO&farmacia=3)"""
+        for parametro, ruta in self.filtros.items():
+            valor = params.get(parametro)
+            if valor:
+                queryset = queryset.filter(**{ruta: valor})
+        return queryset
+
+    # ---- versión (ETag) ----
+
+    def _rutas_version(self, campos):
+        """VERSION de la fila y de cada tabla versionada que recorren los campos pedidos"""
+        rutas = ['version']
+        for campo in campos:
+            partes = self.campos[campo].split('__')
+            modelo = self.modelo
+            for i, parte in enumerate(partes[:-1]):
+                modelo = modelo._meta.get_field(parte).related_model
+                ruta = '__'.join(partes[:i + 1]) + '__version'
+                if issubclass(modelo, Versionado) and ruta not in rutas:
+                    rutas.append(ruta)
+        return rutas
+
+    @staticmethod
+    def _etag(campos, filas, siguiente=None):
+        contenido = repr((VERSION_API, campos, filas, siguiente)).encode()
+        return '"' + hashlib.md5(contenido).hexdigest() + '"'
+
+    def version_fila(self, queryset, campos, pk):
+        """ETag de una fila, o None si no existe"""
+        return self.etag_y_version(queryset, campos, pk)[0]
+
+    def etag_y_version(self, queryset, campos, pk):
+        """
+        (ETag, VERSION de la propia fila) leídos en la misma consulta, o
+        (None, None) si no existe. La versión es la condición del UPDATE
+        cuando el cliente envía If-Match.
+        """
+        versiones = queryset.filter(pk=pk).values_list(*self._rutas_version(campos)).first()
+        if versiones is None:
+            return None, None
+        return self._etag(campos, [(pk, versiones)]), versiones[0]
+
+    def version_pagina(self, queryset, campos, despues=None, tamano=TAMANO_PAGINA):
+        """(etag, claves de la página, cursor siguiente) leyendo solo claves y versiones"""
+        if despues is not None:
+            queryset = queryset.filter(pk__gt=despues)
+        versiones = list(
+            queryset.order_by('pk').values_list('pk', *self._rutas_version(campos))[:tamano + 1]
+        )
+        siguiente = versiones[tamano - 1][0] if len(versiones) > tamano else None
+        versiones = versiones[:tamano]
+        return self._etag(campos, versiones, siguiente), [fila[0] for fila in versiones], siguiente
+
+    # ---- serialización ----
+
+    def filas(self, queryset, campos, claves):
+        """Dicts anidados de las filas `claves`, en el orden de las claves"""
+        rutas = [self.campos[campo] for campo in campos]
+        por_clave = {
+            fila[self.clave]: fila
+            for fila in queryset.filter(pk__in=claves).order_by().values(*dict.fromkeys([self.clave, *rutas]))
+        }
+        return [self._anidar(por_clave[clave], campos) for clave in claves if clave in por_clave]
+
+    def _anidar(self, fila, campos):
+        resultado = {}
+        for campo in campos:
+            destino = resultado
+            *grupos, nombre = campo.split('.')
+            for grupo in grupos:
+                destino = destino.setdefault(grupo, {})
+            destino[nombre] = fila[self.campos[campo]]
+        return resultado
+
+
+RECURSOS = {
+    'despachos': Recurso(
+        Despacho,
+        {
+            'id': 'id_despacho',
+            'version': 'version',
+            'estado': 'estado',
+            'fecha_creacion': 'fecha_creacion',
+            'fecha_finalizacion': 'fecha_finalizacion',
+            'actualizado_en': 'actualizado_en',
+            'direccion_entrega': 'direccion_entrega',
+            'codigo_orden': 'codigo_orden_farmacia',
+            'observaciones': 'observaciones',
+            'tipo.id': 'id_tipo_despacho',
+            'tipo.nombre': 'id_tipo_despacho__nombre_tipo',
+            'farmacia_origen.id': 'id_farmacia_origen',
+            'farmacia_origen.nombre': 'id_farmacia_origen__nombre_farmacia',
+            'farmacia_secundaria.id': 'id_farmacia_origen_secundaria',
+            'farmacia_secundaria.nombre': 'id_farmacia_origen_secundaria__nombre_farmacia',
+            'motorista.id': 'id_motorista',
+            'motorista.nombre': 'id_motorista__nombre',
+            'motorista.apellido_paterno': 'id_motorista__apellido_paterno',
+            'moto.id': 'id_moto',
+            'moto.patente': 'id_moto__patente',
+            'despacho_original.id': 'id_despacho_original',
+        },
+        por_defecto=[
+            'id', 'version', 'estado', 'fecha_creacion', 'fecha_finalizacion', 'actualizado_en',
+            'direccion_entrega', 'codigo_orden', 'tipo.nombre', 'farmacia_origen.id', 'motorista.id', 'moto.id',
+        ],
+        filtros={
+            'estado': 'estado',
+            'farmacia': 'id_farmacia_origen',
+            'motorista': 'id_motorista',
+            'moto': 'id_moto',
+        },
+    ),
+    'incidencias': Recurso(
+        Incidencia,
+        {
+            'id': 'id_incidencia',
+            'version': 'version',
+            'tipo': 'tipo_incidencia',
+            'descripcion': 'descripcion',
+            'fecha': 'fecha_incidencia',
+            'resuelto': 'resuelto',
+            'actualizado_en': 'actualizado_en',
+            'despacho.id': 'id_despacho',
+            'despacho.estado': 'id_despacho__estado',
+        },
+        por_defecto=['id', 'version', 'tipo', 'descripcion', 'fecha', 'resuelto', 'actualizado_en', 'despacho.id'],
+        filtros={'despacho': 'id_despacho', 'tipo': 'tipo_incidencia', 'resuelto': 'resuelto'},
+    ),
+    'farmacias': Recurso(
+        Farmacia,
+        {
+            'id': 'codigo_farmacia',
+            'version': 'version',
+            'nombre': 'nombre_farmacia',
+            'direccion': 'direccion',
+            'telefono': 'telefono',
+            'horario_apertura': 'horario_apertura',
+            'horario_cierre': 'horario_cierre',
+            'latitud': 'latitud',
+            'longitud': 'longitud',
+            'comuna.id': 'id_comuna',
+            'comuna.nombre': 'id_comuna__nombre_comuna',
+        },
+        por_defecto=['id', 'version', 'nombre', 'direccion', 'telefono', 'comuna.id'],
+        filtros={'comuna': 'id_comuna'},
+    ),
+    'motoristas': Recurso(
+        Motorista,
+        {
+            'id': 'codigo_motorista',
+            'version': 'version',
+            'rut': 'rut',
+            'nombre': 'nombre',
+            'apellido_paterno': 'apellido_paterno',
+            'apellido_materno': 'apellido_materno',
+            'telefono': 'telefono',
+            'correo': 'correo',
+            'comuna.id': 'id_comuna',
+            'comuna.nombre': 'id_comuna__nombre_comuna',
+        },
+        por_defecto=['id', 'version', 'rut', 'nombre', 'apellido_paterno', 'apellido_materno', 'telefono'],
+        filtros={'comuna': 'id_comuna'},
+    ),
+    'motos': Recurso(
+        Moto,
+        {
+            'id': 'codigo_moto',
+            'version': 'version',
+            'patente': 'patente',
+            'marca': 'marca',
+            'modelo': 'modelo',
+            'color': 'color',
+            'anio': 'anio',
+            'motorista.id': 'id_motorista_asignado',
+            'motorista.nombre': 'id_motorista_asignado__nombre',
+            'motorista.apellido_paterno': 'id_motorista_asignado__apellido_paterno',
+        },
+        por_defecto=['id', 'version', 'patente', 'marca', 'modelo', 'motorista.id'],
+        filtros={'motorista': 'id_motorista_asignado'},
+    ),
+}
+
+
+# ============= CONDICIONES HTTP =============
+
+def etag_coincide(encabezado, etag):
+    """True si `etag` está en un If-None-Match / If-Match (acepta W/ y *)"""
+    if not encabezado or etag is None:
+        return False
+    etiquetas = [parte.strip() for parte in encabezado.split(',')]
+    return '*' in etiquetas or etag in (e[2:] if e.startswith('W/') else e for e in etiquetas)
@@ -10,3 +10,7 @@ class AppdiscoproConfig(AppConfig):
     # Usamos 'AppDiscopro' porque algunas migraciones existentes referencian
     # el app label con mayúsculas y cambiarlo evita NodeNotFoundError.
     label = 'AppDiscopro'
+
+    def ready(self):
+        # Registrar señales (resumen diario de despachos, etc.)
+        from . import signals  # noqa: F401
@@ -0,0 +1,215 @@
+"""
+Asignación masiva de motoristas a farmacias
+
+Un plan es una lista de entradas {'farmacia', 'motorista', 'activo'}:
+- activo=True  deja la asignación activa (la crea o reactiva la existente,
+               respetando la unicidad (id_farmacia, id_motorista)).
+- activo=False desactiva la asignación si existe.
+Con reemplazar=True el plan es el conjunto completo de motoristas activos
+de cada farmacia mencionada: las asignaciones activas que no aparecen se
+desactivan.
+
+aplicar_plan() valida todo el plan, lo aplica con bulk_create/bulk_update
+en una sola transacción y retorna un ResultadoPlan con el diff. Si hay
+errores no se aplica ningún cambio. El bloqueo de las asignaciones
+existentes no alcanza a las que otro plan crea al mismo tiempo: si dos
+planes insertan el mismo par, el segundo choca con la unicidad y se
+informa como conflicto (resultado.conflicto) sin aplicar nada.
+
+Lo usan el comando `asignar_motoristas`, la vista asignacion_masiva (JSON)
+y los formularios de farmacia_detail.
+"""
+import csv
+import json
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import AsignacionMotoristaFarmacia, Farmacia, Motorista
+from .recomendacion import INDICE
+
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí', 's', 'yes', 'y', 'activo'}
+VALORES_FALSOS = {'0', 'false', 'no', 'n', 'inactivo'}
+
+
+class PlanInvalido(Exception):
+    """El plan no se pudo leer (formato, columnas o valores)"""
+
+
+class ResultadoPlan:
+    """Diff de un plan: listas de pares (farmacia, motorista)"""
+
+    def __init__(self):
+        self.creadas = []
+        self.reactivadas = []
+        self.desactivadas = []
+        self.sin_cambios = []
+        self.errores = []
+        self.aplicado = False
+        self.conflicto = False
+
+    @property
+    def total_cambios(self):
+        return len(self.creadas) + len(self.reactivadas) + len(self.desactivadas)
+
+    def como_dict(self):
+        return {
+            'aplicado': self.aplicado,
+            'creadas': self.creadas,
+            'reactivadas': self.reactivadas,
+            'desactivadas': self.desactivadas,
+            'sin_cambios': len(self.sin_cambios),
+            'errores': self.errores,
+        }
+
+
+# ============= LECTURA DE PLANES =============
+
+def _booleano(valor, fila):
+    if isinstance(valor, bool):
+        return valor
+    if valor is None or str(valor).strip() == '':
+        return True
+    texto = str(valor).strip().lower()
+    if texto in VALORES_VERDADEROS:
+        return True
+    if texto in VALORES_FALSOS:
+        return False
+    raise PlanInvalido(f'Fila {fila}: valor de "activo" inválido: {valor!r}')
+
+
+def _entero(valor, columna, fila):
+    try:
+        return int(str(valor).strip())
+    except (TypeError, ValueError):
+        raise PlanInvalido(f'Fila {fila}: "{columna}" debe ser un código numérico ({valor!r})')
+
+
+def normalizar_plan(entradas):
+    """Convierte dicts crudos (CSV/JSON) en [(farmacia, motorista, activo)]"""
+    plan = []
+    for fila, entrada in enumerate(entradas, start=1):
+        if not isinstance(entrada, dict):
+            raise PlanInvalido(f'Fila {fila}: se esperaba un objeto con farmacia y motorista')
+        faltantes = {'farmacia', 'motorista'} - set(entrada)
+        if faltantes:
+            raise PlanInvalido(f'Fila {fila}: faltan columnas {", ".join(sorted(faltantes))}')
+        plan.append((
+            _entero(entrada['farmacia'], 'farmacia', fila),
+            _entero(entrada['motorista'], 'motorista', fila),
+            _booleano(entrada.get('activo'), fila),
+        ))
+    return plan
+
+
+def leer_plan(archivo, formato):
+    """Lee un plan desde un archivo de texto abierto ('csv' o 'json')"""
+    if formato == 'csv':
+        return normalizar_plan(csv.DictReader(archivo))
+    if formato == 'json':
+        try:
+            datos = json.load(archivo)
+        except json.JSONDecodeError as e:
+            raise PlanInvalido(f'JSON inválido: {e}')
+        if isinstance(datos, dict):
+            datos = datos.get('asignaciones', [])
+        if not isinstance(datos, list):
+            raise PlanInvalido('"asignaciones" debe ser una lista')
+        return normalizar_plan(datos)
+    raise PlanInvalido(f'Formato no soportado: {formato}')
+
+
+# ============= APLICACIÓN =============
+
+def aplicar_plan(plan, reemplazar=False, simular=False):
+    """
+    Aplica un plan [(farmacia, motorista, activo)] en una transacción.
+    Con simular=True solo calcula el diff.
+    """
+    resultado = ResultadoPlan()
+
+    deseado = {}
+    for farmacia, motorista, activo in plan:
+        par = (farmacia, motorista)
+        if par in deseado and deseado[par] != activo:
+            resultado.errores.append(f'Farmacia {farmacia} / motorista {motorista}: aparece como activo e inactivo')
+        deseado[par] = activo
+
+    farmacias = {farmacia for farmacia, _ in deseado}
+    motoristas = {motorista for _, motorista in deseado}
+    farmacias_existentes = set(
+        Farmacia.objects.filter(codigo_farmacia__in=farmacias).values_list('codigo_farmacia', flat=True)
+    )
+    motoristas_existentes = set(
+        Motorista.objects.filter(codigo_motorista__in=motoristas).values_list('codigo_motorista', flat=True)
+    )
+    for codigo in sorted(farmacias - farmacias_existentes):
+        resultado.errores.append(f'Farmacia {codigo} no existe')
+    for codigo in sorted(motoristas - motoristas_existentes):
+        resultado.errores.append(f'Motorista {codigo} no existe')
+    if resultado.errores:
+        return resultado
+
+    try:
+        _aplicar(resultado, deseado, farmacias, reemplazar, simular)
+    except IntegrityError:
+        # Otro plan creó alguno de los mismos pares después del bloqueo
+        resultado = ResultadoPlan()
+        resultado.conflicto = True
+        resultado.errores.append(
+            'Otro usuario modificó las asignaciones de estas farmacias al mismo tiempo; vuelva a aplicar el plan'
+        )
+    return resultado
+
+
+@transaction.atomic
+def _aplicar(resultado, deseado, farmacias, reemplazar, simular):
+    """Calcula el diff con las asignaciones bloqueadas y lo aplica (salvo simular)"""
+    # Bloquea las asignaciones de las farmacias del plan mientras se calcula el diff
+    existentes = {
+        (a.id_farmacia_id, a.id_motorista_id): a
+        for a in AsignacionMotoristaFarmacia.objects.select_for_update().filter(id_farmacia__in=farmacias)
+    }
+
+    if reemplazar:
+        for par, asignacion in existentes.items():
+            if asignacion.es_activo and par not in deseado:
+                deseado[par] = False
+
+    ahora = timezone.now()
+    crear, actualizar = [], []
+    for par, activo in sorted(deseado.items()):
+        asignacion = existentes.get(par)
+        if asignacion is None:
+            if activo:
+                crear.append(AsignacionMotoristaFarmacia(
+                    id_farmacia_id=par[0], id_motorista_id=par[1], es_activo=True
+                ))
+                resultado.creadas.append(par)
+            else:
+                resultado.sin_cambios.append(par)
+        elif asignacion.es_activo == activo:
+            resultado.sin_cambios.append(par)
+        else:
+            asignacion.es_activo = activo
+            asignacion.actualizado_en = ahora
+            if activo:
+                asignacion.fecha_asignacion = ahora
+                resultado.reactivadas.append(par)
+            else:
+                resultado.desactivadas.append(par)
+            actualizar.append(asignacion)
+
+    if not simular:
+        AsignacionMotoristaFarmacia.objects.bulk_create(crear)
+        AsignacionMotoristaFarmacia.objects.bulk_update(actualizar, ['es_activo', 'fecha_asignacion', 'actualizado_en'])
+        resultado.aplicado = True
+        # bulk_create/bulk_update no emiten señales: se avisa al índice de recomendación
+        transaction.on_commit(lambda: _actualizar_indice(resultado))
+
+
+def _actualizar_indice(resultado):
+    for farmacia, motorista in resultado.creadas + resultado.reactivadas:
+        INDICE.asignacion(farmacia, motorista, True)
+    for farmacia, motorista in resultado.desactivadas:
+        INDICE.asignacion(farmacia, motorista, False)
@@ -0,0 +1,100 @@
+"""
+Autenticación con rol precargado
+
+- BackendUsuarioConRol: carga el usuario de la sesión junto con su rol en
+  una sola consulta (select_related), así request.user.id_rol no genera una
+  consulta adicional en decoradores, mixins y plantillas.
+- RolSesionMiddleware: guarda en la sesión el nombre del rol y sus permisos
+  y expone request.permisos, calculado una vez por request.
+- permisos_rol: context processor que publica `permisos` en las plantillas
+  (permisos.ver_reportes, permisos.rol_display, ...).
+
+Configuración (settings.py):
+    AUTHENTICATION_BACKENDS = ['AppDiscopro.autenticacion.BackendUsuarioConRol']
+    MIDDLEWARE: 'AppDiscopro.autenticacion.RolSesionMiddleware' después de
+                AuthenticationMiddleware
+    context_processors: 'AppDiscopro.autenticacion.permisos_rol'
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import SimpleLazyObject
+
+from .models import Rol
+
+CLAVE_SESION_ROL = '_rol_usuario'
+PERMISOS_CONOCIDOS = sorted({permiso for permisos in Rol.PERMISOS.values() for permiso in permisos})
+
+
+class BackendUsuarioConRol(ModelBackend):
+    """ModelBackend que trae el rol del usuario en la misma consulta"""
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('id_rol').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class PermisosUsuario:
+    """
+    Rol y permisos del usuario del request.
+    Cada permiso conocido es un atributo booleano: permisos.ver_reportes
+    """
+
+    def __init__(self, rol=None, rol_display='Sin rol', permisos=()):
+        self.rol = rol
+        self.rol_display = rol_display
+        self.conjunto = frozenset(permisos)
+        for permiso in PERMISOS_CONOCIDOS:
+            setattr(self, permiso, permiso in self.conjunto)
+
+    def tiene_rol(self, *roles):
+        return self.rol in roles
+
+
+SIN_PERMISOS = PermisosUsuario()
+
+
+def permisos_de(request):
+    """
+    Retorna los PermisosUsuario del request. El rol se toma de la sesión;
+    solo se recalcula si falta o si el usuario cambió de rol.
+    """
+    user = request.user
+    if not user.is_authenticated or not getattr(user, 'id_rol_id', None):
+        return SIN_PERMISOS
+
+    sesion = getattr(request, 'session', None)
+    datos = sesion.get(CLAVE_SESION_ROL) if sesion is not None else None
+    if not datos or datos.get('id_rol') != user.id_rol_id:
+        rol = user.id_rol
+        datos = {
+            'id_rol': rol.id_rol,
+            'nombre_rol': rol.nombre_rol,
+            'rol_display': rol.get_nombre_rol_display(),
+            'permisos': list(rol.permisos),
+        }
+        if sesion is not None:
+            sesion[CLAVE_SESION_ROL] = datos
+    return PermisosUsuario(datos['nombre_rol'], datos['rol_display'], datos['permisos'])
+
+
+class RolSesionMiddleware:
+    """Agrega request.permisos (perezoso, se calcula una vez por request)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.permisos = SimpleLazyObject(lambda: permisos_de(request))
+        return self.get_response(request)
+
+
+def permisos_rol(request):
+    """Context processor: `permisos` en todas las plantillas"""
+    permisos = getattr(request, 'permisos', None)
+    if permisos is None:
+        permisos = SimpleLazyObject(lambda: permisos_de(request))
+    return {'permisos': permisos}
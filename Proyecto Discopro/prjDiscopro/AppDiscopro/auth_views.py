@@ -16,6 +16,8 @@ from .forms import (
     EditarPerfilForm
 )
 from .decorators import gerente_requerido, GerenteRequeridoMixin
+from .busqueda import buscar
+from . import catalogos
 import logging
 
 logger = logging.getLogger('AppDiscopro')
@@ -174,11 +176,7 @@ class UsuariosListView(GerenteRequeridoMixin, ListView):
         rol = self.request.GET.get('rol')
         
         if query:
-            queryset = queryset.filter(
-                Q(nombre_usuario__icontains=query) |
-                Q(nombre_completo__icontains=query) |
-                Q(correo__icontains=query)
-            )
+            queryset = buscar(queryset, query)
         
         if rol:
             queryset = queryset.filter(id_rol__nombre_rol=rol)
@@ -188,7 +186,7 @@ class UsuariosListView(GerenteRequeridoMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['query'] = self.request.GET.get('q', '')
-        context['roles'] = Rol.objects.all()
+        context['roles'] = catalogos.ROLES.todos()
         context['rol_filtro'] = self.request.GET.get('rol', '')
         
         # Estadísticas
@@ -256,7 +254,7 @@ def usuario_cambiar_rol_view(request, pk):
             return redirect('usuarios_list')
         
         try:
-            nuevo_rol = Rol.objects.get(id_rol=nuevo_rol_id)
+            nuevo_rol = catalogos.ROLES.por_pk(nuevo_rol_id)
             rol_anterior = usuario.id_rol.get_nombre_rol_display()
             usuario.id_rol = nuevo_rol
             usuario.save()
@@ -0,0 +1,83 @@
+"""
+Fuentes de autocompletado para los selectores de los formularios de despacho
+
+Cada fuente describe un modelo, el subconjunto de registros elegibles y el
+texto de cada opción. La usan:
+- la vista `autocompletar` (JSON paginado por cursor sobre la clave primaria,
+  con la búsqueda indexada de busqueda.buscar), y
+- el widget forms.AutocompletarSelect, que al renderizar solo consulta el
+  texto de la opción seleccionada.
+
+La validación sigue siendo la del ModelChoiceField del formulario
+(queryset.get(pk=...)): una fuente solo decide qué se ofrece al buscar.
+
+Uso: FUENTES['motorista'].pagina('gonz', despues=None)
+"""
+from .busqueda import buscar
+from .models import Despacho, Farmacia, Moto, Motorista
+from .reenvios import pendientes_de_reenvio
+
+TAMANO_PAGINA = 20
+
+
+class Fuente:
+    """Registros ofrecidos por un selector y su texto"""
+
+    def __init__(self, modelo, campos, texto, base=None):
+        self.modelo = modelo
+        self.campos = campos
+        self.texto = texto
+        self.base = base or modelo._default_manager.all
+
+    @property
+    def clave(self):
+        return self.modelo._meta.pk.name
+
+    def queryset(self):
+        return self.base()
+
+    def _opciones(self, queryset):
+        return [
+            {'id': fila[self.clave], 'texto': self.texto(fila)}
+            for fila in queryset.values(self.clave, *self.campos)
+        ]
+
+    def pagina(self, q, despues=None, tamano=TAMANO_PAGINA):
+        """Resultados de la búsqueda `q` después del cursor: (opciones, siguiente)"""
+        queryset = buscar(self.queryset(), q)
+        if despues is not None:
+            queryset = queryset.filter(**{f'{self.clave}__gt': despues})
+        opciones = self._opciones(queryset.order_by(self.clave)[:tamano + 1])
+        hay_mas = len(opciones) > tamano
+        opciones = opciones[:tamano]
+        return opciones, opciones[-1]['id'] if hay_mas else None
+
+    def etiquetas(self, claves):
+        """Opciones de las claves dadas (las que no existen se omiten)"""
+        if not claves:
+            return []
+        return self._opciones(self.modelo._default_manager.filter(**{f'{self.clave}__in': claves}))
+
+
+FUENTES = {
+    'farmacia': Fuente(
+        Farmacia, ['nombre_farmacia'],
+        lambda f: f"{f['codigo_farmacia']} - {f['nombre_farmacia']}",
+    ),
+    'motorista': Fuente(
+        Motorista, ['nombre', 'apellido_paterno', 'rut'],
+        lambda m: f"{m['nombre']} {m['apellido_paterno']} ({m['rut']})",
+    ),
+    'moto': Fuente(
+        Moto, ['patente', 'marca', 'modelo'],
+        lambda m: f"{m['patente']} - {m['marca']} {m['modelo']}",
+    ),
+    'despacho_fallido': Fuente(
+        Despacho, ['codigo_orden_farmacia', 'id_farmacia_origen__nombre_farmacia', 'direccion_entrega'],
+        lambda d: (
+            f"Despacho #{d['id_despacho']} - {d['id_farmacia_origen__nombre_farmacia']} - "
+            f"{d['direccion_entrega']} ({d['codigo_orden_farmacia'] or 'sin orden'})"
+        ),
+        base=pendientes_de_reenvio,
+    ),
+}
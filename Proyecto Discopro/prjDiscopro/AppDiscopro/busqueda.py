@@ -0,0 +1,185 @@
+"""
+Búsqueda de los listados (farmacias, motoristas, motos, despachos y usuarios)
+
+En lugar de encadenar `__icontains` (LIKE '%q%', que recorre la tabla
+completa) cada registro se descompone en términos normalizados que se guardan
+en IndiceBusqueda. Una búsqueda se resuelve con `termino LIKE 'q%'` sobre el
+índice (modelo, termino, objeto_id), con atajos exactos para IDs numéricos,
+RUT y patente.
+
+Uso: buscar(Farmacia, 'cruz') o buscar(queryset, request.GET.get('q'))
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from .models import Despacho, Farmacia, IndiceBusqueda, Moto, Motorista, UsuarioPersonalizado
+
+LARGO_TERMINO = 50
+TAMANO_LOTE = 1000
+
+# Campos indexados por modelo
+CAMPOS_INDEXADOS = {
+    Farmacia: ['nombre_farmacia', 'direccion', 'telefono'],
+    Motorista: ['nombre', 'apellido_paterno', 'apellido_materno', 'rut', 'correo', 'telefono'],
+    Moto: ['patente', 'marca', 'modelo', 'numero_chasis'],
+    Despacho: ['codigo_orden_farmacia', 'direccion_entrega'],
+    UsuarioPersonalizado: ['nombre_usuario', 'nombre_completo', 'correo'],
+}
+
+# Relaciones cuyo texto también es buscable desde el modelo: (campo FK, modelo)
+RELACIONES_BUSCABLES = {
+    Despacho: [('id_motorista', Motorista)],
+}
+
+PATRON_RUT = re.compile(r'^\d{1,2}\.?\d{3}\.?\d{3}-?[\dkK]$')
+PATRON_PATENTE = re.compile(r'^[A-Za-z]{2,4}-?\d{2,4}$')
+
+
+# ============= NORMALIZACIÓN =============
+
+def normalizar(texto):
+    """Minúsculas y sin tildes"""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return texto.lower()
+
+
+def compactar(texto):
+    """Solo letras y dígitos: '12.345.678-K' -> '12345678k', 'AB-12' -> 'ab12'"""
+    return re.sub(r'[^0-9a-z]', '', normalizar(texto))
+
+
+def tokenizar(texto):
+    """Lista de términos normalizados (sin repetir, en orden)"""
+    terminos = re.split(r'[^0-9a-z]+', normalizar(texto))
+    return list(dict.fromkeys(t[:LARGO_TERMINO] for t in terminos if t))
+
+
+def clave_modelo(modelo):
+    return modelo._meta.label_lower
+
+
+def terminos_de(objeto):
+    """Términos con los que se indexa un registro"""
+    return terminos_de_valores(getattr(objeto, campo) for campo in CAMPOS_INDEXADOS[type(objeto)])
+
+
+def terminos_de_valores(valores):
+    """Términos de los valores de los campos indexados (también lo usa la migración 0011)"""
+    terminos = set()
+    for valor in valores:
+        if not valor:
+            continue
+        terminos.update(tokenizar(valor))
+        # Forma compacta del valor completo (RUT, patente, chasis, correo...)
+        compacto = compactar(valor)
+        if compacto and len(compacto) <= LARGO_TERMINO:
+            terminos.add(compacto)
+    return terminos
+
+
+# ============= MANTENIMIENTO DEL ÍNDICE =============
+
+def indexar(objeto, nuevo=False):
+    """Reemplaza los términos indexados de un registro"""
+    modelo = clave_modelo(type(objeto))
+    with transaction.atomic():
+        if not nuevo:
+            IndiceBusqueda.objects.filter(modelo=modelo, objeto_id=objeto.pk).delete()
+        IndiceBusqueda.objects.bulk_create([
+            IndiceBusqueda(modelo=modelo, termino=termino, objeto_id=objeto.pk)
+            for termino in terminos_de(objeto)
+        ])
+
+
+def desindexar(objeto):
+    IndiceBusqueda.objects.filter(modelo=clave_modelo(type(objeto)), objeto_id=objeto.pk).delete()
+
+
+def reconstruir_indice(modelo):
+    """Regenera el índice completo de un modelo. Retorna la cantidad de registros"""
+    clave = clave_modelo(modelo)
+    campos = [modelo._meta.pk.name] + CAMPOS_INDEXADOS[modelo]
+    total = 0
+    with transaction.atomic():
+        IndiceBusqueda.objects.filter(modelo=clave).delete()
+        lote = []
+        for objeto in modelo._default_manager.only(*campos).order_by().iterator(chunk_size=TAMANO_LOTE):
+            lote.extend(
+                IndiceBusqueda(modelo=clave, termino=termino, objeto_id=objeto.pk)
+                for termino in terminos_de(objeto)
+            )
+            total += 1
+            if len(lote) >= TAMANO_LOTE:
+                IndiceBusqueda.objects.bulk_create(lote)
+                lote = []
+        IndiceBusqueda.objects.bulk_create(lote)
+    return total
+
+
+# ============= BÚSQUEDA =============
+
+def _ids_con_termino(modelo, termino):
+    """Subconsulta con los IDs del modelo que tienen un término con ese prefijo"""
+    # istartswith y no startswith: en MySQL startswith es LIKE BINARY, que no
+    # usa el índice de TERMINO (utf8mb4, intercalación _ci). Los términos ya
+    # están en minúsculas y sin tildes (tokenizar), así que el resultado es el mismo
+    return IndiceBusqueda.objects.filter(
+        modelo=clave_modelo(modelo), termino__istartswith=termino
+    ).values('objeto_id')
+
+
+def _filtro_termino(modelo, termino):
+    filtro = Q(pk__in=_ids_con_termino(modelo, termino))
+    for campo, relacionado in RELACIONES_BUSCABLES.get(modelo, []):
+        filtro |= Q(**{f'{campo}__in': _ids_con_termino(relacionado, termino)})
+    return filtro
+
+
+def _coincidencia_exacta(modelo, q):
+    """Atajos por índice único: RUT de motorista y patente de moto"""
+    if modelo is Motorista and PATRON_RUT.match(q):
+        return Q(rut__iexact=q) | Q(pk__in=IndiceBusqueda.objects.filter(
+            modelo=clave_modelo(Motorista), termino=compactar(q)
+        ).values('objeto_id'))
+    if modelo is Moto and PATRON_PATENTE.match(q):
+        return Q(patente__iexact=q)
+    return None
+
+
+def buscar(origen, q):
+    """
+    Filtra un modelo o queryset por el texto `q`.
+    - Cada término de `q` debe coincidir (como prefijo) con algún término
+      indexado del registro o de sus relaciones buscables.
+    - Un `q` numérico además coincide con la clave primaria.
+    - RUT y patente se buscan primero por igualdad exacta.
+    """
+    queryset = origen if isinstance(origen, QuerySet) else origen._default_manager.all()
+    q = (q or '').strip()
+    if not q:
+        return queryset
+    modelo = queryset.model
+
+    exacto = _coincidencia_exacta(modelo, q)
+    if exacto is not None:
+        coincidencias = queryset.filter(exacto)
+        if coincidencias.exists():
+            return coincidencias
+
+    terminos = tokenizar(q)
+    if not terminos:
+        return queryset.none()
+
+    filtro = Q()
+    for termino in terminos:
+        filtro &= _filtro_termino(modelo, termino)
+    if len(terminos) > 1:
+        # 'AB-05' o '12.345' también coinciden con la forma compacta indexada
+        filtro |= _filtro_termino(modelo, compactar(q)[:LARGO_TERMINO])
+    if q.isdigit():
+        filtro |= Q(pk=int(q))
+    return queryset.filter(filtro)
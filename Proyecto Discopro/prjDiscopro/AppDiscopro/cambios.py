@@ -0,0 +1,199 @@
+"""
+Sincronización incremental: cambios desde un cursor
+
+Despacho, Incidencia y AsignacionMotoristaFarmacia guardan `actualizado_en`
+(indexado junto con la clave primaria) y los borrados dejan una lápida en
+Eliminacion (señal post_delete de signals.py). cambios_desde() recorre cada
+tabla en orden (actualizado_en, clave) por tandas de TAMANO_TANDA y las
+mezcla por fecha con heapq.merge, igual que vencimientos.py; la vista
+api_cambios los envía como NDJSON (una línea por cambio) y termina con una
+línea {"cursor": ..., "mas": true|false}.
+
+El cursor es opaco (base64 de la posición de cada tabla). Solo se entregan
+cambios con más de MARGEN de antigüedad: una transacción que escribió
+actualizado_en antes de confirmar tiene ese margen para hacerlo, así no
+queda detrás de un cursor ya entregado. Sin cursor se entrega todo y las
+lápidas empiezan desde ahora; un cursor con lápidas más viejas que
+RETENCION_ELIMINACIONES (ya purgadas) obliga a sincronizar desde cero.
+
+Uso:
+    posiciones = decodificar_posiciones(request.GET.get('desde'))
+    for linea in cambios_desde(posiciones):
+        ...
+"""
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .api import RECURSOS, Recurso
+from .models import AsignacionMotoristaFarmacia, Despacho, Eliminacion, Farmacia, Incidencia, Moto, Motorista
+
+MARGEN = timedelta(seconds=5)
+TAMANO_TANDA = 500
+MAX_CAMBIOS = 5000           # cambios por respuesta; el cliente sigue con el cursor
+RETENCION_ELIMINACIONES = timedelta(days=90)
+
+# Modelo -> tipo en las lápidas y en las líneas del flujo
+TIPOS_ELIMINACION = {
+    Despacho: 'despacho',
+    Incidencia: 'incidencia',
+    AsignacionMotoristaFarmacia: 'asignacion',
+    Farmacia: 'farmacia',
+    Motorista: 'motorista',
+    Moto: 'moto',
+}
+
+ASIGNACIONES = Recurso(
+    AsignacionMotoristaFarmacia,
+    {
+        'id': 'id_asignacion',
+        'farmacia.id': 'id_farmacia',
+        'motorista.id': 'id_motorista',
+        'activo': 'es_activo',
+        'fecha_asignacion': 'fecha_asignacion',
+        'actualizado_en': 'actualizado_en',
+    },
+    por_defecto=['id', 'farmacia.id', 'motorista.id', 'activo', 'fecha_asignacion', 'actualizado_en'],
+)
+
+
+class CursorInvalido(Exception):
+    """El cursor no se pudo decodificar"""
+
+
+class CursorVencido(Exception):
+    """Las lápidas posteriores al cursor ya se purgaron: hay que sincronizar desde cero"""
+
+
+# ============= FUENTES =============
+
+class Fuente:
+    """Tabla recorrida por (campo de fecha, clave primaria) en tandas"""
+
+    def __init__(self, nombre, modelo, campo):
+        self.nombre = nombre
+        self.modelo = modelo
+        self.campo = campo
+
+    def lineas(self, claves):
+        """Líneas del flujo para las claves de una tanda: {clave: dict}"""
+        raise NotImplementedError
+
+    def recorrer(self, posicion, hasta, tamano=TAMANO_TANDA):
+        """
+        (fecha, nombre, clave, línea) posteriores a `posicion` (fecha, clave)
+        y hasta la fecha `hasta`, en orden
+        """
+        while True:
+            queryset = self.modelo._default_manager.filter(**{f'{self.campo}__lte': hasta})
+            if posicion is not None:
+                fecha, clave = posicion
+                queryset = queryset.filter(
+                    Q(**{f'{self.campo}__gt': fecha}) | Q(**{self.campo: fecha, 'pk__gt': clave})
+                )
+            tanda = list(queryset.order_by(self.campo, 'pk').values_list(self.campo, 'pk')[:tamano])
+            if not tanda:
+                return
+            lineas = self.lineas([clave for _, clave in tanda])
+            for fecha, clave in tanda:
+                if clave in lineas:  # borrada entre las dos lecturas: llega su lápida
+                    yield fecha, self.nombre, clave, lineas[clave]
+            if len(tanda) < tamano:
+                return
+            posicion = tanda[-1]
+
+
+class FuenteRecurso(Fuente):
+    """Filas actuales serializadas con los campos por defecto del recurso de api.py"""
+
+    def __init__(self, nombre, recurso):
+        super().__init__(nombre, recurso.modelo, 'actualizado_en')
+        self.recurso = recurso
+
+    def lineas(self, claves):
+        filas = self.recurso.filas(self.recurso.queryset(), self.recurso.por_defecto, claves)
+        return {fila['id']: {'tipo': self.nombre, 'id': fila['id'], 'datos': fila} for fila in filas}
+
+
+class FuenteEliminaciones(Fuente):
+    def __init__(self):
+        super().__init__('eliminacion', Eliminacion, 'eliminado_en')
+
+    def lineas(self, claves):
+        return {
+            pk: {'tipo': tipo, 'id': clave, 'eliminado': True}
+            for pk, tipo, clave in Eliminacion.objects.filter(pk__in=claves).values_list('pk', 'tipo', 'clave')
+        }
+
+
+FUENTES = [
+    FuenteRecurso('despacho', RECURSOS['despachos']),
+    FuenteRecurso('incidencia', RECURSOS['incidencias']),
+    FuenteRecurso('asignacion', ASIGNACIONES),
+    FuenteEliminaciones(),
+]
+
+
+# ============= CURSOR =============
+
+def codificar_posiciones(posiciones):
+    valor = {nombre: [fecha.isoformat(), clave] for nombre, (fecha, clave) in posiciones.items()}
+    return base64.urlsafe_b64encode(json.dumps(valor, separators=(',', ':')).encode()).decode()
+
+
+def decodificar_posiciones(cursor):
+    """{fuente: (fecha, clave)} del cursor, o None sin cursor"""
+    if not cursor:
+        return None
+    try:
+        valor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {
+            nombre: (datetime.fromisoformat(fecha), int(clave))
+            for nombre, (fecha, clave) in valor.items()
+        }
+    except (ValueError, TypeError, AttributeError, UnicodeDecodeError) as e:
+        raise CursorInvalido('Cursor inválido') from e
+
+
+# ============= CAMBIOS =============
+
+def cambios_desde(posiciones=None, limite=MAX_CAMBIOS, ahora=None):
+    """
+    Genera hasta `limite` líneas (dicts) con los cambios posteriores a
+    `posiciones` en orden de fecha y al final {'cursor', 'mas'}.
+    Lanza CursorVencido antes de generar la primera línea.
+    """
+    ahora = ahora or timezone.now()
+    hasta = ahora - MARGEN
+    if posiciones is None:
+        posiciones = {'eliminacion': (hasta, 0)}
+    else:
+        posiciones = dict(posiciones)
+        eliminacion = posiciones.get('eliminacion')
+        if eliminacion is None or eliminacion[0] < ahora - RETENCION_ELIMINACIONES:
+            raise CursorVencido('El cursor es anterior a las eliminaciones conservadas; sincronice desde cero')
+    return _generar(posiciones, hasta, limite)
+
+
+def _generar(posiciones, hasta, limite):
+    cambios = heapq.merge(
+        *(fuente.recorrer(posiciones.get(fuente.nombre), hasta) for fuente in FUENTES),
+        key=lambda cambio: cambio[:3],
+    )
+    enviados = 0
+    for fecha, nombre, clave, linea in cambios:
+        if enviados == limite:
+            yield {'cursor': codificar_posiciones(posiciones), 'mas': True}
+            return
+        posiciones[nombre] = (fecha, clave)
+        enviados += 1
+        yield linea
+    # Al día: todas las fuentes avanzan hasta `hasta` (así el cursor de las
+    # lápidas no envejece aunque no haya borrados)
+    for fuente in FUENTES:
+        posiciones[fuente.nombre] = max(posiciones.get(fuente.nombre) or (hasta, 0), (hasta, 0))
+    yield {'cursor': codificar_posiciones(posiciones), 'mas': False}
@@ -0,0 +1,170 @@
+"""
+Contadores de despachos abiertos por motorista y por moto
+(CargaMotorista / CargaMoto)
+
+Un despacho ASIGNADO o EN_CURSO suma 1 al contador de su motorista y de su
+moto. Las señales de AppDiscopro/signals.py ajustan los contadores en cada
+alta, cambio (también los de estados.transicionar) o baja, dentro de la
+misma transacción y con UPDATE ... SET x = x + n para que dos peticiones
+concurrentes no se pisen; lotes.crear_lote los ajusta en bloque. Así la
+carga de un motorista se lee por clave primaria en vez de un COUNT sobre
+despacho.
+
+reconciliar_cargas() recalcula los contadores con un GROUP BY por tabla y
+corrige las diferencias (la usa el comando `reconciliar_cargas`).
+
+Uso:
+    carga_motorista(codigo_motorista)   # -> despachos abiertos
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import CargaMoto, CargaMotorista, Despacho
+from .recomendacion import ESTADOS_CON_CARGA
+
+# recurso -> (modelo del contador, campo de Despacho)
+CONTADORES = {
+    'motorista': (CargaMotorista, 'id_motorista'),
+    'moto': (CargaMoto, 'id_moto'),
+}
+
+
+# ============= CLAVE DE CARGA =============
+
+def clave_carga(despacho):
+    """
+    (motorista, moto) a los que el despacho suma carga, o None si no está
+    abierto. Lee de __dict__ para no consultar campos diferidos.
+    """
+    valores = despacho.__dict__
+    if valores.get('estado') not in ESTADOS_CON_CARGA:
+        return None
+    return valores.get('id_motorista_id'), valores.get('id_moto_id')
+
+
+# ============= AJUSTE INCREMENTAL =============
+
+def _ajustar(modelo, codigo, delta):
+    """Suma `delta` al contador de `codigo`, creando la fila si no existe"""
+    if codigo is None or not delta:
+        return
+    filtro = {modelo._meta.pk.attname: codigo}
+    if modelo.objects.filter(**filtro).update(despachos_abiertos=F('despachos_abiertos') + delta):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(despachos_abiertos=delta, **filtro)
+    except IntegrityError:
+        # Otra petición creó la fila entre el UPDATE y el INSERT
+        modelo.objects.filter(**filtro).update(despachos_abiertos=F('despachos_abiertos') + delta)
+
+
+def ajustar_carga(clave, delta):
+    if clave is None:
+        return
+    motorista, moto = clave
+    _ajustar(CargaMotorista, motorista, delta)
+    _ajustar(CargaMoto, moto, delta)
+
+
+def mover_carga(clave_anterior, clave_nueva):
+    """Traslada un despacho de un (motorista, moto) a otro, o lo abre / cierra"""
+    if clave_anterior == clave_nueva:
+        return
+    ajustar_carga(clave_anterior, -1)
+    ajustar_carga(clave_nueva, 1)
+
+
+def sumar_cargas(claves):
+    """Suma en bloque las claves de varios despachos (un UPDATE por motorista y por moto)"""
+    claves = [clave for clave in claves if clave is not None]
+    for codigo, cantidad in Counter(motorista for motorista, _ in claves).items():
+        _ajustar(CargaMotorista, codigo, cantidad)
+    for codigo, cantidad in Counter(moto for _, moto in claves).items():
+        _ajustar(CargaMoto, codigo, cantidad)
+
+
+# ============= LECTURA =============
+
+def carga_motorista(codigo_motorista):
+    return CargaMotorista.objects.filter(id_motorista=codigo_motorista).values_list(
+        'despachos_abiertos', flat=True
+    ).first() or 0
+
+
+def carga_moto(codigo_moto):
+    return CargaMoto.objects.filter(id_moto=codigo_moto).values_list(
+        'despachos_abiertos', flat=True
+    ).first() or 0
+
+
+# ============= RECONCILIACIÓN =============
+
+class Discrepancia:
+    """Contador que no coincide con los despachos abiertos reales"""
+
+    def __init__(self, recurso, codigo, registrado, real):
+        self.recurso = recurso
+        self.codigo = codigo
+        self.registrado = registrado
+        self.real = real
+
+    @property
+    def diferencia(self):
+        return self.real - self.registrado
+
+    def como_dict(self):
+        return {
+            'recurso': self.recurso,
+            'codigo': self.codigo,
+            'registrado': self.registrado,
+            'real': self.real,
+        }
+
+
+def _lectura_repetible():
+    """
+    Fija REPEATABLE READ para la transacción que está por empezar. Django
+    abre las conexiones MySQL en READ COMMITTED (cada sentencia ve su propia
+    instantánea); debe ejecutarse antes de la primera consulta de la
+    transacción. SQLite ya es serializable.
+    """
+    connection = transaction.get_connection()
+    if connection.vendor in ('mysql', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+
+
+def reconciliar_cargas(corregir=True):
+    """
+    Compara los contadores con un GROUP BY sobre los despachos abiertos y,
+    con `corregir`, suma a cada contador su diferencia. Las lecturas se
+    hacen en una transacción REPEATABLE READ propia (durable: no puede ir
+    dentro de otra), así el GROUP BY y los contadores salen de la misma
+    instantánea aunque otras peticiones confirmen despachos entre una y
+    otra. La corrección es un delta con F(), que no pisa los ajustes que
+    esas peticiones hacen sobre la fila actual. Retorna la lista de
+    Discrepancia.
+    """
+    discrepancias = []
+    with transaction.atomic(durable=True):
+        _lectura_repetible()
+        for recurso, (modelo, campo) in CONTADORES.items():
+            reales = dict(
+                Despacho.objects.filter(estado__in=ESTADOS_CON_CARGA, **{f'{campo}__isnull': False})
+                .order_by().values(campo).annotate(total=Count('id_despacho'))
+                .values_list(campo, 'total')
+            )
+            registrados = dict(modelo.objects.values_list(modelo._meta.pk.attname, 'despachos_abiertos'))
+            for codigo in reales.keys() | registrados.keys():
+                real, registrado = reales.get(codigo, 0), registrados.get(codigo, 0)
+                if real != registrado:
+                    discrepancias.append(Discrepancia(recurso, codigo, registrado, real))
+
+        if corregir:
+            for discrepancia in discrepancias:
+                modelo = CONTADORES[discrepancia.recurso][0]
+                _ajustar(modelo, discrepancia.codigo, discrepancia.diferencia)
+    return discrepancias
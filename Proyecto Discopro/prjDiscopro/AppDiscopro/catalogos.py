@@ -0,0 +1,152 @@
+"""
+Caché de catálogos (Rol, TipoDespacho, Region, Comuna)
+
+Son tablas pequeñas que casi nunca cambian pero se consultan en cada
+creación de despacho, listado y reporte. Cada catálogo se guarda en dos
+niveles:
+- Memoria del proceso: se sirve sin consultas mientras siga vigente.
+- Caché compartida (framework de caché de Django): evita que cada proceso
+  vaya a la base de datos al recargar.
+
+La vigencia se controla con un número de versión guardado en la caché
+compartida. Las señales post_save/post_delete (signals.py) incrementan la
+versión al confirmar la transacción; el proceso que hizo el cambio recarga
+de inmediato y los demás al verificar la versión (cada VERIFICAR_CADA seg).
+
+Las instancias retornadas son compartidas: usarlas como valores de solo
+lectura (asignarlas a FKs, mostrarlas), nunca modificarlas y guardarlas.
+
+Uso:
+    catalogos.tipo_despacho(TipoDespacho.DIRECTO)
+    catalogos.TIPOS_DESPACHO.todos()
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import Comuna, Region, Rol, TipoDespacho
+
+TIEMPO_CACHE = 60 * 60 * 24
+VERIFICAR_CADA = 5
+
+
+class CacheVersionada:
+    """
+    Base de las cachés de dos niveles (memoria del proceso y caché
+    compartida) vigentes mientras no cambie la versión guardada en
+    `<clave>:version`. Las subclases definen `clave` y guardan su copia
+    local en `_estado`; invalidar() la descarta y sube la versión. También
+    la usa vencimientos.Inhabilitados.
+    """
+
+    clave = None
+
+    def __init__(self):
+        self._estado = None
+
+    def _clave_version(self):
+        return f'{self.clave}:version'
+
+    def _version(self):
+        version = cache.get(self._clave_version())
+        if version is None:
+            cache.add(self._clave_version(), time.time_ns(), None)
+            version = cache.get(self._clave_version())
+        return version
+
+    def invalidar(self):
+        """Descarta la copia local y marca como vencidas las de otros procesos"""
+        self._estado = None
+        try:
+            cache.incr(self._clave_version())
+        except ValueError:
+            cache.add(self._clave_version(), time.time_ns(), None)
+
+
+class Catalogo(CacheVersionada):
+    """Catálogo de un modelo cacheado en memoria y en la caché compartida"""
+
+    def __init__(self, modelo, orden):
+        super().__init__()
+        self.modelo = modelo
+        self.orden = orden
+        self.clave = f'catalogo:{modelo._meta.label_lower}'
+        # _estado: (version, verificado_en, objetos, por_pk); se reemplaza completo
+
+    # ---- carga ----
+
+    def _cargar(self):
+        estado = self._estado
+        ahora = time.monotonic()
+        if estado is not None and ahora - estado[1] < VERIFICAR_CADA:
+            return estado
+
+        version = self._version()
+        if estado is not None and estado[0] == version:
+            estado = (version, ahora, estado[2], estado[3])
+        else:
+            clave_datos = f'{self.clave}:{version}'
+            objetos = cache.get(clave_datos)
+            if objetos is None:
+                objetos = tuple(self.modelo._default_manager.order_by(self.orden))
+                cache.set(clave_datos, objetos, TIEMPO_CACHE)
+            estado = (version, ahora, objetos, {obj.pk: obj for obj in objetos})
+        self._estado = estado
+        return estado
+
+    # ---- acceso ----
+
+    def todos(self):
+        """Tupla con todos los registros, ordenados por `orden`"""
+        return self._cargar()[2]
+
+    def por_pk(self, pk):
+        """Equivalente a objects.get(pk=pk)"""
+        por_pk = self._cargar()[3]
+        try:
+            return por_pk[self.modelo._meta.pk.to_python(pk)]
+        except (KeyError, ValueError, TypeError):
+            raise self.modelo.DoesNotExist(
+                f'{self.modelo.__name__} con pk={pk!r} no existe'
+            ) from None
+
+    def obtener(self, **campos):
+        """Equivalente a objects.get(**campos) con igualdad exacta de atributos"""
+        encontrados = [
+            obj for obj in self.todos()
+            if all(getattr(obj, campo) == valor for campo, valor in campos.items())
+        ]
+        if not encontrados:
+            raise self.modelo.DoesNotExist(f'{self.modelo.__name__} {campos} no existe')
+        if len(encontrados) > 1:
+            raise self.modelo.MultipleObjectsReturned(f'{self.modelo.__name__} {campos} repetido')
+        return encontrados[0]
+
+
+ROLES = Catalogo(Rol, 'nombre_rol')
+TIPOS_DESPACHO = Catalogo(TipoDespacho, 'nombre_tipo')
+REGIONES = Catalogo(Region, 'id_region')
+COMUNAS = Catalogo(Comuna, 'nombre_comuna')
+
+# Catálogo por modelo (usado por las señales de invalidación)
+CATALOGOS = {catalogo.modelo: catalogo for catalogo in (ROLES, TIPOS_DESPACHO, REGIONES, COMUNAS)}
+
+
+# ============= ACCESOS TIPADOS =============
+
+def tipo_despacho(nombre):
+    """TipoDespacho por nombre, p. ej. tipo_despacho(TipoDespacho.DIRECTO)"""
+    return TIPOS_DESPACHO.obtener(nombre_tipo=nombre)
+
+
+def rol(nombre):
+    """Rol por nombre ('GERENTE', 'OPERADORA', 'SUPERVISOR')"""
+    return ROLES.obtener(nombre_rol=nombre)
+
+
+def region(id_region):
+    return REGIONES.por_pk(id_region)
+
+
+def comunas_de_region(id_region):
+    return [comuna for comuna in COMUNAS.todos() if comuna.id_region_id == id_region]
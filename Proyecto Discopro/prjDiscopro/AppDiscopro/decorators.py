@@ -7,6 +7,20 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+
+
+def nombre_rol_de(request):
+    """
+    Nombre del rol del usuario del request, o None si no tiene rol.
+    Usa request.permisos (RolSesionMiddleware) cuando está disponible.
+    """
+    permisos = getattr(request, 'permisos', None)
+    if permisos is not None:
+        return permisos.rol
+    if not hasattr(request.user, 'id_rol'):
+        return None
+    return request.user.id_rol.nombre_rol
 
 
 # ============= DECORADORES PARA VISTAS FUNCIONALES =============
@@ -20,11 +34,12 @@ def rol_requerido(*roles_permitidos):
         @wraps(view_func)
         @login_required
         def wrapper(request, *args, **kwargs):
-            if not hasattr(request.user, 'id_rol'):
+            nombre_rol = nombre_rol_de(request)
+            if nombre_rol is None:
                 messages.error(request, 'Tu cuenta no tiene un rol asignado. Contacta al administrador.')
                 return redirect('home')
             
-            if request.user.id_rol.nombre_rol in roles_permitidos:
+            if nombre_rol in roles_permitidos:
                 return view_func(request, *args, **kwargs)
             else:
                 messages.error(
@@ -60,6 +75,20 @@ def operadora_o_gerente(view_func):
     return rol_requerido('GERENTE', 'OPERADORA')(view_func)
 
 
+def api_login_requerido(view_func):
+    """
+    Decorador para las vistas de la API JSON: sin sesión responde 401 con
+    {"error": ...} en vez de redirigir a la página de login
+    Uso: @api_login_requerido
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
 # ============= MIXINS PARA VISTAS BASADAS EN CLASES =============
 
 class RolRequeridoMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -73,9 +102,7 @@ class RolRequeridoMixin(LoginRequiredMixin, UserPassesTestMixin):
     
     def test_func(self):
         """Verifica si el usuario tiene uno de los roles permitidos"""
-        if not hasattr(self.request.user, 'id_rol'):
-            return False
-        return self.request.user.id_rol.nombre_rol in self.roles_permitidos
+        return nombre_rol_de(self.request) in self.roles_permitidos
     
     def handle_no_permission(self):
         """Maneja el caso cuando el usuario no tiene permisos"""
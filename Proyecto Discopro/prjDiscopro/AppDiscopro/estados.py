@@ -0,0 +1,105 @@
+"""
+Máquina de estados de los despachos
+
+Define las transiciones permitidas y las aplica con un único UPDATE
+condicional:
+
+    UPDATE despacho SET estado = <nuevo>, ... WHERE id = <id> AND estado = <esperado>
+
+Si otro usuario cambió el despacho antes, el UPDATE no afecta filas y la
+transición se informa como perdida (False): nadie pisa el cambio de otro.
+Con `version_esperada` (la VERSION que vio el usuario o el cliente de la
+API) la condición incluye además AND version = <versión>, así también se
+pierde si otro cambió el motorista, la moto o la dirección sin tocar el
+estado.
+Al ganar se agrega el evento a la bitácora (eventos.py) en la misma
+transacción, con el usuario, el motivo y los campos cambiados.
+
+El mismo UPDATE sube Despacho.version (ETag de la API JSON) y escribe
+actualizado_en (sincronización incremental, cambios.py). Como .update()
+no emite señales, al ganar se actualiza la instancia en memoria y se envía
+post_save(update_fields=...) para que los receptores de signals.py mantengan
+el resumen diario, el índice de búsqueda y la carga de los motoristas igual
+que con save().
+
+Uso:
+    if not transicionar(despacho, 'EN_CURSO', usuario=request.user):
+        ...  # otro usuario cambió el estado primero
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .eventos import cambios_serializables, registrar_evento
+from .models import Despacho
+
+# estado actual -> estados a los que puede pasar
+TRANSICIONES = {
+    'CREADO': {'ASIGNADO', 'CANCELADO'},
+    'ASIGNADO': {'EN_CURSO', 'CANCELADO', 'FALLIDO'},
+    'EN_CURSO': {'FINALIZADO', 'FALLIDO', 'CANCELADO'},
+    'FINALIZADO': set(),
+    'CANCELADO': set(),
+    'FALLIDO': set(),
+}
+
+ESTADOS_TERMINALES = {estado for estado, siguientes in TRANSICIONES.items() if not siguientes}
+
+# Campos que se pueden cambiar junto con la transición
+CAMPOS_EDITABLES = {'id_motorista', 'id_moto', 'direccion_entrega', 'observaciones'}
+
+
+class TransicionInvalida(Exception):
+    """La transición no está permitida desde el estado indicado"""
+
+
+def puede_pasar(actual, nuevo):
+    return nuevo == actual or nuevo in TRANSICIONES.get(actual, set())
+
+
+def estados_siguientes(actual):
+    """Estados elegibles desde `actual` (incluido el mismo), en el orden de ESTADO_CHOICES"""
+    return [valor for valor, _ in Despacho.ESTADO_CHOICES if puede_pasar(actual, valor)]
+
+
+def transicionar(despacho, nuevo, esperado=None, usuario=None, motivo=None, version_esperada=None, **cambios):
+    """
+    Pasa `despacho` (instancia) de `esperado` (por defecto despacho.estado)
+    a `nuevo` con un UPDATE condicional; con `version_esperada` la fila
+    además debe seguir en esa versión. `cambios` son otros campos de
+    CAMPOS_EDITABLES a escribir en la misma sentencia; `usuario` y `motivo`
+    quedan en el evento de la bitácora.
+    Retorna True si la transición se aplicó y False si otro la ganó.
+    """
+    esperado = despacho.estado if esperado is None else esperado
+    if not puede_pasar(esperado, nuevo):
+        raise TransicionInvalida(f'No se puede pasar de {esperado} a {nuevo}')
+    desconocidos = set(cambios) - CAMPOS_EDITABLES
+    if desconocidos:
+        raise ValueError(f'Campos no editables: {", ".join(sorted(desconocidos))}')
+
+    valores = dict(cambios, estado=nuevo, actualizado_en=timezone.now())
+    if nuevo == 'FINALIZADO' and esperado != 'FINALIZADO':
+        valores['fecha_finalizacion'] = timezone.now()
+
+    with transaction.atomic():
+        filas = Despacho.objects.filter(id_despacho=despacho.pk, estado=esperado)
+        if version_esperada is not None:
+            filas = filas.filter(version=version_esperada)
+        if not filas.update(version=F('version') + 1, **valores):
+            return False
+
+        if nuevo != esperado or cambios or motivo:
+            registrar_evento(
+                despacho, esperado, nuevo, usuario=usuario,
+                motivo=motivo, cambios=cambios_serializables(cambios),
+            )
+        for campo, valor in valores.items():
+            setattr(despacho, campo, valor)
+        despacho.__dict__.pop('version', None)  # se relee al consultarla
+        post_save.send(
+            sender=Despacho, instance=despacho, created=False,
+            update_fields=frozenset(valores) | {'version'}, raw=False, using=filas.db,
+        )
+    return True
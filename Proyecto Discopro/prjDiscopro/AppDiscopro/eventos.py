@@ -0,0 +1,58 @@
+"""
+Bitácora de eventos de los despachos (modelo DespachoEvento)
+
+Cada creación y cada cambio aplicado con estados.transicionar() agrega una
+fila en la misma transacción que el cambio; las filas no se modifican. La
+línea de tiempo de un despacho y los reportes de tiempo en estado se
+obtienen con rangos sobre los índices (despacho, fecha) y (estado, fecha),
+sin leer las observaciones.
+
+Uso:
+    registrar_evento(despacho, 'ASIGNADO', 'CANCELADO', usuario=request.user, motivo='...')
+    despacho.eventos.select_related('usuario')    # línea de tiempo
+"""
+from datetime import date, datetime
+
+from django.db import models
+
+from .models import DespachoEvento
+
+
+def _serializable(valor):
+    """Valor guardable en el JSON de `datos` (instancias por su clave primaria)"""
+    if isinstance(valor, models.Model):
+        return valor.pk
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _usuario(usuario):
+    """Los usuarios anónimos no se registran"""
+    return usuario if usuario is not None and getattr(usuario, 'is_authenticated', False) else None
+
+
+def nuevo_evento(despacho, anterior, nuevo, usuario=None, fecha=None, **datos):
+    """DespachoEvento sin guardar (para bulk_create); `datos` vacíos se guardan como NULL"""
+    evento = DespachoEvento(
+        id_despacho_id=despacho.pk,
+        estado_anterior=anterior,
+        estado_nuevo=nuevo,
+        usuario=_usuario(usuario),
+        datos={clave: _serializable(valor) for clave, valor in datos.items() if valor not in (None, '', {})} or None,
+    )
+    if fecha is not None:
+        evento.fecha = fecha
+    return evento
+
+
+def registrar_evento(despacho, anterior, nuevo, usuario=None, **datos):
+    """Inserta el evento; llamar dentro de la transacción del cambio"""
+    evento = nuevo_evento(despacho, anterior, nuevo, usuario=usuario, **datos)
+    evento.save(force_insert=True)
+    return evento
+
+
+def cambios_serializables(cambios):
+    """{campo: valor} de los campos cambiados, con las FKs por su clave primaria"""
+    return {campo: _serializable(valor) for campo, valor in cambios.items()}
@@ -6,6 +6,89 @@ from .models import (
     Despacho, Incidencia, TipoDespacho
 )
 
+from django.urls import reverse
+
+from . import catalogos
+from .autocompletar import FUENTES
+from .estados import estados_siguientes
+from .vencimientos import INHABILITADOS
+
+
+# ============= CAMPOS DE CATÁLOGO =============
+
+class CatalogoChoiceIterator(forms.models.ModelChoiceIterator):
+    """Opciones tomadas del catálogo cacheado en lugar del queryset"""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.catalogo.todos():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.catalogo.todos()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.catalogo.todos())
+
+
+class CatalogoChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField de un catálogo (catalogos.py): renderiza y valida sin consultas"""
+    iterator = CatalogoChoiceIterator
+
+    def __init__(self, catalogo, **kwargs):
+        self.catalogo = catalogo
+        super().__init__(queryset=catalogo.modelo._default_manager.all(), **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.catalogo.modelo):
+            value = value.pk
+        try:
+            return self.catalogo.por_pk(value)
+        except self.catalogo.modelo.DoesNotExist:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+
+
+# ============= SELECTORES CON AUTOCOMPLETADO =============
+
+class AutocompletarSelect(forms.Select):
+    """
+    Select que solo renderiza la opción seleccionada; el resto se busca en la
+    vista `autocompletar` (static/js/autocompletar.js). El costo de renderizar
+    no depende del tamaño de la tabla y la validación sigue siendo la del
+    ModelChoiceField.
+    """
+
+    def __init__(self, fuente, attrs=None):
+        self.fuente = fuente
+        super().__init__(attrs)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs'].update({
+            'data-autocompletar': self.fuente,
+            'data-url': reverse('autocompletar', args=[self.fuente]),
+        })
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        claves = [v for v in value if v not in ('', None)]
+        opciones = [self.create_option(name, '', '---------', not claves, 0)]
+        for indice, opcion in enumerate(FUENTES[self.fuente].etiquetas(claves), start=1):
+            opciones.append(self.create_option(name, opcion['id'], opcion['texto'], True, indice))
+        return [(None, opciones, 0)]
+
+    def use_required_attribute(self, initial):
+        # La primera opción siempre es la vacía; no hace falta recorrer las choices
+        return not self.is_hidden
+
+
 # ============= FORMULARIOS DE AUTENTICACIÓN =============
 
 class RegistroUsuarioForm(UserCreationForm):
@@ -40,8 +123,8 @@ class RegistroUsuarioForm(UserCreationForm):
         label='Teléfono'
     )
     
-    id_rol = forms.ModelChoiceField(
-        queryset=Rol.objects.all(),
+    id_rol = CatalogoChoiceField(
+        catalogo=catalogos.ROLES,
         required=True,
         widget=forms.Select(attrs={
             'class': 'form-control'
@@ -389,7 +472,33 @@ class DocumentacionMotoForm(forms.ModelForm):
             'fecha_vencimiento': 'Vencimiento',
         }
 
-class DespachoBaseForm(forms.ModelForm):
+class VencimientosMixin:
+    """
+    Rechaza motoristas con licencia vencida y motos con documentación
+    vencida (vencimientos.INHABILITADOS, sin consultas por candidato). Al
+    modificar un despacho solo se valida si el motorista o la moto cambian.
+    """
+
+    def _validar_habilitado(self, campo, inhabilitado, mensaje):
+        valor = self.cleaned_data.get(campo)
+        if valor is None or (self.instance.pk and campo not in self.changed_data):
+            return valor
+        if inhabilitado(valor.pk):
+            raise forms.ValidationError(mensaje, code='vencido')
+        return valor
+
+    def clean_id_motorista(self):
+        return self._validar_habilitado(
+            'id_motorista', INHABILITADOS.motorista, 'El motorista tiene la licencia vencida'
+        )
+
+    def clean_id_moto(self):
+        return self._validar_habilitado(
+            'id_moto', INHABILITADOS.moto, 'La moto tiene documentación vencida'
+        )
+
+
+class DespachoBaseForm(VencimientosMixin, forms.ModelForm):
     """Formulario base para todos los tipos de despacho"""
     class Meta:
         model = Despacho
@@ -400,9 +509,9 @@ class DespachoBaseForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Código de orden de la farmacia'
             }),
-            'id_farmacia_origen': forms.Select(attrs={'class': 'form-control'}),
-            'id_motorista': forms.Select(attrs={'class': 'form-control'}),
-            'id_moto': forms.Select(attrs={'class': 'form-control'}),
+            'id_farmacia_origen': AutocompletarSelect('farmacia', attrs={'class': 'form-control'}),
+            'id_motorista': AutocompletarSelect('motorista', attrs={'class': 'form-control'}),
+            'id_moto': AutocompletarSelect('moto', attrs={'class': 'form-control'}),
             'direccion_entrega': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Dirección completa de entrega'
@@ -471,7 +580,7 @@ class DespachoConTrasladoForm(DespachoBaseForm):
         fields = DespachoBaseForm.Meta.fields + ['id_farmacia_origen_secundaria']
         widgets = {
             **DespachoBaseForm.Meta.widgets,
-            'id_farmacia_origen_secundaria': forms.Select(attrs={
+            'id_farmacia_origen_secundaria': AutocompletarSelect('farmacia', attrs={
                 'class': 'form-control',
                 'required': 'required'
             }),
@@ -482,11 +591,11 @@ class DespachoConTrasladoForm(DespachoBaseForm):
         }
 
 
-class DespachoConReenvioForm(forms.ModelForm):
+class DespachoConReenvioForm(VencimientosMixin, forms.ModelForm):
     """Formulario para despacho con reenvío"""
     id_despacho_original = forms.ModelChoiceField(
-        queryset=Despacho.objects.filter(estado='FALLIDO'),
-        widget=forms.Select(attrs={'class': 'form-control'}),
+        queryset=FUENTES['despacho_fallido'].queryset(),
+        widget=AutocompletarSelect('despacho_fallido', attrs={'class': 'form-control'}),
         label='Despacho Original',
         help_text='Seleccione el despacho fallido que desea reenviar'
     )
@@ -496,8 +605,8 @@ class DespachoConReenvioForm(forms.ModelForm):
         fields = ['id_despacho_original', 'id_motorista', 'id_moto', 
                   'direccion_entrega', 'observaciones']
         widgets = {
-            'id_motorista': forms.Select(attrs={'class': 'form-control'}),
-            'id_moto': forms.Select(attrs={'class': 'form-control'}),
+            'id_motorista': AutocompletarSelect('motorista', attrs={'class': 'form-control'}),
+            'id_moto': AutocompletarSelect('moto', attrs={'class': 'form-control'}),
             'direccion_entrega': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Dirección de entrega (mantener o modificar)'
@@ -516,14 +625,27 @@ class DespachoConReenvioForm(forms.ModelForm):
         }
 
 
-class ModificarDespachoForm(forms.ModelForm):
+class ModificarDespachoForm(VencimientosMixin, forms.ModelForm):
     """Formulario para modificar un despacho existente"""
+    # Versión de la fila con la que se abrió el formulario (estados.transicionar
+    # la exige en el UPDATE: un formulario viejo no pisa cambios de otro)
+    version = forms.IntegerField(widget=forms.HiddenInput, min_value=1)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['version'].initial = self.instance.version
+        # Solo el estado actual y los permitidos por la máquina de estados
+        permitidos = set(estados_siguientes(self.instance.estado))
+        self.fields['estado'].choices = [
+            (valor, etiqueta) for valor, etiqueta in Despacho.ESTADO_CHOICES if valor in permitidos
+        ]
+
     class Meta:
         model = Despacho
         fields = ['id_motorista', 'id_moto', 'direccion_entrega', 'estado', 'observaciones']
         widgets = {
-            'id_motorista': forms.Select(attrs={'class': 'form-control'}),
-            'id_moto': forms.Select(attrs={'class': 'form-control'}),
+            'id_motorista': AutocompletarSelect('motorista', attrs={'class': 'form-control'}),
+            'id_moto': AutocompletarSelect('moto', attrs={'class': 'form-control'}),
             'direccion_entrega': forms.TextInput(attrs={'class': 'form-control'}),
             'estado': forms.Select(attrs={'class': 'form-control'}),
             'observaciones': forms.Textarea(attrs={
@@ -577,15 +699,15 @@ class FiltroReporteForm(forms.Form):
         }),
         label='Fecha Fin'
     )
-    id_region = forms.ModelChoiceField(
-        queryset=None,  # Se establecerá en __init__
+    id_region = CatalogoChoiceField(
+        catalogo=catalogos.REGIONES,
         required=False,
         widget=forms.Select(attrs={'class': 'form-control'}),
         label='Región',
         empty_label='Todas las regiones'
     )
-    id_tipo_despacho = forms.ModelChoiceField(
-        queryset=TipoDespacho.objects.all(),
+    id_tipo_despacho = CatalogoChoiceField(
+        catalogo=catalogos.TIPOS_DESPACHO,
         required=False,
         widget=forms.Select(attrs={'class': 'form-control'}),
         label='Tipo de Despacho',
@@ -597,8 +719,3 @@ class FiltroReporteForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-control'}),
         label='Estado'
     )
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        from .models import Region
-        self.fields['id_region'].queryset = Region.objects.all()
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Índice espacial de farmacias (vecinos más cercanos)
+
+Las farmacias con latitud/longitud se guardan en memoria en un KD-tree
+sobre vectores unitarios 3D (coordenadas cartesianas sobre la esfera). La
+distancia euclidiana entre esos vectores (cuerda) crece igual que la
+distancia haversine, así que la poda del árbol es exacta y no depende de
+la latitud ni de la proyección.
+
+El índice se carga al primer uso, se invalida con las señales de Farmacia
+(signals.py) y se recarga cada REFRESCO_COMPLETO segundos para recoger
+cambios de otros procesos.
+
+Uso:
+    farmacias_cercanas(latitud, longitud, k=5, abiertas_a=time(10, 30))
+    farmacias_cercanas_a(codigo_farmacia, k=5)
+"""
+import heapq
+import math
+import threading
+import time
+
+from .models import Farmacia
+from .utils import RADIO_TIERRA_KM
+
+REFRESCO_COMPLETO = 300
+
+
+def vector_unitario(latitud, longitud):
+    lat, lon = math.radians(latitud), math.radians(longitud)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def cuerda_a_km(cuerda):
+    """Convierte la distancia entre vectores unitarios en km sobre la superficie"""
+    return 2 * RADIO_TIERRA_KM * math.asin(min(cuerda / 2, 1.0))
+
+
+def abierta_a(apertura, cierre, hora):
+    """True si el horario [apertura, cierre) incluye `hora` (admite cruce de medianoche)"""
+    if apertura is None or cierre is None:
+        return False
+    if apertura <= cierre:
+        return apertura <= hora < cierre
+    return hora >= apertura or hora < cierre
+
+
+class IndiceFarmacias:
+    """KD-tree en memoria sobre las farmacias con coordenadas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cargado_en = None
+        self._farmacias = []     # dicts con codigo_farmacia, nombre, coordenadas y horario
+        self._vectores = []
+        self._por_codigo = {}    # codigo_farmacia -> posición en _farmacias
+        self._raiz = None
+
+    def invalidar(self):
+        self._cargado_en = None
+
+    def cargar(self, farmacias):
+        """Construye el árbol a partir de dicts con latitud/longitud (en grados)"""
+        farmacias = [f for f in farmacias if f['latitud'] is not None and f['longitud'] is not None]
+        vectores = [vector_unitario(float(f['latitud']), float(f['longitud'])) for f in farmacias]
+
+        def construir(posiciones, profundidad):
+            if not posiciones:
+                return None
+            eje = profundidad % 3
+            posiciones.sort(key=lambda i: vectores[i][eje])
+            medio = len(posiciones) // 2
+            return (
+                posiciones[medio], eje,
+                construir(posiciones[:medio], profundidad + 1),
+                construir(posiciones[medio + 1:], profundidad + 1),
+            )
+
+        raiz = construir(list(range(len(farmacias))), 0)
+        with self._lock:
+            self._farmacias, self._vectores, self._raiz = farmacias, vectores, raiz
+            self._por_codigo = {f['codigo_farmacia']: i for i, f in enumerate(farmacias)}
+            self._cargado_en = time.monotonic()
+
+    def reconstruir(self):
+        self.cargar(Farmacia.objects.filter(
+            latitud__isnull=False, longitud__isnull=False
+        ).values(
+            'codigo_farmacia', 'nombre_farmacia', 'latitud', 'longitud',
+            'horario_apertura', 'horario_cierre',
+        ))
+
+    def asegurar(self):
+        cargado_en = self._cargado_en
+        if cargado_en is None or time.monotonic() - cargado_en > REFRESCO_COMPLETO:
+            self.reconstruir()
+
+    def coordenadas_de(self, codigo_farmacia):
+        self.asegurar()
+        posicion = self._por_codigo.get(codigo_farmacia)
+        if posicion is None:
+            return None
+        farmacia = self._farmacias[posicion]
+        return float(farmacia['latitud']), float(farmacia['longitud'])
+
+    def cercanas(self, latitud, longitud, k=5, abiertas_a=None, excluir=()):
+        """
+        Las `k` farmacias más cercanas al punto, ordenadas por distancia.
+        Con `abiertas_a` (datetime.time) solo cuentan las abiertas a esa hora.
+        Retorna [(distancia_km, farmacia_dict), ...]
+        """
+        self.asegurar()
+        with self._lock:
+            farmacias, vectores, raiz = self._farmacias, self._vectores, self._raiz
+        objetivo = vector_unitario(latitud, longitud)
+        excluir = set(excluir)
+        mejores = []  # heap de (-cuerda², posición): la raíz es el peor de los k
+
+        def admite(posicion):
+            farmacia = farmacias[posicion]
+            if farmacia['codigo_farmacia'] in excluir:
+                return False
+            if abiertas_a is not None:
+                return abierta_a(farmacia['horario_apertura'], farmacia['horario_cierre'], abiertas_a)
+            return True
+
+        def buscar(nodo):
+            if nodo is None:
+                return
+            posicion, eje, izquierda, derecha = nodo
+            vector = vectores[posicion]
+            if admite(posicion):
+                d2 = sum((a - b) ** 2 for a, b in zip(vector, objetivo))
+                if len(mejores) < k:
+                    heapq.heappush(mejores, (-d2, posicion))
+                elif d2 < -mejores[0][0]:
+                    heapq.heapreplace(mejores, (-d2, posicion))
+            diferencia = objetivo[eje] - vector[eje]
+            cercano, lejano = (izquierda, derecha) if diferencia < 0 else (derecha, izquierda)
+            buscar(cercano)
+            if len(mejores) < k or diferencia ** 2 < -mejores[0][0]:
+                buscar(lejano)
+
+        if k > 0:
+            buscar(raiz)
+        return [
+            (cuerda_a_km(math.sqrt(-d2)), farmacias[posicion])
+            for d2, posicion in sorted(mejores, reverse=True)
+        ]
+
+
+INDICE_FARMACIAS = IndiceFarmacias()
+
+
+def farmacias_cercanas(latitud, longitud, k=5, abiertas_a=None, excluir=()):
+    return INDICE_FARMACIAS.cercanas(latitud, longitud, k, abiertas_a, excluir)
+
+
+def farmacias_cercanas_a(codigo_farmacia, k=5, abiertas_a=None):
+    """Vecinas de una farmacia (sin incluirla). [] si no tiene coordenadas"""
+    coordenadas = INDICE_FARMACIAS.coordenadas_de(codigo_farmacia)
+    if coordenadas is None:
+        return []
+    return INDICE_FARMACIAS.cercanas(*coordenadas, k=k, abiertas_a=abiertas_a, excluir=[codigo_farmacia])
@@ -0,0 +1,319 @@
+"""
+Creación masiva de despachos (lotes de pedidos enviados por las farmacias)
+
+Cada fila de un lote es un dict con:
+    tipo                 directo | receta | traslado  (por defecto directo)
+    farmacia, motorista, moto, direccion_entrega      (obligatorios)
+    codigo_orden, observaciones                        (opcionales)
+    farmacia_secundaria                                (obligatoria en traslado)
+    numero_receta, nombre_medico, fecha_emision        (obligatorios en receta,
+    observaciones_receta                                fecha en YYYY-MM-DD)
+
+crear_lote() valida todas las filas contra los códigos existentes (una
+consulta por tabla para todo el lote, no una por fila), inserta los
+despachos y sus recetas con bulk_create en tandas y retorna un
+ResultadoLote con los errores por fila. Como bulk_create no emite señales,
+el resumen diario, el índice de búsqueda, la bitácora de eventos, los
+contadores de carga y la carga del índice de recomendación se actualizan
+aquí en bloque.
+
+Sin `parcial` el lote es todo o nada; con `parcial` se insertan las filas
+válidas y se informan las demás.
+
+Lo usan el comando `import_despachos` y la vista despacho_lote (JSON/CSV).
+"""
+import csv
+import json
+from collections import Counter
+from datetime import date
+
+from django.db import connection, transaction
+
+from . import catalogos
+from .busqueda import clave_modelo, terminos_de
+from .cargas import clave_carga, sumar_cargas
+from .eventos import nuevo_evento
+from .models import Despacho, DespachoEvento, Farmacia, IndiceBusqueda, Moto, Motorista, RecetaDespacho, TipoDespacho
+from .recomendacion import INDICE
+from .resumen import ajustar_resumen, clave_despacho
+from .vencimientos import INHABILITADOS
+
+TAMANO_TANDA = 1000
+TAMANO_IN = 5000  # códigos por consulta IN al validar
+
+TIPOS = {
+    'directo': TipoDespacho.DIRECTO,
+    'receta': TipoDespacho.CON_RECETA,
+    'traslado': TipoDespacho.CON_TRASLADO,
+}
+
+# Largo máximo de los campos de texto (según models.py)
+LARGOS = {
+    'direccion_entrega': 200,
+    'codigo_orden': 50,
+    'numero_receta': 50,
+    'nombre_medico': 100,
+}
+
+
+class LoteInvalido(Exception):
+    """El archivo o cuerpo del lote no se pudo leer"""
+
+
+class ResultadoLote:
+    """Despachos creados y errores por fila (filas numeradas desde 1)"""
+
+    def __init__(self, total):
+        self.total = total
+        self.creados = []      # id_despacho en el orden de las filas válidas
+        self.errores = {}      # fila -> [mensajes]
+        self.aplicado = False
+
+    @property
+    def validas(self):
+        return self.total - len(self.errores)
+
+    def como_dict(self):
+        return {
+            'aplicado': self.aplicado,
+            'total': self.total,
+            'creados': len(self.creados),
+            'ids': self.creados,
+            'errores': [
+                {'fila': fila, 'errores': mensajes}
+                for fila, mensajes in sorted(self.errores.items())
+            ],
+        }
+
+
+# ============= LECTURA DE LOTES =============
+
+def leer_lote(archivo, formato):
+    """Lee las filas de un archivo de texto abierto ('csv' o 'json')"""
+    if formato == 'csv':
+        return [dict(fila) for fila in csv.DictReader(archivo)]
+    if formato == 'json':
+        try:
+            datos = json.load(archivo)
+        except json.JSONDecodeError as e:
+            raise LoteInvalido(f'JSON inválido: {e}')
+        if isinstance(datos, dict):
+            datos = datos.get('despachos', [])
+        if not isinstance(datos, list):
+            raise LoteInvalido('Se esperaba una lista de despachos')
+        return datos
+    raise LoteInvalido(f'Formato no soportado: {formato}')
+
+
+# ============= VALIDACIÓN =============
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    return '' if valor is None else str(valor).strip()
+
+
+def _codigo(fila, campo, errores, obligatorio=True):
+    valor = _texto(fila, campo)
+    if not valor:
+        if obligatorio:
+            errores.append(f'Falta "{campo}"')
+        return None
+    if not valor.isdigit():
+        errores.append(f'"{campo}" debe ser un código numérico ({valor!r})')
+        return None
+    return int(valor)
+
+
+def _existentes(modelo, codigos):
+    """Subconjunto de `codigos` que existen como clave primaria del modelo"""
+    codigos = sorted(codigos)
+    encontrados = set()
+    for inicio in range(0, len(codigos), TAMANO_IN):
+        encontrados.update(
+            modelo.objects.filter(pk__in=codigos[inicio:inicio + TAMANO_IN]).values_list('pk', flat=True)
+        )
+    return encontrados
+
+
+def _normalizar(fila, errores):
+    """Convierte una fila cruda en los valores del despacho (sin validar FKs)"""
+    if not isinstance(fila, dict):
+        errores.append('Se esperaba un objeto con los campos del despacho')
+        return None
+
+    tipo = _texto(fila, 'tipo').lower() or 'directo'
+    if tipo not in TIPOS:
+        errores.append(f'Tipo desconocido: {tipo!r} (use {", ".join(TIPOS)})')
+
+    datos = {
+        'tipo': tipo,
+        'farmacia': _codigo(fila, 'farmacia', errores),
+        'motorista': _codigo(fila, 'motorista', errores),
+        'moto': _codigo(fila, 'moto', errores),
+        'farmacia_secundaria': _codigo(fila, 'farmacia_secundaria', errores, obligatorio=tipo == 'traslado'),
+        'direccion_entrega': _texto(fila, 'direccion_entrega'),
+        'codigo_orden': _texto(fila, 'codigo_orden') or None,
+        'observaciones': _texto(fila, 'observaciones') or None,
+        'numero_receta': _texto(fila, 'numero_receta') or None,
+        'nombre_medico': _texto(fila, 'nombre_medico') or None,
+        'fecha_emision': None,
+        'observaciones_receta': _texto(fila, 'observaciones_receta') or None,
+    }
+    if not datos['direccion_entrega']:
+        errores.append('Falta "direccion_entrega"')
+    for campo, largo in LARGOS.items():
+        if datos[campo] and len(datos[campo]) > largo:
+            errores.append(f'"{campo}" supera {largo} caracteres')
+
+    if tipo == 'receta':
+        for campo in ('numero_receta', 'nombre_medico'):
+            if not datos[campo]:
+                errores.append(f'Falta "{campo}" (despacho con receta)')
+        fecha = _texto(fila, 'fecha_emision')
+        try:
+            datos['fecha_emision'] = date.fromisoformat(fecha)
+        except ValueError:
+            errores.append(f'"fecha_emision" debe tener formato YYYY-MM-DD ({fecha!r})')
+    return datos
+
+
+def validar_lote(filas):
+    """Retorna (ResultadoLote, [(fila, datos)] válidos)"""
+    resultado = ResultadoLote(len(filas))
+    normalizadas = []
+    for numero, fila in enumerate(filas, start=1):
+        errores = []
+        datos = _normalizar(fila, errores)
+        if errores:
+            resultado.errores[numero] = errores
+        else:
+            normalizadas.append((numero, datos))
+
+    # Una consulta por tabla para todo el lote
+    farmacias = _existentes(Farmacia, {
+        d[campo] for _, d in normalizadas for campo in ('farmacia', 'farmacia_secundaria') if d[campo]
+    })
+    motoristas = _existentes(Motorista, {d['motorista'] for _, d in normalizadas})
+    motos = _existentes(Moto, {d['moto'] for _, d in normalizadas})
+
+    motoristas_inhabilitados = INHABILITADOS.motoristas()
+    motos_inhabilitadas = INHABILITADOS.motos()
+
+    validas = []
+    for numero, datos in normalizadas:
+        errores = []
+        if datos['farmacia'] not in farmacias:
+            errores.append(f"Farmacia {datos['farmacia']} no existe")
+        if datos['farmacia_secundaria'] and datos['farmacia_secundaria'] not in farmacias:
+            errores.append(f"Farmacia secundaria {datos['farmacia_secundaria']} no existe")
+        if datos['motorista'] not in motoristas:
+            errores.append(f"Motorista {datos['motorista']} no existe")
+        if datos['moto'] not in motos:
+            errores.append(f"Moto {datos['moto']} no existe")
+        if datos['motorista'] in motoristas_inhabilitados:
+            errores.append(f"Motorista {datos['motorista']} tiene la licencia vencida")
+        if datos['moto'] in motos_inhabilitadas:
+            errores.append(f"Moto {datos['moto']} tiene documentación vencida")
+        if errores:
+            resultado.errores[numero] = errores
+        else:
+            validas.append((numero, datos))
+    return resultado, validas
+
+
+# ============= INSERCIÓN =============
+
+def _asignar_ids(despachos):
+    """
+    MySQL no retorna los IDs generados por bulk_create. En un INSERT de
+    varias filas (un "simple insert" para InnoDB) el AUTO_INCREMENT reserva
+    un rango consecutivo de una vez, incluso con innodb_autoinc_lock_mode=2,
+    y LAST_INSERT_ID() de la conexión retorna el primero. Los IDs se asignan
+    en el orden de las filas, con el paso de auto_increment_increment.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT LAST_INSERT_ID(), @@auto_increment_increment')
+        primero, paso = cursor.fetchone()
+    for posicion, despacho in enumerate(despachos):
+        despacho.id_despacho = primero + posicion * paso
+
+
+def _insertar_tanda(despachos, recetas, resultado):
+    """Inserta una tanda de despachos, sus recetas (alineadas, None si no aplica), sus términos y eventos"""
+    if connection.features.can_return_rows_from_bulk_insert:
+        Despacho.objects.bulk_create(despachos)
+    else:
+        # Una sola sentencia INSERT para toda la tanda (ver _asignar_ids)
+        Despacho.objects.bulk_create(despachos, batch_size=len(despachos))
+        _asignar_ids(despachos)
+
+    RecetaDespacho.objects.bulk_create([
+        RecetaDespacho(id_despacho_id=despacho.id_despacho, **datos)
+        for despacho, datos in zip(despachos, recetas) if datos
+    ])
+
+    modelo = clave_modelo(Despacho)
+    IndiceBusqueda.objects.bulk_create([
+        IndiceBusqueda(modelo=modelo, termino=termino, objeto_id=despacho.id_despacho)
+        for despacho in despachos
+        for termino in terminos_de(despacho)
+    ], batch_size=TAMANO_TANDA)
+    DespachoEvento.objects.bulk_create([
+        nuevo_evento(despacho, None, despacho.estado, usuario=despacho.creado_por, lote=True)
+        for despacho in despachos
+    ])
+    resultado.creados.extend(despacho.id_despacho for despacho in despachos)
+
+
+def crear_lote(filas, usuario=None, parcial=False, simular=False, tamano_tanda=TAMANO_TANDA):
+    """
+    Valida e inserta un lote de despachos (estado ASIGNADO, como los
+    formularios de creación). Retorna un ResultadoLote.
+    """
+    resultado, validas = validar_lote(filas)
+    if simular or not validas or (resultado.errores and not parcial):
+        return resultado
+
+    tipos = {clave: catalogos.tipo_despacho(nombre) for clave, nombre in TIPOS.items()}
+    despachos, recetas = [], []
+    for _, datos in validas:
+        despacho = Despacho(
+            id_tipo_despacho=tipos[datos['tipo']],
+            id_farmacia_origen_id=datos['farmacia'],
+            id_farmacia_origen_secundaria_id=datos['farmacia_secundaria'],
+            id_motorista_id=datos['motorista'],
+            id_moto_id=datos['moto'],
+            direccion_entrega=datos['direccion_entrega'],
+            codigo_orden_farmacia=datos['codigo_orden'],
+            observaciones=datos['observaciones'],
+            estado='ASIGNADO',
+            creado_por=usuario,
+        )
+        despachos.append(despacho)
+        recetas.append({
+            'numero_receta': datos['numero_receta'],
+            'nombre_medico': datos['nombre_medico'],
+            'fecha_emision': datos['fecha_emision'],
+            'observaciones': datos['observaciones_receta'],
+        } if datos['tipo'] == 'receta' else None)
+
+    with transaction.atomic():
+        for inicio in range(0, len(despachos), tamano_tanda):
+            fin = inicio + tamano_tanda
+            _insertar_tanda(despachos[inicio:fin], recetas[inicio:fin], resultado)
+
+        # bulk_create no emite señales: resumen diario, contadores de carga e
+        # índice de recomendación en bloque
+        for clave, cantidad in Counter(clave_despacho(d) for d in despachos).items():
+            ajustar_resumen(clave, despachos=cantidad)
+        claves = [clave_carga(d) for d in despachos]
+        sumar_cargas(claves)
+        cargas = Counter(clave[0] for clave in claves if clave is not None)
+
+        def aplicar_cargas():
+            for motorista, cantidad in cargas.items():
+                INDICE.ajustar_carga(motorista, cantidad)
+        transaction.on_commit(aplicar_cargas)
+        resultado.aplicado = True
+
+    return resultado
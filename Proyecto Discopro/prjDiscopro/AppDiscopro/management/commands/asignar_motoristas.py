@@ -0,0 +1,57 @@
+"""
+Comando para aplicar un plan de asignaciones motorista-farmacia
+Uso: python manage.py asignar_motoristas plan.csv
+     python manage.py asignar_motoristas plan.json --reemplazar --simular
+
+CSV: columnas farmacia,motorista[,activo]  (activo: 1/0, si/no; por defecto 1)
+JSON: [{"farmacia": 1, "motorista": 5, "activo": true}, ...]
+Con --reemplazar, las asignaciones activas de las farmacias del plan que no
+aparecen en él se desactivan. Todo se aplica en una sola transacción.
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from AppDiscopro.asignaciones import PlanInvalido, aplicar_plan, leer_plan
+
+
+class Command(BaseCommand):
+    help = 'Aplica un plan CSV/JSON de asignaciones motorista-farmacia y muestra el diff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del plan (.csv o .json)')
+        parser.add_argument('--formato', choices=['csv', 'json'], help='Por defecto según la extensión')
+        parser.add_argument('--reemplazar', action='store_true',
+                            help='Desactiva las asignaciones de las farmacias del plan que no aparecen en él')
+        parser.add_argument('--simular', action='store_true', help='Muestra el diff sin aplicar cambios')
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        formato = options['formato'] or ruta.suffix.lstrip('.').lower()
+        try:
+            with ruta.open(encoding='utf-8-sig', newline='') as archivo:
+                plan = leer_plan(archivo, formato)
+        except OSError as e:
+            raise CommandError(f'No se pudo leer {ruta}: {e}')
+        except PlanInvalido as e:
+            raise CommandError(str(e))
+
+        resultado = aplicar_plan(plan, reemplazar=options['reemplazar'], simular=options['simular'])
+
+        if resultado.errores:
+            for error in resultado.errores:
+                self.stdout.write(self.style.ERROR(f'  ✗ {error}'))
+            raise CommandError('El plan tiene errores; no se aplicó ningún cambio')
+
+        for etiqueta, pares in (('+', resultado.creadas), ('↺', resultado.reactivadas), ('-', resultado.desactivadas)):
+            for farmacia, motorista in pares:
+                self.stdout.write(f'  {etiqueta} farmacia {farmacia} ← motorista {motorista}')
+
+        resumen = (
+            f'{len(resultado.creadas)} creadas, {len(resultado.reactivadas)} reactivadas, '
+            f'{len(resultado.desactivadas)} desactivadas, {len(resultado.sin_cambios)} sin cambios'
+        )
+        if options['simular']:
+            self.stdout.write(self.style.WARNING(f'\n⚠ Simulación (sin cambios): {resumen}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'\n✅ Plan aplicado: {resumen}'))
@@ -0,0 +1,87 @@
+"""
+Comando para medir el índice espacial de farmacias contra un recorrido lineal
+Uso: python manage.py comparar_farmacias_cercanas
+     python manage.py comparar_farmacias_cercanas --farmacias 10000 --consultas 500 --k 5
+
+Genera farmacias sintéticas dentro del territorio de Chile continental (no
+usa la base de datos), construye un IndiceFarmacias con ellas y compara
+tiempos y resultados contra un recorrido haversine de todas las farmacias.
+"""
+import heapq
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from AppDiscopro.geoespacial import IndiceFarmacias
+from AppDiscopro.utils import distancia_km
+
+LATITUDES = (-55.0, -17.5)
+LONGITUDES = (-75.5, -66.5)
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Compara el KD-tree de farmacias con un recorrido haversine lineal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farmacias', type=int, default=10000)
+        parser.add_argument('--consultas', type=int, default=200)
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        azar = random.Random(options['semilla'])
+        farmacias = [
+            {
+                'codigo_farmacia': codigo,
+                'nombre_farmacia': f'Farmacia {codigo}',
+                'latitud': azar.uniform(*LATITUDES),
+                'longitud': azar.uniform(*LONGITUDES),
+                'horario_apertura': None,
+                'horario_cierre': None,
+            }
+            for codigo in range(1, options['farmacias'] + 1)
+        ]
+        consultas = [(azar.uniform(*LATITUDES), azar.uniform(*LONGITUDES)) for _ in range(options['consultas'])]
+        k = options['k']
+
+        indice = IndiceFarmacias()
+        inicio = time.perf_counter()
+        indice.cargar(farmacias)
+        construccion = time.perf_counter() - inicio
+        indice._cargado_en = float('inf')  # sin recargas desde la base de datos
+
+        tiempos_lineal, tiempos_indice, diferencias = [], [], 0
+        for latitud, longitud in consultas:
+            inicio = time.perf_counter()
+            lineal = heapq.nsmallest(k, (
+                (distancia_km((latitud, longitud), (f['latitud'], f['longitud'])), f['codigo_farmacia'])
+                for f in farmacias
+            ))
+            tiempos_lineal.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            resultado = indice.cercanas(latitud, longitud, k)
+            tiempos_indice.append(time.perf_counter() - inicio)
+
+            if [c for _, c in lineal] != [f['codigo_farmacia'] for _, f in resultado]:
+                diferencias += 1
+
+        self.stdout.write(f'Farmacias: {len(farmacias)}  consultas: {len(consultas)}  k={k}')
+        self.stdout.write(f'Construcción del índice: {construccion * 1000:.1f} ms')
+        for nombre, tiempos in (('Recorrido lineal', tiempos_lineal), ('KD-tree', tiempos_indice)):
+            self.stdout.write(
+                f'  {nombre:<17} p50 {_percentil(tiempos, 0.5) * 1000:8.3f} ms   '
+                f'p99 {_percentil(tiempos, 0.99) * 1000:8.3f} ms   '
+                f'media {statistics.mean(tiempos) * 1000:8.3f} ms'
+            )
+        if diferencias:
+            self.stdout.write(self.style.ERROR(f'\n✗ {diferencias} consultas con resultados distintos'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ Mismos resultados en todas las consultas'))
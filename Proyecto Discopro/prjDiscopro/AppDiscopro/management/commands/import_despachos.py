@@ -0,0 +1,72 @@
+"""
+Comando para importar un lote de despachos desde CSV o JSON
+Uso: python manage.py import_despachos pedidos.csv
+     python manage.py import_despachos pedidos.json --parcial --usuario operadora1
+     python manage.py import_despachos pedidos.csv --simular
+
+CSV: columnas tipo,farmacia,motorista,moto,direccion_entrega[,codigo_orden,
+     observaciones,farmacia_secundaria,numero_receta,nombre_medico,
+     fecha_emision,observaciones_receta]  (ver AppDiscopro/lotes.py)
+JSON: [{"farmacia": 1, "motorista": 5, "moto": 3, "direccion_entrega": "..."}, ...]
+Sin --parcial, si alguna fila tiene errores no se importa ninguna.
+"""
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from AppDiscopro.lotes import TAMANO_TANDA, LoteInvalido, crear_lote, leer_lote
+from AppDiscopro.models import UsuarioPersonalizado
+
+MAX_ERRORES_MOSTRADOS = 50
+
+
+class Command(BaseCommand):
+    help = 'Importa un lote de despachos (CSV/JSON) con bulk_create y muestra los errores por fila'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del lote (.csv o .json)')
+        parser.add_argument('--formato', choices=['csv', 'json'], help='Por defecto según la extensión')
+        parser.add_argument('--parcial', action='store_true', help='Importa las filas válidas aunque otras tengan errores')
+        parser.add_argument('--simular', action='store_true', help='Solo valida, sin insertar')
+        parser.add_argument('--usuario', help='nombre_usuario que figura como creador de los despachos')
+        parser.add_argument('--tanda', type=int, default=TAMANO_TANDA, help='Filas por INSERT')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            usuario = UsuarioPersonalizado.objects.filter(nombre_usuario=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        ruta = Path(options['archivo'])
+        formato = options['formato'] or ruta.suffix.lstrip('.').lower()
+        try:
+            with ruta.open(encoding='utf-8-sig', newline='') as archivo:
+                filas = leer_lote(archivo, formato)
+        except OSError as e:
+            raise CommandError(f'No se pudo leer {ruta}: {e}')
+        except LoteInvalido as e:
+            raise CommandError(str(e))
+
+        inicio = time.perf_counter()
+        resultado = crear_lote(
+            filas, usuario=usuario, parcial=options['parcial'],
+            simular=options['simular'], tamano_tanda=options['tanda'],
+        )
+        duracion = time.perf_counter() - inicio
+
+        for fila, mensajes in sorted(resultado.errores.items())[:MAX_ERRORES_MOSTRADOS]:
+            self.stdout.write(self.style.ERROR(f"  ✗ Fila {fila}: {'; '.join(mensajes)}"))
+        if len(resultado.errores) > MAX_ERRORES_MOSTRADOS:
+            self.stdout.write(f'  ... y {len(resultado.errores) - MAX_ERRORES_MOSTRADOS} filas más con errores')
+
+        resumen = f'{resultado.total} filas, {len(resultado.errores)} con errores'
+        if options['simular']:
+            self.stdout.write(self.style.WARNING(f'\n⚠ Simulación (sin cambios): {resumen}'))
+        elif resultado.aplicado:
+            self.stdout.write(self.style.SUCCESS(
+                f'\n✅ {len(resultado.creados)} despachos importados en {duracion:.2f}s ({resumen})'
+            ))
+        else:
+            raise CommandError(f'No se importó ningún despacho ({resumen})')
@@ -0,0 +1,107 @@
+"""
+Comando para medir la latencia de una vista con y sin conexiones persistentes
+Uso: python manage.py medir_conexiones
+     python manage.py medir_conexiones --peticiones 500 --max-age 60 --usuario admin --despacho 1
+
+Pide `--peticiones` veces el detalle de un despacho (despacho_detail, una
+vista barata: un par de consultas por clave primaria) con el cliente de
+pruebas de Django, primero con CONN_MAX_AGE=0 y luego con CONN_MAX_AGE
+igual a `--max-age`, y muestra p50/p99 y cuántas conexiones se abrieron.
+
+El cliente de pruebas desconecta close_old_connections de request_started
+y request_finished, así que el comando lo llama antes y después de cada
+petición, igual que el manejador WSGI. Usar contra la base de datos real
+(MySQL): con SQLite abrir una conexión casi no cuesta.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from AppDiscopro.models import Despacho, UsuarioPersonalizado
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Compara p50/p99 de despacho_detail con CONN_MAX_AGE=0 y con conexiones persistentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=200)
+        parser.add_argument('--calentamiento', type=int, default=10)
+        parser.add_argument('--max-age', type=int, default=60, help='CONN_MAX_AGE del modo persistente')
+        parser.add_argument('--usuario', help='nombre_usuario con el que se inicia sesión (por defecto el primer usuario activo)')
+        parser.add_argument('--despacho', type=int, help='ID del despacho (por defecto el primero)')
+
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1 or options['max_age'] < 1:
+            raise CommandError('--peticiones y --max-age deben ser mayores que 0')
+
+        if options['usuario']:
+            usuario = UsuarioPersonalizado.objects.filter(nombre_usuario=options['usuario']).first()
+        else:
+            usuario = UsuarioPersonalizado.objects.filter(is_active=True).order_by('-is_superuser', 'pk').first()
+        if usuario is None:
+            raise CommandError('No se encontró el usuario para iniciar sesión')
+
+        despacho = options['despacho'] or Despacho.objects.order_by('id_despacho').values_list('pk', flat=True).first()
+        if despacho is None or not Despacho.objects.filter(pk=despacho).exists():
+            raise CommandError('Se necesita un despacho existente (--despacho)')
+        url = reverse('despacho_detail', args=[despacho])
+
+        cliente = Client()
+        cliente.force_login(usuario)
+
+        abiertas = []
+        contar = lambda **kwargs: abiertas.append(1)  # noqa: E731
+        connection_created.connect(contar, weak=False)
+        max_age_original = connection.settings_dict['CONN_MAX_AGE']
+        resultados = []
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for nombre, max_age in (('CONN_MAX_AGE=0', 0), (f"CONN_MAX_AGE={options['max_age']}", options['max_age'])):
+                    resultados.append((nombre, *self._medir(cliente, url, max_age, options, abiertas)))
+        finally:
+            connection_created.disconnect(contar)
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = max_age_original
+
+        self.stdout.write(f"{url}  peticiones: {options['peticiones']}  motor: {connection.vendor}")
+        for nombre, tiempos, conexiones in resultados:
+            self.stdout.write(
+                f'  {nombre:<17} p50 {_percentil(tiempos, 0.5) * 1000:8.3f} ms   '
+                f'p99 {_percentil(tiempos, 0.99) * 1000:8.3f} ms   '
+                f'media {statistics.mean(tiempos) * 1000:8.3f} ms   '
+                f'conexiones abiertas {conexiones}'
+            )
+
+    def _medir(self, cliente, url, max_age, options, abiertas):
+        """Retorna (tiempos, conexiones abiertas) de `--peticiones` GET con ese CONN_MAX_AGE"""
+        # close_at se calcula al conectar: se cierra para que la próxima conexión lo tome
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+        def pedir():
+            close_old_connections()      # request_started
+            inicio = time.perf_counter()
+            response = cliente.get(url, secure=True)
+            duracion = time.perf_counter() - inicio
+            close_old_connections()      # request_finished, después de responder
+            if response.status_code != 200:
+                raise CommandError(f'{url} respondió {response.status_code}')
+            return duracion
+
+        for _ in range(options['calentamiento']):
+            pedir()
+        del abiertas[:]
+        tiempos = [pedir() for _ in range(options['peticiones'])]
+        return tiempos, len(abiertas)
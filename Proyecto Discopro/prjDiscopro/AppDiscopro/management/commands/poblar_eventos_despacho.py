@@ -0,0 +1,77 @@
+"""
+Comando para poblar la bitácora de eventos de los despachos anteriores a ella
+Uso: python manage.py poblar_eventos_despacho
+     python manage.py poblar_eventos_despacho --tamano 5000
+
+Solo procesa despachos sin eventos, así que se puede repetir sin duplicar.
+Con los datos disponibles reconstruye por despacho:
+- la creación (en FECHA_CREACION, por CREADO_POR) como CREADO si el
+  despacho sigue creado y como ASIGNADO si no (así los crean los
+  formularios), y
+- si el estado actual es otro, un evento hacia ese estado: en
+  FECHA_FINALIZACION si está finalizado y si no en FECHA_CREACION, marcado
+  con `fecha_aproximada`. El motivo de los anulados se toma de la última
+  línea "[ANULADO] ..." de las observaciones.
+Los estados intermedios no quedaron registrados y no se inventan. Todos los
+eventos llevan `reconstruido` en sus datos.
+"""
+import re
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from AppDiscopro.eventos import nuevo_evento
+from AppDiscopro.models import Despacho, DespachoEvento
+
+ANULADO = re.compile(r'^\[ANULADO\]\s*(.*)$', re.MULTILINE)
+
+
+def motivo_anulacion(observaciones):
+    motivos = ANULADO.findall(observaciones or '')
+    return motivos[-1].strip() if motivos else None
+
+
+def eventos_de(despacho):
+    """Eventos reconstruidos (sin guardar) de un despacho sin bitácora"""
+    inicial = 'CREADO' if despacho.estado == 'CREADO' else 'ASIGNADO'
+    eventos = [nuevo_evento(
+        despacho, None, inicial, usuario=despacho.creado_por,
+        fecha=despacho.fecha_creacion, reconstruido=True,
+    )]
+    if despacho.estado != inicial:
+        exacta = despacho.estado == 'FINALIZADO' and despacho.fecha_finalizacion is not None
+        eventos.append(nuevo_evento(
+            despacho, inicial, despacho.estado,
+            fecha=despacho.fecha_finalizacion if exacta else despacho.fecha_creacion,
+            motivo=motivo_anulacion(despacho.observaciones) if despacho.estado == 'CANCELADO' else None,
+            reconstruido=True, fecha_aproximada=not exacta,
+        ))
+    return eventos
+
+
+class Command(BaseCommand):
+    help = 'Crea los eventos de creación y estado actual de los despachos sin bitácora'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamano', type=int, default=1000, help='Despachos por tanda')
+
+    def handle(self, *args, **options):
+        pendientes = Despacho.objects.filter(
+            ~Exists(DespachoEvento.objects.filter(id_despacho=OuterRef('pk')))
+        ).select_related('creado_por').order_by('id_despacho')
+
+        ultimo, despachos, eventos = 0, 0, 0
+        while True:
+            tanda = list(pendientes.filter(id_despacho__gt=ultimo)[:options['tamano']])
+            if not tanda:
+                break
+            nuevos = [evento for despacho in tanda for evento in eventos_de(despacho)]
+            DespachoEvento.objects.bulk_create(nuevos)
+            ultimo = tanda[-1].id_despacho
+            despachos += len(tanda)
+            eventos += len(nuevos)
+            self.stdout.write(f'  {despachos} despachos procesados...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ {eventos} eventos creados para {despachos} despachos sin bitácora'
+        ))
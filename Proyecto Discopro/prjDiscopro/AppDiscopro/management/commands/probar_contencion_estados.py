@@ -0,0 +1,122 @@
+"""
+Comando para probar las transiciones de estado bajo contención
+Uso: python manage.py probar_contencion_estados
+     python manage.py probar_contencion_estados --hilos 16 --rondas 50
+
+En cada ronda crea un despacho ASIGNADO de prueba (con la farmacia, el
+motorista y la moto del primer despacho existente), lo carga en `--hilos`
+hilos y los libera a la vez para que cada uno intente una transición
+distinta desde ASIGNADO (EN_CURSO, CANCELADO o FALLIDO) con
+estados.transicionar(). Verifica que exactamente un hilo gane, que el
+estado final sea el del ganador, que quede un solo evento de transición en
+la bitácora y que el resumen diario cuadre. Los
+despachos de prueba se eliminan al terminar.
+
+Pensado para MySQL (bloqueo por fila); con SQLite los hilos se serializan
+en el bloqueo de la base y la prueba igual debe pasar.
+"""
+import threading
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from AppDiscopro.estados import TRANSICIONES, transicionar
+from AppDiscopro.models import Despacho, DespachoEvento, DespachoResumenDiario
+from AppDiscopro.resumen import clave_despacho
+
+CODIGO_PRUEBA = 'CONTENCION'
+
+
+def _total_resumen(clave):
+    fecha, farmacia, tipo, _ = clave
+    return DespachoResumenDiario.objects.filter(
+        fecha=fecha, id_farmacia=farmacia, id_tipo_despacho=tipo
+    ).aggregate(total=Sum('total_despachos'))['total'] or 0
+
+
+class Command(BaseCommand):
+    help = 'Lanza transiciones concurrentes sobre un despacho y verifica que solo una gane'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--rondas', type=int, default=20)
+
+    def handle(self, *args, **options):
+        modelo = Despacho.objects.order_by('id_despacho').first()
+        if modelo is None:
+            raise CommandError('Se necesita al menos un despacho para copiar farmacia, motorista y moto')
+
+        destinos = sorted(TRANSICIONES['ASIGNADO'])
+        ganadores_por_estado = Counter()
+        fallas = 0
+        creados = []
+        try:
+            for ronda in range(1, options['rondas'] + 1):
+                despacho = Despacho.objects.create(
+                    id_tipo_despacho_id=modelo.id_tipo_despacho_id,
+                    id_farmacia_origen_id=modelo.id_farmacia_origen_id,
+                    id_motorista_id=modelo.id_motorista_id,
+                    id_moto_id=modelo.id_moto_id,
+                    direccion_entrega='Prueba de contención',
+                    codigo_orden_farmacia=CODIGO_PRUEBA,
+                    estado='ASIGNADO',
+                )
+                creados.append(despacho.pk)
+                clave = clave_despacho(despacho)
+                total_antes = _total_resumen(clave)
+
+                ganadores, errores = self._ronda(despacho.pk, options['hilos'], destinos)
+                final = Despacho.objects.get(pk=despacho.pk)
+                problemas = list(errores)
+                if len(ganadores) != 1:
+                    problemas.append(f'{len(ganadores)} ganadores')
+                elif final.estado != ganadores[0]:
+                    problemas.append(f'estado final {final.estado}, ganó {ganadores[0]}')
+                transiciones = DespachoEvento.objects.filter(id_despacho=despacho.pk, estado_anterior='ASIGNADO').count()
+                if transiciones != 1:
+                    problemas.append(f'{transiciones} eventos de transición')
+                if _total_resumen(clave) != total_antes:
+                    problemas.append('el resumen diario no cuadra')
+
+                if problemas:
+                    fallas += 1
+                    self.stdout.write(self.style.ERROR(f'  ✗ Ronda {ronda}: {"; ".join(problemas)}'))
+                else:
+                    ganadores_por_estado[ganadores[0]] += 1
+        finally:
+            for despacho in Despacho.objects.filter(pk__in=creados):
+                despacho.delete()
+
+        reparto = ', '.join(f'{estado}: {n}' for estado, n in sorted(ganadores_por_estado.items()))
+        self.stdout.write(f"{options['rondas']} rondas x {options['hilos']} hilos — ganadores: {reparto}")
+        if fallas:
+            raise CommandError(f'{fallas} rondas con resultados inconsistentes')
+        self.stdout.write(self.style.SUCCESS('\n✅ Exactamente una transición ganó en cada ronda'))
+
+    def _ronda(self, id_despacho, hilos, destinos):
+        barrera = threading.Barrier(hilos)
+        ganadores, errores = [], []
+        lock = threading.Lock()
+
+        def competir(numero):
+            try:
+                despacho = Despacho.objects.get(pk=id_despacho)
+                nuevo = destinos[numero % len(destinos)]
+                barrera.wait()
+                if transicionar(despacho, nuevo):
+                    with lock:
+                        ganadores.append(nuevo)
+            except OperationalError as e:
+                with lock:
+                    errores.append(f'hilo {numero}: {e}')
+            finally:
+                connection.close()
+
+        trabajadores = [threading.Thread(target=competir, args=(n,)) for n in range(hilos)]
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        return ganadores, errores
@@ -0,0 +1,41 @@
+"""
+Comando para purgar las lápidas de borrados antiguas
+Uso: python manage.py purgar_eliminaciones
+     python manage.py purgar_eliminaciones --simular   (solo cuenta)
+
+Borra en tandas las filas de Eliminacion más antiguas que
+cambios.RETENCION_ELIMINACIONES. Los clientes de la sincronización
+incremental con un cursor anterior reciben 410 y sincronizan desde cero
+(ver api_cambios). Pensado para correr a diario (cron).
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from AppDiscopro.cambios import RETENCION_ELIMINACIONES
+from AppDiscopro.models import Eliminacion
+
+TAMANO_TANDA = 5000
+
+
+class Command(BaseCommand):
+    help = 'Borra las lápidas de eliminación más antiguas que el período de retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Cuenta las lápidas sin borrarlas')
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - RETENCION_ELIMINACIONES
+        antiguas = Eliminacion.objects.filter(eliminado_en__lt=limite)
+
+        if options['simular']:
+            self.stdout.write(f'{antiguas.count()} lápidas anteriores al {limite:%d/%m/%Y}')
+            return
+
+        total = 0
+        while True:
+            claves = list(antiguas.order_by('eliminado_en', 'id_eliminacion').values_list('pk', flat=True)[:TAMANO_TANDA])
+            if not claves:
+                break
+            total += Eliminacion.objects.filter(pk__in=claves).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} lápidas anteriores al {limite:%d/%m/%Y} purgadas'))
@@ -0,0 +1,51 @@
+"""
+Comando para eliminar sesiones vencidas por lotes
+Uso: python manage.py purgar_sesiones
+     python manage.py purgar_sesiones --lote 500 --pausa 0.1
+
+A diferencia de `clearsessions` (un único DELETE sobre toda la tabla), borra
+de a `--lote` filas por transacción para no bloquear django_session.
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as SessionStoreDB
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Elimina por lotes las sesiones vencidas de la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Sesiones eliminadas por consulta (por defecto 1000)')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not issubclass(store, SessionStoreDB):
+            self.stdout.write(self.style.WARNING(
+                f'⚠ {settings.SESSION_ENGINE} no guarda sesiones en la base de datos; nada que purgar'
+            ))
+            return
+
+        Session = store.get_model_class()
+        ahora = timezone.now()
+        total = 0
+        while True:
+            claves = list(
+                Session.objects.filter(expire_date__lt=ahora)
+                .values_list('session_key', flat=True)[:options['lote']]
+            )
+            if not claves:
+                break
+            total += Session.objects.filter(session_key__in=claves).delete()[0]
+            self.stdout.write(f'  {total} sesiones eliminadas...')
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(f'\n✅ {total} sesiones vencidas eliminadas'))
@@ -0,0 +1,37 @@
+"""
+Comando para reconciliar los contadores de despachos abiertos
+Uso: python manage.py reconciliar_cargas
+     python manage.py reconciliar_cargas --simular   (solo informa)
+
+Recalcula con un GROUP BY por tabla los despachos ASIGNADO / EN_CURSO de
+cada motorista y moto, informa los contadores que no coinciden y los
+corrige (ver cargas.reconciliar_cargas). Pensado para correr
+periódicamente (cron) y una vez después de migrar para poblar
+CargaMotorista y CargaMoto.
+"""
+from django.core.management.base import BaseCommand
+
+from AppDiscopro.cargas import reconciliar_cargas
+
+
+class Command(BaseCommand):
+    help = 'Compara y corrige los contadores de despachos abiertos por motorista y moto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Informa las diferencias sin corregirlas')
+
+    def handle(self, *args, **options):
+        corregir = not options['simular']
+        discrepancias = reconciliar_cargas(corregir=corregir)
+
+        for d in sorted(discrepancias, key=lambda d: (d.recurso, d.codigo)):
+            self.stdout.write(self.style.WARNING(
+                f'  ⚠ {d.recurso} {d.codigo}: registrado {d.registrado}, real {d.real} ({d.diferencia:+d})'
+            ))
+
+        if not discrepancias:
+            self.stdout.write(self.style.SUCCESS('✅ Los contadores coinciden con los despachos abiertos'))
+        elif corregir:
+            self.stdout.write(self.style.SUCCESS(f'\n✅ {len(discrepancias)} contadores corregidos'))
+        else:
+            self.stdout.write(self.style.WARNING(f'\n{len(discrepancias)} contadores con diferencias (sin corregir)'))
@@ -0,0 +1,33 @@
+"""
+Comando para reconstruir el índice de búsqueda de los listados
+Uso: python manage.py reconstruir_indice_busqueda
+     python manage.py reconstruir_indice_busqueda --modelo motorista
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from AppDiscopro.busqueda import CAMPOS_INDEXADOS, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye IndiceBusqueda para todos los modelos buscables (o uno)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modelo',
+            help='Nombre del modelo a reindexar (farmacia, motorista, moto, despacho, usuariopersonalizado)'
+        )
+
+    def handle(self, *args, **options):
+        modelos = list(CAMPOS_INDEXADOS)
+        if options['modelo']:
+            modelos = [m for m in modelos if m._meta.model_name == options['modelo'].lower()]
+            if not modelos:
+                raise CommandError(f'Modelo no indexado: {options["modelo"]}')
+
+        for modelo in modelos:
+            total = reconstruir_indice(modelo)
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ {modelo._meta.verbose_name_plural}: {total} registros indexados')
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Índice de búsqueda reconstruido'))
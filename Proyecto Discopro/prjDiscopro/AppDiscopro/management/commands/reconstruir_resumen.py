@@ -0,0 +1,55 @@
+"""
+Comando para reconstruir el resumen diario de despachos
+Uso: python manage.py reconstruir_resumen --desde 2025-01-01 --hasta 2025-01-31
+     python manage.py reconstruir_resumen   (todo el historial)
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from AppDiscopro.models import Despacho
+from AppDiscopro.resumen import reconstruir_resumen
+from AppDiscopro.utils import limites_mes
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (formato esperado AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye DespachoResumenDiario para un rango de fechas (mes a mes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help='Primer día a reconstruir (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, help='Último día a reconstruir (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        hasta = options['hasta'] or timezone.localdate()
+        desde = options['desde']
+        if desde is None:
+            primero = Despacho.objects.order_by('fecha_creacion').values_list('fecha_creacion', flat=True).first()
+            if primero is None:
+                self.stdout.write(self.style.WARNING('⚠ No hay despachos registrados'))
+                return
+            desde = timezone.localtime(primero).date()
+
+        if desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta')
+
+        # Se procesa un mes por transacción para no bloquear la tabla completa
+        total_filas = 0
+        inicio_tramo = desde
+        while inicio_tramo <= hasta:
+            fin_tramo = min(limites_mes(inicio_tramo)[1], hasta)
+            filas = reconstruir_resumen(inicio_tramo, fin_tramo)
+            total_filas += filas
+            self.stdout.write(f'  {inicio_tramo} → {fin_tramo}: {filas} filas')
+            inicio_tramo = fin_tramo + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'\n✅ Resumen reconstruido ({total_filas} filas entre {desde} y {hasta})')
+        )
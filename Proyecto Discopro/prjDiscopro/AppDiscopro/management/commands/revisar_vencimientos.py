@@ -0,0 +1,55 @@
+"""
+Comando para revisar vencimientos de licencias y documentación de motos
+Uso: python manage.py revisar_vencimientos
+     python manage.py revisar_vencimientos --dias 60 --tamano 1000
+     python manage.py revisar_vencimientos --json > vencimientos.json
+
+Lista en orden de fecha las licencias y documentos vencidos o que vencen en
+los próximos `--dias` (ver vencimientos.proximos_vencimientos, que lee en
+tandas por los índices de FECHA_VENCIMIENTO) y renueva el conjunto de
+motoristas y motos inhabilitados en la caché. Pensado para correr a diario
+(cron).
+"""
+import json
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from AppDiscopro.vencimientos import INHABILITADOS, TAMANO_TANDA, proximos_vencimientos
+
+
+class Command(BaseCommand):
+    help = 'Lista licencias y documentos vencidos o por vencer y renueva el conjunto de inhabilitados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Días hacia adelante a revisar')
+        parser.add_argument('--tamano', type=int, default=TAMANO_TANDA, help='Filas por tanda de lectura')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON (una lista)')
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        INHABILITADOS.invalidar()
+        vencimientos = proximos_vencimientos(options['dias'], hoy=hoy, tamano=options['tamano'])
+
+        if options['json']:
+            self.stdout.write(json.dumps([v.como_dict() for v in vencimientos], ensure_ascii=False, indent=2))
+            return
+
+        vencidos = por_vencer = 0
+        for vencimiento in vencimientos:
+            if vencimiento.vencido(hoy):
+                vencidos += 1
+                self.stdout.write(self.style.ERROR(
+                    f'  ✗ {vencimiento.fecha:%d/%m/%Y} VENCIDO    {vencimiento.descripcion}'
+                ))
+            else:
+                por_vencer += 1
+                self.stdout.write(self.style.WARNING(
+                    f'  ⚠ {vencimiento.fecha:%d/%m/%Y} por vencer {vencimiento.descripcion}'
+                ))
+
+        self.stdout.write(
+            f"\n{vencidos} vencidos, {por_vencer} por vencer en {options['dias']} días — "
+            f"inhabilitados: {len(INHABILITADOS.motoristas())} motoristas, {len(INHABILITADOS.motos())} motos"
+        )
+        self.stdout.write(self.style.SUCCESS('\n✅ Revisión de vencimientos completa'))
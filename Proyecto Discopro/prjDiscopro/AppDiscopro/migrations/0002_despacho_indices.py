@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='despacho',
+            index=models.Index(fields=['fecha_creacion', 'id_despacho'], name='idx_despacho_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='despacho',
+            index=models.Index(fields=['estado', 'fecha_creacion'], name='idx_despacho_estado_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='despacho',
+            index=models.Index(fields=['id_tipo_despacho', 'fecha_creacion'], name='idx_despacho_tipo_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='despacho',
+            index=models.Index(fields=['id_motorista', 'fecha_creacion'], name='idx_despacho_motorista_fecha'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0002_despacho_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DespachoResumenDiario',
+            fields=[
+                ('id_resumen', models.AutoField(db_column='ID_RESUMEN', primary_key=True, serialize=False)),
+                ('fecha', models.DateField(db_column='FECHA')),
+                ('estado', models.CharField(choices=[('CREADO', 'Creado'), ('ASIGNADO', 'Asignado'), ('EN_CURSO', 'En Curso'), ('FINALIZADO', 'Finalizado'), ('CANCELADO', 'Cancelado'), ('FALLIDO', 'Fallido')], db_column='ESTADO', max_length=10)),
+                ('total_despachos', models.IntegerField(db_column='TOTAL_DESPACHOS', default=0)),
+                ('total_incidencias', models.IntegerField(db_column='TOTAL_INCIDENCIAS', default=0)),
+                ('id_farmacia', models.ForeignKey(db_column='ID_FARMACIA', on_delete=django.db.models.deletion.DO_NOTHING, related_name='resumenes_diarios', to='AppDiscopro.farmacia')),
+                ('id_region', models.ForeignKey(blank=True, db_column='ID_REGION', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='resumenes_diarios', to='AppDiscopro.region')),
+                ('id_tipo_despacho', models.ForeignKey(db_column='ID_TIPO_DESPACHO', on_delete=django.db.models.deletion.DO_NOTHING, related_name='resumenes_diarios', to='AppDiscopro.tipodespacho')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Despachos',
+                'verbose_name_plural': 'Resúmenes Diarios de Despachos',
+                'db_table': 'despacho_resumen_diario',
+                'unique_together': {('fecha', 'id_farmacia', 'id_tipo_despacho', 'estado')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0003_despacho_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('id_indice', models.BigAutoField(db_column='ID_INDICE', primary_key=True, serialize=False)),
+                ('modelo', models.CharField(db_column='MODELO', max_length=50)),
+                ('termino', models.CharField(db_column='TERMINO', max_length=50)),
+                ('objeto_id', models.IntegerField(db_column='OBJETO_ID')),
+            ],
+            options={
+                'verbose_name': 'Índice de Búsqueda',
+                'verbose_name_plural': 'Índice de Búsqueda',
+                'db_table': 'indice_busqueda',
+                'indexes': [models.Index(fields=['modelo', 'termino', 'objeto_id'], name='idx_busqueda_termino'), models.Index(fields=['modelo', 'objeto_id'], name='idx_busqueda_objeto')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0004_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='despacho',
+            index=models.Index(fields=['id_farmacia_origen', 'estado', 'fecha_creacion'], name='idx_despacho_farmacia_estado'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0005_despacho_farmacia_estado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DespachoEvento',
+            fields=[
+                ('id_evento', models.BigAutoField(db_column='ID_EVENTO', primary_key=True, serialize=False)),
+                ('estado_anterior', models.CharField(blank=True, choices=[('CREADO', 'Creado'), ('ASIGNADO', 'Asignado'), ('EN_CURSO', 'En Curso'), ('FINALIZADO', 'Finalizado'), ('CANCELADO', 'Cancelado'), ('FALLIDO', 'Fallido')], db_column='ESTADO_ANTERIOR', max_length=10, null=True)),
+                ('estado_nuevo', models.CharField(choices=[('CREADO', 'Creado'), ('ASIGNADO', 'Asignado'), ('EN_CURSO', 'En Curso'), ('FINALIZADO', 'Finalizado'), ('CANCELADO', 'Cancelado'), ('FALLIDO', 'Fallido')], db_column='ESTADO_NUEVO', max_length=10)),
+                ('fecha', models.DateTimeField(db_column='FECHA', default=django.utils.timezone.now)),
+                ('datos', models.JSONField(blank=True, db_column='DATOS', null=True)),
+                ('id_despacho', models.ForeignKey(db_column='ID_DESPACHO', on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='AppDiscopro.despacho')),
+                ('usuario', models.ForeignKey(blank=True, db_column='ID_USUARIO', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos_despacho', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Evento de Despacho',
+                'verbose_name_plural': 'Eventos de Despacho',
+                'db_table': 'despacho_evento',
+                'ordering': ['fecha', 'id_evento'],
+                'indexes': [models.Index(fields=['id_despacho', 'fecha'], name='idx_evento_despacho_fecha'), models.Index(fields=['estado_nuevo', 'fecha'], name='idx_evento_estado_fecha')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0006_despacho_evento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentacionmoto',
+            index=models.Index(fields=['fecha_vencimiento'], name='idx_documento_vencimiento'),
+        ),
+        migrations.AddIndex(
+            model_name='documentacionmoto',
+            index=models.Index(fields=['id_moto', 'tipo_documento', 'fecha_vencimiento'], name='idx_documento_moto_tipo'),
+        ),
+        migrations.AddIndex(
+            model_name='licenciamotorista',
+            index=models.Index(fields=['fecha_vencimiento'], name='idx_licencia_vencimiento'),
+        ),
+    ]
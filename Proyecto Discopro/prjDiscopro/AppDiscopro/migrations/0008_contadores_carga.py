@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0007_vencimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaMoto',
+            fields=[
+                ('id_moto', models.OneToOneField(db_column='ID_MOTO', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='carga', serialize=False, to='AppDiscopro.moto')),
+                ('despachos_abiertos', models.IntegerField(db_column='DESPACHOS_ABIERTOS', default=0)),
+            ],
+            options={
+                'verbose_name': 'Carga de Moto',
+                'verbose_name_plural': 'Cargas de Motos',
+                'db_table': 'carga_moto',
+            },
+        ),
+        migrations.CreateModel(
+            name='CargaMotorista',
+            fields=[
+                ('id_motorista', models.OneToOneField(db_column='ID_MOTORISTA', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='carga', serialize=False, to='AppDiscopro.motorista')),
+                ('despachos_abiertos', models.IntegerField(db_column='DESPACHOS_ABIERTOS', default=0)),
+            ],
+            options={
+                'verbose_name': 'Carga de Motorista',
+                'verbose_name_plural': 'Cargas de Motoristas',
+                'db_table': 'carga_motorista',
+            },
+        ),
+    ]
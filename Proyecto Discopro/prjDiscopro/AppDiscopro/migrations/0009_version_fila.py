@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0008_contadores_carga'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='despacho',
+            name='version',
+            field=models.PositiveIntegerField(db_column='VERSION', default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='farmacia',
+            name='version',
+            field=models.PositiveIntegerField(db_column='VERSION', default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='incidencia',
+            name='version',
+            field=models.PositiveIntegerField(db_column='VERSION', default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='moto',
+            name='version',
+            field=models.PositiveIntegerField(db_column='VERSION', default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='motorista',
+            name='version',
+            field=models.PositiveIntegerField(db_column='VERSION', default=1, editable=False),
+        ),
+    ]
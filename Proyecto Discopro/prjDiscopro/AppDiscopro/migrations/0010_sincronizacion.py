@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0009_version_fila'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id_eliminacion', models.BigAutoField(db_column='ID_ELIMINACION', primary_key=True, serialize=False)),
+                ('tipo', models.CharField(db_column='TIPO', max_length=20)),
+                ('clave', models.BigIntegerField(db_column='CLAVE')),
+                ('eliminado_en', models.DateTimeField(db_column='ELIMINADO_EN', default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Eliminación',
+                'verbose_name_plural': 'Eliminaciones',
+                'db_table': 'eliminacion',
+            },
+        ),
+        migrations.AddField(
+            model_name='asignacionmotoristafarmacia',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_column='ACTUALIZADO_EN'),
+        ),
+        migrations.AddField(
+            model_name='despacho',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_column='ACTUALIZADO_EN'),
+        ),
+        migrations.AddField(
+            model_name='incidencia',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_column='ACTUALIZADO_EN'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacionmotoristafarmacia',
+            index=models.Index(fields=['actualizado_en', 'id_asignacion'], name='idx_asignacion_actualizado'),
+        ),
+        migrations.AddIndex(
+            model_name='despacho',
+            index=models.Index(fields=['actualizado_en', 'id_despacho'], name='idx_despacho_actualizado'),
+        ),
+        migrations.AddIndex(
+            model_name='incidencia',
+            index=models.Index(fields=['actualizado_en', 'id_incidencia'], name='idx_incidencia_actualizado'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['eliminado_en', 'id_eliminacion'], name='idx_eliminacion_fecha'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Llena IndiceBusqueda con los registros existentes: la tabla se creó vacía
+# en 0004 y las señales solo indexan altas y cambios posteriores.
+
+from django.db import migrations
+
+TAMANO_LOTE = 1000
+
+
+def rellenar_indice(apps, schema_editor):
+    from AppDiscopro.busqueda import CAMPOS_INDEXADOS, terminos_de_valores
+
+    IndiceBusqueda = apps.get_model('AppDiscopro', 'IndiceBusqueda')
+    for modelo_actual, campos in CAMPOS_INDEXADOS.items():
+        clave = modelo_actual._meta.label_lower
+        if IndiceBusqueda.objects.filter(modelo=clave).exists():
+            continue  # ya indexado (reconstruir_indice_busqueda o señales)
+        modelo = apps.get_model(modelo_actual._meta.app_label, modelo_actual._meta.model_name)
+        lote = []
+        filas = modelo._default_manager.order_by().values_list('pk', *campos)
+        for pk, *valores in filas.iterator(chunk_size=TAMANO_LOTE):
+            lote.extend(
+                IndiceBusqueda(modelo=clave, termino=termino, objeto_id=pk)
+                for termino in terminos_de_valores(valores)
+            )
+            if len(lote) >= TAMANO_LOTE:
+                IndiceBusqueda.objects.bulk_create(lote)
+                lote = []
+        IndiceBusqueda.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AppDiscopro', '0010_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_indice, migrations.RunPython.noop, elidable=True),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.contrib.auth.models import Group, Permission
 from django.utils import timezone
@@ -57,6 +58,14 @@ class Rol(models.Model):
         ('SUPERVISOR', 'Supervisor'),
         ('OPERADORA', 'Operadora'),
     ]
+
+    # Permisos de cada rol (usados por UsuarioPersonalizado.tiene_permiso_*
+    # y por los indicadores de permisos de las plantillas)
+    PERMISOS = {
+        'GERENTE': ('crear_despacho', 'ver_reportes', 'gestionar_usuarios', 'anular_despacho'),
+        'SUPERVISOR': ('ver_reportes',),
+        'OPERADORA': ('crear_despacho',),
+    }
     
     id_rol = models.AutoField(db_column='ID_ROL', primary_key=True)
     nombre_rol = models.CharField(
@@ -75,6 +84,10 @@ class Rol(models.Model):
     def __str__(self):
         return self.get_nombre_rol_display()
 
+    @property
+    def permisos(self):
+        return self.PERMISOS.get(self.nombre_rol, ())
+
 
 class UsuarioPersonalizado(AbstractBaseUser, PermissionsMixin):
     """Modelo de usuario personalizado con roles"""
@@ -171,15 +184,15 @@ class UsuarioPersonalizado(AbstractBaseUser, PermissionsMixin):
     
     def tiene_permiso_crear_despacho(self):
         """Verifica si puede crear despachos"""
-        return self.id_rol.nombre_rol in ['GERENTE', 'OPERADORA']
+        return 'crear_despacho' in self.id_rol.permisos
     
     def tiene_permiso_ver_reportes(self):
         """Verifica si puede ver reportes completos"""
-        return self.id_rol.nombre_rol in ['GERENTE', 'SUPERVISOR']
+        return 'ver_reportes' in self.id_rol.permisos
     
     def tiene_permiso_gestionar_usuarios(self):
         """Verifica si puede gestionar usuarios"""
-        return self.id_rol.nombre_rol == 'GERENTE'
+        return 'gestionar_usuarios' in self.id_rol.permisos
 
 
 # ============= MODELOS GEOGRÁFICOS =============
@@ -211,9 +224,34 @@ class Comuna(models.Model):
         return f"{self.nombre_comuna} ({self.id_comuna})"
 
 
+# ============= VERSIÓN DE FILA =============
+
+class Versionado(models.Model):
+    """
+    Número de versión de la fila: sube en 1 con cada save() (con un
+    UPDATE ... SET VERSION = VERSION + 1, sin pisar otras escrituras) y en los
+    UPDATE de estados.transicionar. Los ETag de la API JSON (api.py) se
+    calculan con él sin serializar la fila.
+    """
+    version = models.PositiveIntegerField(db_column='VERSION', default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self.version = F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        # El valor nuevo se vuelve a leer solo si alguien lo consulta
+        del self.__dict__['version']
+
+
 # ============= MODELOS DE NEGOCIO =============
 
-class Farmacia(models.Model):
+class Farmacia(Versionado):
     codigo_farmacia = models.IntegerField(db_column='CODIGO_FARMACIA', primary_key=True)
     nombre_farmacia = models.CharField(db_column='NOMBRE_FARMACIA', max_length=50)
     direccion = models.CharField(db_column='DIRECCION', max_length=150)
@@ -234,7 +272,7 @@ class Farmacia(models.Model):
         return self.nombre_farmacia
 
 
-class Motorista(models.Model):
+class Motorista(Versionado):
     codigo_motorista = models.IntegerField(db_column='CODIGO_MOTORISTA', primary_key=True)
     rut = models.CharField(db_column='RUT', unique=True, max_length=12)
     pasaporte = models.CharField(db_column='PASAPORTE', unique=True, max_length=12, blank=True, null=True)
@@ -257,7 +295,7 @@ class Motorista(models.Model):
         return f"{self.nombre} {self.apellido_paterno} ({self.rut})"
 
 
-class Moto(models.Model):
+class Moto(Versionado):
     codigo_moto = models.IntegerField(db_column='CODIGO_MOTO', primary_key=True)
     patente = models.CharField(db_column='PATENTE', unique=True, max_length=10)
     marca = models.CharField(db_column='MARCA', max_length=50, blank=True, null=True)
@@ -284,10 +322,15 @@ class AsignacionMotoristaFarmacia(models.Model):
     id_motorista = models.ForeignKey('Motorista', on_delete=models.CASCADE, db_column='ID_MOTORISTA')
     fecha_asignacion = models.DateTimeField(auto_now_add=True)
     es_activo = models.BooleanField(default=True)
+    actualizado_en = models.DateTimeField(db_column='ACTUALIZADO_EN', auto_now=True)
     
     class Meta:
         db_table = 'asignacion_motorista_farmacia'
         unique_together = ('id_farmacia', 'id_motorista')
+        # Sincronización incremental (ver AppDiscopro/cambios.py)
+        indexes = [
+            models.Index(fields=['actualizado_en', 'id_asignacion'], name='idx_asignacion_actualizado'),
+        ]
         verbose_name = 'Asignación Motorista-Farmacia'
         verbose_name_plural = 'Asignaciones Motorista-Farmacia'
     
@@ -318,6 +361,10 @@ class LicenciaMotorista(models.Model):
 
     class Meta:
         db_table = 'licencia_motorista'
+        # Recorrido por fecha de vencimiento (ver AppDiscopro/vencimientos.py)
+        indexes = [
+            models.Index(fields=['fecha_vencimiento'], name='idx_licencia_vencimiento'),
+        ]
         verbose_name = 'Licencia de Motorista'
         verbose_name_plural = 'Licencias de Motoristas'
 
@@ -333,6 +380,12 @@ class DocumentacionMoto(models.Model):
     class Meta:
         db_table = 'documentacion_moto'
         unique_together = (('id_moto', 'anio', 'tipo_documento'),)
+        # Recorrido por fecha de vencimiento y documento vigente por tipo
+        # (ver AppDiscopro/vencimientos.py)
+        indexes = [
+            models.Index(fields=['fecha_vencimiento'], name='idx_documento_vencimiento'),
+            models.Index(fields=['id_moto', 'tipo_documento', 'fecha_vencimiento'], name='idx_documento_moto_tipo'),
+        ]
         verbose_name = 'Documentación de Moto'
         verbose_name_plural = 'Documentación de Motos'
 
@@ -340,6 +393,12 @@ class DocumentacionMoto(models.Model):
 # ============= MODELOS DE DESPACHO =============
 
 class TipoDespacho(models.Model):
+    # Nombres de los tipos usados por las vistas de creación
+    DIRECTO = 'DESPACHO DIRECTO'
+    CON_RECETA = 'DESPACHO CON RECETA'
+    CON_TRASLADO = 'DESPACHO CON TRASLADO'
+    CON_REENVIO = 'DESPACHO CON REENVIO'
+
     id_tipo_despacho = models.AutoField(db_column='ID_TIPO_DESPACHO', primary_key=True)
     nombre_tipo = models.CharField(db_column='NOMBRE_TIPO', unique=True, max_length=50)
     descripcion = models.CharField(db_column='DESCRIPCION', max_length=255, blank=True, null=True)
@@ -353,7 +412,7 @@ class TipoDespacho(models.Model):
         return self.nombre_tipo
 
 
-class Despacho(models.Model):
+class Despacho(Versionado):
     ESTADO_CHOICES = [
         ('CREADO', 'Creado'),
         ('ASIGNADO', 'Asignado'),
@@ -384,12 +443,24 @@ class Despacho(models.Model):
         related_name='despachos_creados',
         db_column='CREADO_POR'
     )
+    actualizado_en = models.DateTimeField(db_column='ACTUALIZADO_EN', auto_now=True)
 
     class Meta:
         db_table = 'despacho'
         ordering = ['-fecha_creacion']
         verbose_name = 'Despacho'
         verbose_name_plural = 'Despachos'
+        # Índices para los filtros por rango de FECHA_CREACION del listado y
+        # los reportes (ver AppDiscopro/utils.py: rango_dia / rango_fechas)
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id_despacho'], name='idx_despacho_fecha'),
+            models.Index(fields=['estado', 'fecha_creacion'], name='idx_despacho_estado_fecha'),
+            models.Index(fields=['id_tipo_despacho', 'fecha_creacion'], name='idx_despacho_tipo_fecha'),
+            models.Index(fields=['id_motorista', 'fecha_creacion'], name='idx_despacho_motorista_fecha'),
+            models.Index(fields=['id_farmacia_origen', 'estado', 'fecha_creacion'], name='idx_despacho_farmacia_estado'),
+            # Sincronización incremental (ver AppDiscopro/cambios.py)
+            models.Index(fields=['actualizado_en', 'id_despacho'], name='idx_despacho_actualizado'),
+        ]
     
     def __str__(self):
         return f"Despacho #{self.id_despacho} - {self.get_estado_display()}"
@@ -413,7 +484,7 @@ class RecetaDespacho(models.Model):
         return f"Receta - Despacho #{self.id_despacho.id_despacho}"
 
 
-class Incidencia(models.Model):
+class Incidencia(Versionado):
     TIPO_INCIDENCIA_CHOICES = [
         ('CLIENTE_AUSENTE', 'Cliente Ausente'),
         ('DIRECCION_INCORRECTA', 'Dirección Incorrecta'),
@@ -431,10 +502,15 @@ class Incidencia(models.Model):
     descripcion = models.TextField(db_column='DESCRIPCION')
     fecha_incidencia = models.DateTimeField(db_column='FECHA_INCIDENCIA', auto_now_add=True)
     resuelto = models.BooleanField(db_column='RESUELTO', default=False)
+    actualizado_en = models.DateTimeField(db_column='ACTUALIZADO_EN', auto_now=True)
     
     class Meta:
         db_table = 'incidencia'
         ordering = ['-fecha_incidencia']
+        # Sincronización incremental (ver AppDiscopro/cambios.py)
+        indexes = [
+            models.Index(fields=['actualizado_en', 'id_incidencia'], name='idx_incidencia_actualizado'),
+        ]
         verbose_name = 'Incidencia'
         verbose_name_plural = 'Incidencias'
     
@@ -442,6 +518,180 @@ class Incidencia(models.Model):
         return f"Incidencia #{self.id_incidencia} - {self.get_tipo_incidencia_display()}"
 
 
+class DespachoEvento(models.Model):
+    """
+    Bitácora de solo inserción de los despachos: una fila por creación y por
+    cada transición o modificación aplicada con estados.transicionar(), en la
+    misma transacción que el cambio. `estado_anterior` es nulo en la creación.
+    `datos` guarda el detalle (motivo de anulación, campos cambiados).
+    Los despachos anteriores se pueblan con
+    `python manage.py poblar_eventos_despacho`.
+    """
+    id_evento = models.BigAutoField(db_column='ID_EVENTO', primary_key=True)
+    id_despacho = models.ForeignKey('Despacho', models.CASCADE, db_column='ID_DESPACHO', related_name='eventos')
+    estado_anterior = models.CharField(db_column='ESTADO_ANTERIOR', max_length=10, choices=Despacho.ESTADO_CHOICES, blank=True, null=True)
+    estado_nuevo = models.CharField(db_column='ESTADO_NUEVO', max_length=10, choices=Despacho.ESTADO_CHOICES)
+    usuario = models.ForeignKey(
+        UsuarioPersonalizado,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='eventos_despacho',
+        db_column='ID_USUARIO'
+    )
+    fecha = models.DateTimeField(db_column='FECHA', default=timezone.now)
+    datos = models.JSONField(db_column='DATOS', blank=True, null=True)
+
+    class Meta:
+        db_table = 'despacho_evento'
+        ordering = ['fecha', 'id_evento']
+        # Línea de tiempo de un despacho y rangos por estado (tiempo en estado, SLA)
+        indexes = [
+            models.Index(fields=['id_despacho', 'fecha'], name='idx_evento_despacho_fecha'),
+            models.Index(fields=['estado_nuevo', 'fecha'], name='idx_evento_estado_fecha'),
+        ]
+        verbose_name = 'Evento de Despacho'
+        verbose_name_plural = 'Eventos de Despacho'
+
+    def __str__(self):
+        return f"Despacho #{self.id_despacho_id}: {self.estado_anterior or '-'} -> {self.estado_nuevo}"
+
+    @property
+    def es_creacion(self):
+        return self.estado_anterior is None
+
+    @property
+    def detalle(self):
+        """Texto breve del contenido de `datos` para la línea de tiempo"""
+        datos = self.datos or {}
+        partes = []
+        if datos.get('motivo'):
+            partes.append(f"Motivo: {datos['motivo']}")
+        if datos.get('cambios'):
+            partes.append('Cambió: ' + ', '.join(sorted(datos['cambios'])))
+        if datos.get('lote'):
+            partes.append('Carga masiva')
+        if datos.get('reconstruido'):
+            partes.append('Reconstruido')
+        return ' · '.join(partes)
+
+
+class Eliminacion(models.Model):
+    """
+    Lápida de un registro borrado (despacho, incidencia, asignación, farmacia,
+    motorista o moto) para que los clientes de la sincronización incremental
+    (cambios.py) lo quiten de su copia. La escribe una señal post_delete en la
+    misma transacción que el borrado; las más antiguas que
+    RETENCION_ELIMINACIONES se purgan con `python manage.py purgar_eliminaciones`.
+    """
+    id_eliminacion = models.BigAutoField(db_column='ID_ELIMINACION', primary_key=True)
+    tipo = models.CharField(db_column='TIPO', max_length=20)
+    clave = models.BigIntegerField(db_column='CLAVE')
+    eliminado_en = models.DateTimeField(db_column='ELIMINADO_EN', default=timezone.now)
+
+    class Meta:
+        db_table = 'eliminacion'
+        indexes = [
+            models.Index(fields=['eliminado_en', 'id_eliminacion'], name='idx_eliminacion_fecha'),
+        ]
+        verbose_name = 'Eliminación'
+        verbose_name_plural = 'Eliminaciones'
+
+    def __str__(self):
+        return f"{self.tipo} #{self.clave} eliminado"
+
+
+# ============= MODELOS DE REPORTES =============
+
+class DespachoResumenDiario(models.Model):
+    """
+    Resumen diario precalculado de despachos para los reportes.
+    Una fila por (fecha, farmacia, tipo, estado); la región se guarda
+    desnormalizada porque depende solo de la farmacia. Se mantiene de forma
+    incremental desde AppDiscopro/resumen.py y se reconstruye con
+    `python manage.py reconstruir_resumen`.
+    """
+    id_resumen = models.AutoField(db_column='ID_RESUMEN', primary_key=True)
+    fecha = models.DateField(db_column='FECHA')
+    id_farmacia = models.ForeignKey('Farmacia', models.DO_NOTHING, db_column='ID_FARMACIA', related_name='resumenes_diarios')
+    id_region = models.ForeignKey('Region', models.DO_NOTHING, db_column='ID_REGION', blank=True, null=True, related_name='resumenes_diarios')
+    id_tipo_despacho = models.ForeignKey('TipoDespacho', models.DO_NOTHING, db_column='ID_TIPO_DESPACHO', related_name='resumenes_diarios')
+    estado = models.CharField(db_column='ESTADO', max_length=10, choices=Despacho.ESTADO_CHOICES)
+    total_despachos = models.IntegerField(db_column='TOTAL_DESPACHOS', default=0)
+    total_incidencias = models.IntegerField(db_column='TOTAL_INCIDENCIAS', default=0)
+
+    class Meta:
+        db_table = 'despacho_resumen_diario'
+        unique_together = (('fecha', 'id_farmacia', 'id_tipo_despacho', 'estado'),)
+        verbose_name = 'Resumen Diario de Despachos'
+        verbose_name_plural = 'Resúmenes Diarios de Despachos'
+
+    def __str__(self):
+        return f"{self.fecha} - {self.id_farmacia_id} - {self.estado}: {self.total_despachos}"
+
+
+# ============= MODELOS DE CARGA =============
+
+class CargaMotorista(models.Model):
+    """
+    Despachos abiertos (ASIGNADO / EN_CURSO) a nombre de cada motorista.
+    Tabla aparte de Motorista para que guardar la ficha del motorista no
+    pise los contadores. Se mantiene con F() desde AppDiscopro/cargas.py y
+    se corrige con `python manage.py reconciliar_cargas`.
+    """
+    id_motorista = models.OneToOneField('Motorista', models.CASCADE, db_column='ID_MOTORISTA', primary_key=True, related_name='carga')
+    despachos_abiertos = models.IntegerField(db_column='DESPACHOS_ABIERTOS', default=0)
+
+    class Meta:
+        db_table = 'carga_motorista'
+        verbose_name = 'Carga de Motorista'
+        verbose_name_plural = 'Cargas de Motoristas'
+
+    def __str__(self):
+        return f"{self.id_motorista_id}: {self.despachos_abiertos}"
+
+
+class CargaMoto(models.Model):
+    """Despachos abiertos (ASIGNADO / EN_CURSO) con cada moto (ver CargaMotorista)"""
+    id_moto = models.OneToOneField('Moto', models.CASCADE, db_column='ID_MOTO', primary_key=True, related_name='carga')
+    despachos_abiertos = models.IntegerField(db_column='DESPACHOS_ABIERTOS', default=0)
+
+    class Meta:
+        db_table = 'carga_moto'
+        verbose_name = 'Carga de Moto'
+        verbose_name_plural = 'Cargas de Motos'
+
+    def __str__(self):
+        return f"{self.id_moto_id}: {self.despachos_abiertos}"
+
+
+# ============= MODELOS DE BÚSQUEDA =============
+
+class IndiceBusqueda(models.Model):
+    """
+    Índice invertido para la búsqueda de los listados: una fila por cada
+    término normalizado de un registro. Se mantiene desde
+    AppDiscopro/busqueda.py y se reconstruye con
+    `python manage.py reconstruir_indice_busqueda`.
+    """
+    id_indice = models.BigAutoField(db_column='ID_INDICE', primary_key=True)
+    modelo = models.CharField(db_column='MODELO', max_length=50)
+    termino = models.CharField(db_column='TERMINO', max_length=50)
+    objeto_id = models.IntegerField(db_column='OBJETO_ID')
+
+    class Meta:
+        db_table = 'indice_busqueda'
+        indexes = [
+            models.Index(fields=['modelo', 'termino', 'objeto_id'], name='idx_busqueda_termino'),
+            models.Index(fields=['modelo', 'objeto_id'], name='idx_busqueda_objeto'),
+        ]
+        verbose_name = 'Índice de Búsqueda'
+        verbose_name_plural = 'Índice de Búsqueda'
+
+    def __str__(self):
+        return f"{self.modelo}:{self.termino} -> {self.objeto_id}"
+
+
 # ============= MODELO ANTIGUO (MANTENER PARA COMPATIBILIDAD) =============
 
 class Usuario(models.Model):
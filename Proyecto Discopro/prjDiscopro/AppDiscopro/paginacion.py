@@ -0,0 +1,98 @@
+"""
+Paginación por cursor (keyset) para el listado de despachos
+Uso: /despacho/?paginacion=cursor  (opcional, el modo por defecto sigue siendo
+el Paginator numerado de Django)
+"""
+import base64
+import hashlib
+from datetime import datetime
+
+from django.core.cache import cache
+
+from .utils import filtro_antes_de, filtro_despues_de
+
+TIEMPO_CACHE_TOTAL = 300  # segundos
+
+
+# ============= CURSORES =============
+
+def codificar_cursor(despacho):
+    """Cursor opaco a partir de (fecha_creacion, id_despacho)"""
+    valor = f"{despacho.fecha_creacion.isoformat()}|{despacho.id_despacho}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Retorna (fecha_creacion, id_despacho) o None si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        fecha, id_despacho = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(fecha), int(id_despacho)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# ============= PÁGINA =============
+
+class PaginaCursor:
+    """Página de resultados con enlaces al cursor anterior y siguiente"""
+
+    def __init__(self, object_list, cursor_anterior=None, cursor_siguiente=None):
+        self.object_list = object_list
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginar_por_cursor(queryset, despues=None, antes=None, tamano=15):
+    """
+    Retorna una PaginaCursor de `tamano` despachos en orden
+    (-fecha_creacion, -id_despacho). `despues` / `antes` son cursores
+    decodificados; se lee una fila extra para saber si hay más páginas.
+    """
+    queryset = queryset.order_by('-fecha_creacion', '-id_despacho')
+
+    if antes:
+        filas = list(queryset.filter(filtro_antes_de(*antes)).reverse()[:tamano + 1])
+        hay_anterior = len(filas) > tamano
+        filas = filas[:tamano][::-1]
+        hay_siguiente = True
+    else:
+        if despues:
+            queryset = queryset.filter(filtro_despues_de(*despues))
+        filas = list(queryset[:tamano + 1])
+        hay_siguiente = len(filas) > tamano
+        filas = filas[:tamano]
+        hay_anterior = despues is not None
+
+    if not filas:
+        return PaginaCursor([])
+    return PaginaCursor(
+        filas,
+        cursor_anterior=codificar_cursor(filas[0]) if hay_anterior else None,
+        cursor_siguiente=codificar_cursor(filas[-1]) if hay_siguiente else None,
+    )
+
+
+# ============= TOTAL EN CACHÉ =============
+
+def total_en_cache(queryset, params):
+    """
+    COUNT(*) del queryset guardado en caché por combinación de filtros, para
+    no repetir el conteo en cada cambio de página.
+    """
+    filtros = sorted((k, v) for k, v in params.items() if k not in ('page', 'despues', 'antes'))
+    clave = 'despachos_total:' + hashlib.md5(repr(filtros).encode()).hexdigest()
+    return cache.get_or_set(clave, queryset.count, TIEMPO_CACHE_TOTAL)
@@ -0,0 +1,320 @@
+"""
+Recomendación de motoristas para un despacho nuevo
+
+Ordena a los motoristas candidatos para una farmacia de origen según:
+- asignación activa a la farmacia de origen (AsignacionMotoristaFarmacia)
+- carga actual: despachos ASIGNADO / EN_CURSO a su nombre
+- disponibilidad de moto (moto asignada o moto personal)
+- distancia entre la farmacia de origen y la farmacia asignada al motorista
+  más cercana (latitud/longitud de Farmacia)
+Los motoristas con licencia vencida no se recomiendan y una moto con
+documentación vencida no cuenta como moto disponible
+(vencimientos.INHABILITADOS).
+
+Los datos viven en un índice en memoria (INDICE) que se carga completo la
+primera vez y luego se actualiza con deltas desde las señales (signals.py)
+y desde asignaciones.aplicar_plan(). Como cada proceso tiene su propio
+índice, además se recarga cada REFRESCO_COMPLETO segundos para recoger
+cambios hechos por otros procesos. Esa recarga corre en un hilo aparte
+(la petición que la dispara se responde con el índice vigente) y los deltas
+que llegan mientras tanto se anotan y se vuelven a aplicar sobre el índice
+nuevo, para que no se pierdan. Una recomendación no consulta la base de
+datos: recorre el índice en memoria y solo calcula distancias para los
+motoristas que todavía pueden entrar entre los mejores.
+
+Uso: recomendar_motoristas(codigo_farmacia, limite=5)
+"""
+import heapq
+import logging
+import threading
+import time
+
+from django.db import connections
+
+from .models import AsignacionMotoristaFarmacia, CargaMotorista, Farmacia, Moto, Motorista
+from .utils import distancia_km
+from .vencimientos import INHABILITADOS
+
+ESTADOS_CON_CARGA = ('ASIGNADO', 'EN_CURSO')
+REFRESCO_COMPLETO = 60
+
+# Orden en que reconstruir() lee cada parte del índice (ver IndiceMotoristas._registrar)
+SECCIONES = ('motoristas', 'motos', 'asignaciones', 'carga', 'coordenadas')
+
+# Pesos del puntaje (menor es mejor)
+PESO_CARGA = 10              # por cada despacho abierto
+PESO_KM = 1                  # por kilómetro de distancia
+PENALIZACION_NO_ASIGNADO = 50
+PENALIZACION_SIN_DISTANCIA = 25
+PENALIZACION_SIN_MOTO = 100
+
+logger = logging.getLogger('AppDiscopro')
+
+
+class IndiceMotoristas:
+    """Estado en memoria usado por las recomendaciones"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reconstruccion = threading.Lock()    # una reconstrucción a la vez
+        self._cargado_en = None
+        self._diario = None         # deltas recibidos durante una reconstrucción
+        self.motoristas = {}        # codigo -> {'nombre', 'moto_personal'}
+        self.motos = {}             # codigo_motorista -> codigo_moto
+        self.por_farmacia = {}      # codigo_farmacia -> {codigo_motorista}
+        self.por_motorista = {}     # codigo_motorista -> {codigo_farmacia}
+        self.carga = {}             # codigo_motorista -> despachos abiertos
+        self.coordenadas = {}       # codigo_farmacia -> (latitud, longitud)
+
+    @property
+    def cargado(self):
+        return self._cargado_en is not None
+
+    def invalidar(self):
+        with self._lock:
+            self._cargado_en = None
+
+    # ---- carga completa ----
+
+    def _leer_motoristas(self):
+        return {
+            m['codigo_motorista']: {
+                'nombre': f"{m['nombre']} {m['apellido_paterno']}",
+                'moto_personal': bool(m['incluye_moto_personal']),
+            }
+            for m in Motorista.objects.values(
+                'codigo_motorista', 'nombre', 'apellido_paterno', 'incluye_moto_personal'
+            )
+        }
+
+    def _leer_motos(self):
+        return dict(
+            Moto.objects.filter(id_motorista_asignado__isnull=False)
+            .values_list('id_motorista_asignado', 'codigo_moto')
+        )
+
+    def _leer_asignaciones(self):
+        por_farmacia, por_motorista = {}, {}
+        for farmacia, motorista in AsignacionMotoristaFarmacia.objects.filter(
+            es_activo=True
+        ).values_list('id_farmacia', 'id_motorista'):
+            por_farmacia.setdefault(farmacia, set()).add(motorista)
+            por_motorista.setdefault(motorista, set()).add(farmacia)
+        return por_farmacia, por_motorista
+
+    def _leer_carga(self):
+        # Contadores materializados (cargas.py) en vez de un COUNT sobre despacho
+        return dict(
+            CargaMotorista.objects.filter(despachos_abiertos__gt=0)
+            .values_list('id_motorista', 'despachos_abiertos')
+        )
+
+    def _leer_coordenadas(self):
+        return {
+            codigo: (float(latitud), float(longitud))
+            for codigo, latitud, longitud in Farmacia.objects.filter(
+                latitud__isnull=False, longitud__isnull=False
+            ).values_list('codigo_farmacia', 'latitud', 'longitud')
+        }
+
+    def _reconstruir(self):
+        """Lee todo el índice; llamar con self._reconstruccion tomado"""
+        with self._lock:
+            self._diario = []
+        try:
+            # marcas[seccion]: deltas anotados antes de empezar a leerla. Esos
+            # ya estaban confirmados (se aplican en on_commit) y la lectura los
+            # incluye; los posteriores se vuelven a aplicar sobre el índice nuevo
+            marcas, leido = {}, {}
+            for seccion in SECCIONES:
+                with self._lock:
+                    marcas[seccion] = len(self._diario)
+                leido[seccion] = getattr(self, f'_leer_{seccion}')()
+            with self._lock:
+                self.motoristas, self.motos = leido['motoristas'], leido['motos']
+                self.por_farmacia, self.por_motorista = leido['asignaciones']
+                self.carga, self.coordenadas = leido['carga'], leido['coordenadas']
+                self._cargado_en = time.monotonic()
+                for posicion, (seccion, aplicar, argumentos) in enumerate(self._diario):
+                    if posicion >= marcas[seccion]:
+                        aplicar(*argumentos)
+        finally:
+            with self._lock:
+                self._diario = None
+
+    def reconstruir(self):
+        with self._reconstruccion:
+            self._reconstruir()
+
+    def _refrescar_en_segundo_plano(self):
+        if not self._reconstruccion.acquire(blocking=False):
+            return  # ya hay una recarga en curso
+        def refrescar():
+            try:
+                self._reconstruir()
+            except Exception:
+                logger.exception('No se pudo recargar el índice de recomendación')
+            finally:
+                self._reconstruccion.release()
+                connections.close_all()  # conexiones propias de este hilo
+        threading.Thread(target=refrescar, name='recarga-recomendacion', daemon=True).start()
+
+    def asegurar(self):
+        """Carga el índice si falta (en la petición); si está vencido lo recarga en segundo plano"""
+        cargado_en = self._cargado_en
+        if cargado_en is None:
+            with self._reconstruccion:
+                if not self.cargado:
+                    self._reconstruir()
+        elif time.monotonic() - cargado_en > REFRESCO_COMPLETO:
+            self._refrescar_en_segundo_plano()
+
+    # ---- deltas (se ignoran si el índice aún no está cargado) ----
+
+    def _registrar(self, seccion, aplicar, *argumentos):
+        """Aplica un delta y, si hay una reconstrucción en curso, lo anota para repetirlo"""
+        with self._lock:
+            if self._diario is not None:
+                self._diario.append((seccion, aplicar, argumentos))
+            if self.cargado:
+                aplicar(*argumentos)
+
+    def asignacion(self, farmacia, motorista, activo):
+        self._registrar('asignaciones', self._asignacion, farmacia, motorista, activo)
+
+    def _asignacion(self, farmacia, motorista, activo):
+        if activo:
+            self.por_farmacia.setdefault(farmacia, set()).add(motorista)
+            self.por_motorista.setdefault(motorista, set()).add(farmacia)
+        else:
+            self.por_farmacia.get(farmacia, set()).discard(motorista)
+            self.por_motorista.get(motorista, set()).discard(farmacia)
+
+    def ajustar_carga(self, motorista, delta):
+        if motorista is not None:
+            self._registrar('carga', self._ajustar_carga, motorista, delta)
+
+    def _ajustar_carga(self, motorista, delta):
+        self.carga[motorista] = max(self.carga.get(motorista, 0) + delta, 0)
+
+    def motorista(self, instancia, eliminado=False):
+        datos = None if eliminado else {
+            'nombre': f'{instancia.nombre} {instancia.apellido_paterno}',
+            'moto_personal': bool(instancia.incluye_moto_personal),
+        }
+        self._registrar('motoristas', self._motorista, instancia.pk, datos)
+
+    def _motorista(self, codigo, datos):
+        if datos is None:
+            self.motoristas.pop(codigo, None)
+        else:
+            self.motoristas[codigo] = datos
+
+    def moto(self, codigo_moto, motorista_anterior, motorista_nuevo):
+        self._registrar('motos', self._moto, codigo_moto, motorista_anterior, motorista_nuevo)
+
+    def _moto(self, codigo_moto, motorista_anterior, motorista_nuevo):
+        if motorista_anterior is not None and self.motos.get(motorista_anterior) == codigo_moto:
+            del self.motos[motorista_anterior]
+        if motorista_nuevo is not None:
+            self.motos[motorista_nuevo] = codigo_moto
+
+    def farmacia(self, instancia, eliminada=False):
+        coordenadas = None
+        if not eliminada and instancia.latitud is not None and instancia.longitud is not None:
+            coordenadas = (float(instancia.latitud), float(instancia.longitud))
+        self._registrar('coordenadas', self._farmacia, instancia.pk, coordenadas)
+
+    def _farmacia(self, codigo, coordenadas):
+        if coordenadas is None:
+            self.coordenadas.pop(codigo, None)
+        else:
+            self.coordenadas[codigo] = coordenadas
+
+    # ---- consulta ----
+
+    def recomendar(self, farmacia, limite=5):
+        self.asegurar()
+        if limite <= 0:
+            return []
+        motoristas_inhabilitados = INHABILITADOS.motoristas()
+        motos_inhabilitadas = INHABILITADOS.motos()
+        with self._lock:
+            asignados = self.por_farmacia.get(farmacia, set())
+            origen = self.coordenadas.get(farmacia)
+            distancias = {}
+
+            def distancia_a(codigo_farmacia):
+                # Solo las farmacias de los motoristas que se llegan a evaluar
+                if codigo_farmacia not in distancias:
+                    coordenadas = self.coordenadas.get(codigo_farmacia)
+                    distancias[codigo_farmacia] = (
+                        None if origen is None or coordenadas is None else distancia_km(origen, coordenadas)
+                    )
+                return distancias[codigo_farmacia]
+
+            # Parte del puntaje que no depende de la distancia: es una cota
+            # inferior del puntaje final (la distancia solo suma)
+            pendientes = []
+            for codigo, datos in self.motoristas.items():
+                if codigo in motoristas_inhabilitados:
+                    continue
+                asignado = codigo in asignados
+                carga = self.carga.get(codigo, 0)
+                codigo_moto = self.motos.get(codigo)
+                if codigo_moto in motos_inhabilitadas:
+                    codigo_moto = None
+                tiene_moto = codigo_moto is not None or datos['moto_personal']
+                base = carga * PESO_CARGA
+                if not asignado:
+                    base += PENALIZACION_NO_ASIGNADO
+                if not tiene_moto:
+                    base += PENALIZACION_SIN_MOTO
+                pendientes.append((base, codigo, datos['nombre'], asignado, carga, codigo_moto, tiene_moto))
+            heapq.heapify(pendientes)
+
+            # Se evalúan de menor a mayor cota; cuando la cota supera al peor
+            # de los `limite` mejores, ningún motorista restante puede entrar
+            peores = []     # los `limite` mejores como (-puntaje, -codigo)
+            candidatos = []
+            while pendientes:
+                base, codigo, nombre, asignado, carga, codigo_moto, tiene_moto = heapq.heappop(pendientes)
+                if len(peores) == limite and base > -peores[0][0]:
+                    break
+                if asignado:
+                    distancia = 0.0
+                else:
+                    conocidas = [
+                        d for d in map(distancia_a, self.por_motorista.get(codigo, ())) if d is not None
+                    ]
+                    distancia = min(conocidas) if conocidas else None
+                puntaje = base + (PENALIZACION_SIN_DISTANCIA if distancia is None else distancia * PESO_KM)
+                candidatos.append((puntaje, codigo, nombre, asignado, distancia, carga, codigo_moto, tiene_moto))
+                if len(peores) < limite:
+                    heapq.heappush(peores, (-puntaje, -codigo))
+                else:
+                    heapq.heappushpop(peores, (-puntaje, -codigo))
+
+        mejores = heapq.nsmallest(limite, candidatos)
+        return [
+            {
+                'codigo_motorista': codigo,
+                'nombre': nombre,
+                'asignado': asignado,
+                'distancia_km': None if distancia is None else round(distancia, 1),
+                'carga': carga,
+                'codigo_moto': codigo_moto,
+                'tiene_moto': tiene_moto,
+                'puntaje': round(puntaje, 1),
+            }
+            for puntaje, codigo, nombre, asignado, distancia, carga, codigo_moto, tiene_moto in mejores
+        ]
+
+
+INDICE = IndiceMotoristas()
+
+
+def recomendar_motoristas(codigo_farmacia, limite=5):
+    """Lista de candidatos ordenados (el primero es el recomendado)"""
+    return INDICE.recomendar(codigo_farmacia, limite)
+
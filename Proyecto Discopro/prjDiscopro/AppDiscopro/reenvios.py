@@ -0,0 +1,24 @@
+"""
+Cola de reenvíos: despachos FALLIDO que todavía no tienen un reenvío
+
+La misma definición la usan la vista despacho_reenvio_cola, la fuente de
+autocompletado 'despacho_fallido' y la validación de
+DespachoConReenvioForm, de modo que un despacho ya reenviado deja de
+ofrecerse y no puede reenviarse dos veces.
+
+El filtro `NOT EXISTS` se resuelve con el índice de la FK
+ID_DESPACHO_ORIGINAL; el estado, la farmacia y las fechas usan los índices
+idx_despacho_estado_fecha e idx_despacho_farmacia_estado.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import Despacho
+
+TAMANO_COLA = 20
+
+
+def pendientes_de_reenvio():
+    """Despachos FALLIDO sin reenvíos"""
+    return Despacho.objects.filter(estado='FALLIDO').exclude(
+        Exists(Despacho.objects.filter(id_despacho_original=OuterRef('pk')))
+    )
@@ -0,0 +1,69 @@
+"""
+Construcción de los datos de reportes de despachos
+Los reportes diario, mensual y el PDF se generan a partir del mismo
+diccionario retornado por construir_reporte().
+"""
+from django.db.models import Q, Sum
+
+from . import catalogos
+from .models import Despacho, DespachoResumenDiario
+
+
+def construir_reporte(desde, hasta):
+    """
+    Retorna las estadísticas de despachos entre `desde` y `hasta` (inclusive).
+
+    Todas las cifras salen de una sola consulta de agregación condicional
+    (SUM ... FILTER / CASE WHEN) sobre DespachoResumenDiario. El resultado es
+    un dict plano:
+        {
+            'desde', 'hasta', 'total_despachos', 'total_incidencias',
+            'por_estado': [{'codigo', 'nombre', 'total'}, ...],
+            'por_tipo':   [{'codigo', 'nombre', 'total'}, ...],
+            'por_region': [{'codigo', 'nombre', 'total'}, ...],
+        }
+    Las listas incluyen todas las categorías, también las que tienen total 0.
+    """
+    tipos = [(tipo.id_tipo_despacho, tipo.nombre_tipo) for tipo in catalogos.TIPOS_DESPACHO.todos()]
+    regiones = [(region.id_region, region.nombre_region) for region in catalogos.REGIONES.todos()]
+
+    agregados = {
+        'suma_despachos': Sum('total_despachos'),
+        'suma_incidencias': Sum('total_incidencias'),
+        'region_none': Sum('total_despachos', filter=Q(id_region__isnull=True)),
+    }
+    for codigo, _ in Despacho.ESTADO_CHOICES:
+        agregados[f'estado_{codigo}'] = Sum('total_despachos', filter=Q(estado=codigo))
+    for codigo, _ in tipos:
+        agregados[f'tipo_{codigo}'] = Sum('total_despachos', filter=Q(id_tipo_despacho=codigo))
+    for codigo, _ in regiones:
+        agregados[f'region_{codigo}'] = Sum('total_despachos', filter=Q(id_region=codigo))
+
+    fila = DespachoResumenDiario.objects.filter(
+        fecha__gte=desde, fecha__lte=hasta
+    ).aggregate(**agregados)
+
+    def total(clave):
+        return fila[clave] or 0
+
+    por_region = [
+        {'codigo': codigo, 'nombre': nombre, 'total': total(f'region_{codigo}')}
+        for codigo, nombre in regiones
+    ]
+    por_region.append({'codigo': None, 'nombre': 'Sin región', 'total': total('region_none')})
+
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'total_despachos': total('suma_despachos'),
+        'total_incidencias': total('suma_incidencias'),
+        'por_estado': [
+            {'codigo': codigo, 'nombre': nombre, 'total': total(f'estado_{codigo}')}
+            for codigo, nombre in Despacho.ESTADO_CHOICES
+        ],
+        'por_tipo': [
+            {'codigo': codigo, 'nombre': nombre, 'total': total(f'tipo_{codigo}')}
+            for codigo, nombre in tipos
+        ],
+        'por_region': por_region,
+    }
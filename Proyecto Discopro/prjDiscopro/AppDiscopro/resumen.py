@@ -0,0 +1,144 @@
+"""
+Mantenimiento del resumen diario de despachos (DespachoResumenDiario)
+
+Cada despacho suma 1 en la fila de su "clave" (fecha local de creación,
+farmacia origen, tipo y estado) y cada incidencia suma 1 en la fila del
+despacho al que pertenece. Las señales de AppDiscopro/signals.py llaman a
+estas funciones en cada alta, cambio o baja; `reconstruir_resumen` recalcula
+un rango completo desde las tablas originales. La región de cada fila es la
+de la farmacia y se reescribe cuando la farmacia cambia de comuna.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Despacho, DespachoResumenDiario, Farmacia
+from .utils import rango_fechas
+
+
+# ============= CLAVE DEL RESUMEN =============
+
+def clave_despacho(despacho):
+    """
+    Retorna la clave (fecha, farmacia, tipo, estado) del despacho, o None si
+    aún no tiene fecha de creación. Lee directamente de __dict__ para no
+    disparar consultas sobre campos diferidos (.only / .defer).
+    """
+    valores = despacho.__dict__
+    fecha_creacion = valores.get('fecha_creacion')
+    if fecha_creacion is None:
+        return None
+    return (
+        timezone.localtime(fecha_creacion).date(),
+        valores.get('id_farmacia_origen_id'),
+        valores.get('id_tipo_despacho_id'),
+        valores.get('estado'),
+    )
+
+
+# ============= AJUSTE INCREMENTAL =============
+
+def ajustar_resumen(clave, despachos=0, incidencias=0):
+    """
+    Suma `despachos` e `incidencias` (pueden ser negativos) a la fila de la
+    clave indicada, creándola si no existe. El UPDATE usa F() para que dos
+    peticiones concurrentes no se pisen.
+    """
+    if clave is None or (not despachos and not incidencias):
+        return
+    fecha, farmacia_id, tipo_id, estado = clave
+    filtro = {
+        'fecha': fecha,
+        'id_farmacia_id': farmacia_id,
+        'id_tipo_despacho_id': tipo_id,
+        'estado': estado,
+    }
+    cambios = {
+        'total_despachos': F('total_despachos') + despachos,
+        'total_incidencias': F('total_incidencias') + incidencias,
+    }
+    if DespachoResumenDiario.objects.filter(**filtro).update(**cambios):
+        return
+
+    region_id = Farmacia.objects.filter(codigo_farmacia=farmacia_id).values_list(
+        'id_comuna__id_region', flat=True
+    ).first()
+    try:
+        with transaction.atomic():
+            DespachoResumenDiario.objects.create(
+                id_region_id=region_id,
+                total_despachos=despachos,
+                total_incidencias=incidencias,
+                **filtro
+            )
+    except IntegrityError:
+        # Otra petición creó la fila entre el UPDATE y el INSERT
+        DespachoResumenDiario.objects.filter(**filtro).update(**cambios)
+
+
+def actualizar_region_farmacia(codigo_farmacia):
+    """
+    La región del resumen se copia de la comuna de la farmacia al crear la
+    fila: si la farmacia cambia de comuna se reescribe en todas sus filas.
+    Retorna la cantidad de filas actualizadas.
+    """
+    region_id = Farmacia.objects.filter(codigo_farmacia=codigo_farmacia).values_list(
+        'id_comuna__id_region', flat=True
+    ).first()
+    filas = DespachoResumenDiario.objects.filter(id_farmacia_id=codigo_farmacia)
+    if region_id is None:
+        filas = filas.filter(id_region__isnull=False)
+    else:
+        filas = filas.exclude(id_region_id=region_id)
+    return filas.update(id_region_id=region_id)
+
+
+def mover_despacho(clave_anterior, clave_nueva, incidencias=0):
+    """Traslada un despacho (y sus incidencias) de una fila del resumen a otra"""
+    if clave_anterior == clave_nueva:
+        return
+    ajustar_resumen(clave_anterior, despachos=-1, incidencias=-incidencias)
+    ajustar_resumen(clave_nueva, despachos=1, incidencias=incidencias)
+
+
+# ============= RECONSTRUCCIÓN =============
+
+@transaction.atomic
+def reconstruir_resumen(desde, hasta):
+    """
+    Recalcula el resumen entre las fechas `desde` y `hasta` (inclusive) a
+    partir de Despacho e Incidencia. Retorna la cantidad de filas generadas.
+    """
+    DespachoResumenDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+
+    inicio, fin = rango_fechas(desde, hasta)
+    filas = (
+        Despacho.objects
+        .filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+        .annotate(fecha=TruncDate('fecha_creacion', tzinfo=timezone.get_current_timezone()))
+        .values(
+            'fecha', 'id_farmacia_origen', 'id_farmacia_origen__id_comuna__id_region',
+            'id_tipo_despacho', 'estado'
+        )
+        .annotate(
+            total_despachos=Count('id_despacho', distinct=True),
+            total_incidencias=Count('incidencias'),
+        )
+        .order_by()
+    )
+
+    resumenes = [
+        DespachoResumenDiario(
+            fecha=fila['fecha'],
+            id_farmacia_id=fila['id_farmacia_origen'],
+            id_region_id=fila['id_farmacia_origen__id_comuna__id_region'],
+            id_tipo_despacho_id=fila['id_tipo_despacho'],
+            estado=fila['estado'],
+            total_despachos=fila['total_despachos'],
+            total_incidencias=fila['total_incidencias'],
+        )
+        for fila in filas
+    ]
+    DespachoResumenDiario.objects.bulk_create(resumenes, batch_size=1000)
+    return len(resumenes)
@@ -0,0 +1,48 @@
+"""
+Renovación de sesiones por umbral
+
+Con SESSION_SAVE_EVERY_REQUEST = True cada página hacía un UPDATE sobre
+django_session. En su lugar RenovarSesionMiddleware solo marca la sesión
+como modificada (lo que la guarda y extiende su expiración y la de la
+cookie) cuando el tiempo de vida restante baja de SESSION_RENOVAR_SI_QUEDAN
+segundos. Así una sesión activa se escribe a lo más una vez por cada
+(SESSION_COOKIE_AGE - SESSION_RENOVAR_SI_QUEDAN) segundos.
+
+Funciona con cualquier SESSION_ENGINE; settings.py usa cached_db por defecto
+(lecturas desde caché) o signed_cookies (sin base de datos).
+
+Configuración (settings.py):
+    MIDDLEWARE: 'AppDiscopro.sesiones.RenovarSesionMiddleware' después de
+                SessionMiddleware
+    SESSION_RENOVAR_SI_QUEDAN = segundos
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+
+CLAVE_RENOVACION = '_renovada_en'
+
+
+def debe_renovarse(sesion, ahora=None):
+    """True si la sesión ya no tiene marca o le queda menos vida que el umbral"""
+    renovada_en = sesion.get(CLAVE_RENOVACION)
+    if renovada_en is None:
+        return True
+    ahora = time.time() if ahora is None else ahora
+    restante = settings.SESSION_COOKIE_AGE - (ahora - renovada_en)
+    return restante < settings.SESSION_RENOVAR_SI_QUEDAN
+
+
+class RenovarSesionMiddleware:
+    """Renueva la expiración de sesiones autenticadas solo cerca del umbral"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sesion = getattr(request, 'session', None)
+        # Solo sesiones con usuario: no se crean sesiones para anónimos
+        if sesion is not None and sesion.get(SESSION_KEY) is not None and debe_renovarse(sesion):
+            sesion[CLAVE_RENOVACION] = int(time.time())
+        return self.get_response(request)
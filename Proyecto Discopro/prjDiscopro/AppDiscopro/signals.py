@@ -0,0 +1,238 @@
+"""
+Señales de AppDiscopro
+Se registran en AppdiscoproConfig.ready() (apps.py).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .busqueda import CAMPOS_INDEXADOS, desindexar, indexar
+from .cambios import TIPOS_ELIMINACION
+from .cargas import ajustar_carga, clave_carga, mover_carga
+from .catalogos import CATALOGOS
+from .eventos import registrar_evento
+from .geoespacial import INDICE_FARMACIAS
+from .vencimientos import INHABILITADOS
+from .models import (
+    AsignacionMotoristaFarmacia, Despacho, DocumentacionMoto, Eliminacion, Farmacia, Incidencia,
+    LicenciaMotorista, Moto, Motorista,
+)
+from .recomendacion import INDICE
+from .resumen import actualizar_region_farmacia, ajustar_resumen, clave_despacho, mover_despacho
+
+
+# ============= RESUMEN DIARIO DE DESPACHOS =============
+
+@receiver(post_init, sender=Despacho)
+def despacho_recordar_clave(sender, instance, **kwargs):
+    """Guarda la clave de resumen con la que se cargó el despacho"""
+    instance._clave_resumen = clave_despacho(instance)
+
+
+@receiver(post_save, sender=Despacho)
+def despacho_actualizar_resumen(sender, instance, created, **kwargs):
+    """Suma el despacho nuevo o lo traslada si cambió estado/tipo/farmacia"""
+    clave_nueva = clave_despacho(instance)
+    if created:
+        ajustar_resumen(clave_nueva, despachos=1)
+    elif instance._clave_resumen != clave_nueva:
+        if instance._clave_resumen is None:
+            ajustar_resumen(clave_nueva, despachos=1, incidencias=instance.incidencias.count())
+        else:
+            mover_despacho(instance._clave_resumen, clave_nueva, instance.incidencias.count())
+    instance._clave_resumen = clave_nueva
+
+
+@receiver(post_delete, sender=Despacho)
+def despacho_descontar_resumen(sender, instance, **kwargs):
+    """Resta el despacho eliminado (sus incidencias se restan en cascada)"""
+    ajustar_resumen(instance._clave_resumen, despachos=-1)
+
+
+@receiver(post_save, sender=Incidencia)
+def incidencia_sumar_resumen(sender, instance, created, **kwargs):
+    if created:
+        ajustar_resumen(clave_despacho(instance.id_despacho), incidencias=1)
+
+
+@receiver(post_delete, sender=Incidencia)
+def incidencia_descontar_resumen(sender, instance, **kwargs):
+    despacho = Despacho.objects.filter(id_despacho=instance.id_despacho_id).first()
+    if despacho is not None:
+        ajustar_resumen(despacho._clave_resumen, incidencias=-1)
+
+
+@receiver(post_init, sender=Farmacia, dispatch_uid='resumen_recordar_comuna')
+def farmacia_recordar_comuna(sender, instance, **kwargs):
+    instance._comuna_resumen = instance.__dict__.get('id_comuna_id')
+
+
+@receiver(post_save, sender=Farmacia, dispatch_uid='resumen_region_farmacia')
+def farmacia_actualizar_region_resumen(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """El resumen guarda la región de la farmacia: se corrige si cambió de comuna"""
+    comuna = instance.__dict__.get('id_comuna_id')
+    if update_fields is not None and 'id_comuna' not in update_fields:
+        return
+    if not created and not raw and comuna != instance._comuna_resumen:
+        actualizar_region_farmacia(instance.pk)
+    instance._comuna_resumen = comuna
+
+
+# ============= ÍNDICE DE BÚSQUEDA =============
+
+def indice_actualizar(sender, instance, created, update_fields=None, **kwargs):
+    """Reindexa el registro salvo que solo cambien campos no indexados"""
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_INDEXADOS[sender]):
+        return
+    indexar(instance, nuevo=created)
+
+
+def indice_eliminar(sender, instance, **kwargs):
+    desindexar(instance)
+
+
+for _modelo in CAMPOS_INDEXADOS:
+    post_save.connect(indice_actualizar, sender=_modelo, dispatch_uid=f'indice_busqueda_save_{_modelo.__name__}')
+    post_delete.connect(indice_eliminar, sender=_modelo, dispatch_uid=f'indice_busqueda_delete_{_modelo.__name__}')
+
+
+# ============= CACHÉ DE CATÁLOGOS =============
+
+def catalogo_invalidar(sender, **kwargs):
+    """Invalida el catálogo cacheado cuando se confirma el cambio"""
+    transaction.on_commit(CATALOGOS[sender].invalidar)
+
+
+for _modelo in CATALOGOS:
+    post_save.connect(catalogo_invalidar, sender=_modelo, dispatch_uid=f'catalogo_save_{_modelo.__name__}')
+    post_delete.connect(catalogo_invalidar, sender=_modelo, dispatch_uid=f'catalogo_delete_{_modelo.__name__}')
+
+
+# ============= CONTADORES DE CARGA (MOTORISTAS Y MOTOS) =============
+# Los contadores se ajustan en la misma transacción que el cambio del
+# despacho (ver cargas.py); la carga del índice de recomendación sale de la
+# misma clave y se ajusta al confirmar (ver recomendacion.py)
+
+def _motorista(clave):
+    return None if clave is None else clave[0]
+
+
+@receiver(post_init, sender=Despacho, dispatch_uid='carga_recordar')
+def despacho_recordar_clave_carga(sender, instance, **kwargs):
+    instance._clave_carga = clave_carga(instance)
+
+
+@receiver(post_save, sender=Despacho, dispatch_uid='carga_actualizar')
+def despacho_actualizar_contadores(sender, instance, created, raw=False, **kwargs):
+    # Al crear no hay clave anterior aunque la instancia naciera con estado abierto
+    anterior, nueva = None if created else instance._clave_carga, clave_carga(instance)
+    if not raw:
+        mover_carga(anterior, nueva)
+        motorista_anterior, motorista_nuevo = _motorista(anterior), _motorista(nueva)
+        if motorista_anterior != motorista_nuevo:
+            def aplicar():
+                INDICE.ajustar_carga(motorista_anterior, -1)
+                INDICE.ajustar_carga(motorista_nuevo, 1)
+            transaction.on_commit(aplicar)
+    instance._clave_carga = nueva
+
+
+@receiver(post_delete, sender=Despacho, dispatch_uid='carga_descontar')
+def despacho_descontar_contadores(sender, instance, **kwargs):
+    ajustar_carga(instance._clave_carga, -1)
+    motorista = _motorista(instance._clave_carga)
+    if motorista is not None:
+        transaction.on_commit(lambda: INDICE.ajustar_carga(motorista, -1))
+
+
+# ============= ÍNDICE DE RECOMENDACIÓN DE MOTORISTAS =============
+# Los deltas se aplican al confirmar la transacción (ver recomendacion.py)
+
+@receiver(post_save, sender=AsignacionMotoristaFarmacia)
+def asignacion_actualizar_indice(sender, instance, **kwargs):
+    farmacia, motorista, activo = instance.id_farmacia_id, instance.id_motorista_id, instance.es_activo
+    transaction.on_commit(lambda: INDICE.asignacion(farmacia, motorista, activo))
+
+
+@receiver(post_delete, sender=AsignacionMotoristaFarmacia)
+def asignacion_quitar_indice(sender, instance, **kwargs):
+    farmacia, motorista = instance.id_farmacia_id, instance.id_motorista_id
+    transaction.on_commit(lambda: INDICE.asignacion(farmacia, motorista, False))
+
+
+@receiver(post_save, sender=Motorista)
+def motorista_actualizar_indice(sender, instance, **kwargs):
+    transaction.on_commit(lambda: INDICE.motorista(instance))
+
+
+@receiver(post_delete, sender=Motorista)
+def motorista_quitar_indice(sender, instance, **kwargs):
+    transaction.on_commit(lambda: INDICE.motorista(instance, eliminado=True))
+
+
+@receiver(post_init, sender=Moto)
+def moto_recordar_motorista(sender, instance, **kwargs):
+    instance._motorista_moto = instance.__dict__.get('id_motorista_asignado_id')
+
+
+@receiver(post_save, sender=Moto)
+def moto_actualizar_indice(sender, instance, **kwargs):
+    codigo, anterior, nuevo = instance.pk, instance._motorista_moto, instance.id_motorista_asignado_id
+    transaction.on_commit(lambda: INDICE.moto(codigo, anterior, nuevo))
+    instance._motorista_moto = nuevo
+
+
+@receiver(post_delete, sender=Moto)
+def moto_quitar_indice(sender, instance, **kwargs):
+    codigo, anterior = instance.pk, instance._motorista_moto
+    transaction.on_commit(lambda: INDICE.moto(codigo, anterior, None))
+
+
+@receiver(post_save, sender=Farmacia)
+def farmacia_actualizar_indice(sender, instance, **kwargs):
+    transaction.on_commit(lambda: INDICE.farmacia(instance))
+
+
+@receiver(post_delete, sender=Farmacia)
+def farmacia_quitar_indice(sender, instance, **kwargs):
+    transaction.on_commit(lambda: INDICE.farmacia(instance, eliminada=True))
+
+
+# ============= ÍNDICE ESPACIAL DE FARMACIAS =============
+
+@receiver(post_save, sender=Farmacia, dispatch_uid='indice_farmacias_save')
+@receiver(post_delete, sender=Farmacia, dispatch_uid='indice_farmacias_delete')
+def farmacia_invalidar_indice_espacial(sender, **kwargs):
+    # El KD-tree se reconstruye completo en la siguiente consulta
+    transaction.on_commit(INDICE_FARMACIAS.invalidar)
+
+
+# ============= BITÁCORA DE EVENTOS DE DESPACHO =============
+
+@receiver(post_save, sender=Despacho, dispatch_uid='evento_despacho_creado')
+def despacho_registrar_creacion(sender, instance, created, raw=False, **kwargs):
+    """Evento de creación; las transiciones las registra estados.transicionar()"""
+    if created and not raw:
+        registrar_evento(instance, None, instance.estado, usuario=instance.creado_por)
+
+
+# ============= VENCIMIENTOS (MOTORISTAS Y MOTOS INHABILITADOS) =============
+
+def vencimientos_invalidar(sender, **kwargs):
+    transaction.on_commit(INHABILITADOS.invalidar)
+
+
+for _modelo in (LicenciaMotorista, DocumentacionMoto):
+    post_save.connect(vencimientos_invalidar, sender=_modelo, dispatch_uid=f'vencimientos_save_{_modelo.__name__}')
+    post_delete.connect(vencimientos_invalidar, sender=_modelo, dispatch_uid=f'vencimientos_delete_{_modelo.__name__}')
+
+
+# ============= LÁPIDAS PARA LA SINCRONIZACIÓN INCREMENTAL =============
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    """Lápida en la misma transacción que el borrado (también en cascada)"""
+    Eliminacion.objects.create(tipo=TIPOS_ELIMINACION[sender], clave=instance.pk)
+
+
+for _modelo in TIPOS_ELIMINACION:
+    post_delete.connect(registrar_eliminacion, sender=_modelo, dispatch_uid=f'eliminacion_{_modelo.__name__}')
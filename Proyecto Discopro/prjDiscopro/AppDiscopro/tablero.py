@@ -0,0 +1,228 @@
+"""
+Tablero de despachos en vivo (Server-Sent Events)
+
+Las creaciones y transiciones ya quedan en la bitácora DespachoEvento
+(eventos.py). En cada proceso ASGI un único sondeo lee los eventos nuevos
+(id_evento > último leído) cada INTERVALO segundos, solo mientras haya
+tableros conectados, y el broker los reparte a todas las conexiones. Así
+100 operadoras conectadas cuestan una lectura por intervalo y no 100
+recargas del listado.
+
+El broker se elige con settings.TABLERO_BROKER (ruta a la clase). El
+incluido, BrokerLocal, reparte en memoria del proceso con una cola por
+conexión; otro broker (por ejemplo sobre Redis pub/sub) debe ofrecer los
+mismos métodos: suscribir(), desuscribir(suscripcion) y publicar(evento).
+
+Los id_evento (AUTO_INCREMENT) no se confirman necesariamente en orden:
+un evento con id menor puede hacerse visible después de uno mayor. Por eso
+el sondeo no avanza con el último id leído sino con el último "asentado"
+(eventos con más de MARGEN de antigüedad, como en cambios.py): cada lectura
+vuelve a recorrer los eventos de esa ventana y reparte solo los que aún no
+repartió. Un error al leer se registra y el sondeo sigue en la próxima
+vuelta.
+
+Una conexión lenta cuya cola se llena recibe el evento `recargar` y se
+cierra, en vez de hacer crecer la memoria. Al reconectar, EventSource envía
+Last-Event-ID y la vista reenvía los eventos perdidos desde la base.
+
+Uso (vista despacho_tablero_eventos, solo bajo ASGI):
+    suscripcion = await BROKER.suscribir()
+    evento = await suscripcion.cola.get()
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import DespachoEvento
+
+INTERVALO = 1.0         # segundos entre lecturas mientras haya conexiones
+LATIDO = 15             # segundos sin eventos antes de enviar un comentario
+MAX_EVENTOS = 200       # eventos por lectura
+TAMANO_COLA = 100       # eventos pendientes por conexión
+MARGEN = timedelta(seconds=5)  # demora máxima esperada entre el INSERT y el COMMIT
+
+logger = logging.getLogger('AppDiscopro')
+
+
+# ============= LECTURA DE EVENTOS =============
+
+def _como_dict(evento):
+    despacho = evento.id_despacho
+    motorista = despacho.id_motorista
+    return {
+        'id': evento.id_evento,
+        'despacho': despacho.id_despacho,
+        'anterior': evento.estado_anterior,
+        'estado': evento.estado_nuevo,
+        'estado_display': evento.get_estado_nuevo_display(),
+        'fecha': evento.fecha.isoformat(),
+        'usuario': evento.usuario.nombre_usuario if evento.usuario else None,
+        'farmacia': despacho.id_farmacia_origen.nombre_farmacia,
+        'motorista': f'{motorista.nombre} {motorista.apellido_paterno}',
+        'direccion': despacho.direccion_entrega,
+    }
+
+
+def leer_eventos(despues, limite=MAX_EVENTOS):
+    """Eventos con id_evento > `despues`, en orden, como dicts"""
+    eventos = DespachoEvento.objects.filter(id_evento__gt=despues).select_related(
+        'id_despacho__id_farmacia_origen', 'id_despacho__id_motorista', 'usuario'
+    ).order_by('id_evento')[:limite]
+    return [_como_dict(evento) for evento in eventos]
+
+
+def ultimo_evento():
+    return DespachoEvento.objects.order_by('-id_evento').values_list('id_evento', flat=True).first() or 0
+
+
+def _en_hilo(funcion):
+    """Consulta desde código async (cerrando conexiones vencidas como en una petición)"""
+    def envolver(*args):
+        close_old_connections()
+        try:
+            return funcion(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(envolver, thread_sensitive=False)
+
+
+leer_eventos_async = _en_hilo(leer_eventos)
+ultimo_evento_async = _en_hilo(ultimo_evento)
+
+
+# ============= BROKER EN MEMORIA =============
+
+class Suscripcion:
+    """Cola de eventos de una conexión; `None` en la cola significa recargar y cerrar"""
+
+    def __init__(self):
+        self.cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        self.desbordada = False
+
+
+class BrokerLocal:
+    """Reparte los eventos de un sondeo compartido a las conexiones del proceso"""
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._asentado = None   # todo id <= este ya se leyó y se repartió
+        self._repartidos = set()  # ids > _asentado ya repartidos
+        self._tarea = None
+        self._loop = None
+
+    def _preparar(self):
+        # Las colas y la tarea pertenecen al event loop; si cambia (pruebas,
+        # recarga del servidor) se empieza de nuevo
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._suscripciones, self._tarea, self._loop = set(), None, loop
+            self._asentado, self._repartidos = None, set()
+
+    async def suscribir(self):
+        self._preparar()
+        if self._asentado is None:
+            self._asentado = await ultimo_evento_async()
+        suscripcion = Suscripcion()
+        self._suscripciones.add(suscripcion)
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._sondear())
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        self._suscripciones.discard(suscripcion)
+
+    def publicar(self, evento):
+        for suscripcion in list(self._suscripciones):
+            if suscripcion.desbordada:
+                continue
+            if suscripcion.cola.qsize() >= TAMANO_COLA - 1:
+                # Deja lugar para el aviso de recargar y deja de enviarle
+                suscripcion.desbordada = True
+                suscripcion.cola.put_nowait(None)
+                self._suscripciones.discard(suscripcion)
+            else:
+                suscripcion.cola.put_nowait(evento)
+
+    def _repartir(self, eventos, limite):
+        """
+        Publica los eventos aún no repartidos y avanza _asentado por el
+        prefijo de eventos anteriores a `limite` (los posteriores se vuelven
+        a leer por si se confirma antes uno con id menor)
+        """
+        asentar = True
+        for evento in eventos:
+            if evento['id'] not in self._repartidos:
+                self._repartidos.add(evento['id'])
+                self.publicar(evento)
+            asentar = asentar and datetime.fromisoformat(evento['fecha']) <= limite
+            if asentar:
+                self._asentado = evento['id']
+        self._repartidos = {id_evento for id_evento in self._repartidos if id_evento > self._asentado}
+
+    async def _sondear(self):
+        """Una lectura por intervalo para todas las conexiones; termina sin conexiones"""
+        while self._suscripciones:
+            try:
+                limite = timezone.now() - MARGEN
+                desde = self._asentado
+                while True:
+                    eventos = await leer_eventos_async(desde)
+                    self._repartir(eventos, limite)
+                    if len(eventos) < MAX_EVENTOS:
+                        break
+                    desde = eventos[-1]['id']
+            except Exception:
+                # Sin esto un error de la base terminaría la tarea y los
+                # tableros dejarían de recibir eventos sin aviso
+                logger.exception('Error leyendo los eventos del tablero de despachos')
+            await asyncio.sleep(INTERVALO)
+
+
+BROKER = import_string(getattr(settings, 'TABLERO_BROKER', 'AppDiscopro.tablero.BrokerLocal'))()
+
+
+# ============= FORMATO SSE =============
+
+def formatear(evento):
+    return f"id: {evento['id']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+async def flujo_eventos(ultimo_recibido=None):
+    """
+    Generador async del cuerpo text/event-stream de una conexión. Con
+    `ultimo_recibido` (Last-Event-ID) primero reenvía los eventos perdidos.
+    """
+    suscripcion = await BROKER.suscribir()
+    try:
+        reenviados = set()
+        if ultimo_recibido is not None:
+            perdidos = await leer_eventos_async(ultimo_recibido, MAX_EVENTOS + 1)
+            if len(perdidos) > MAX_EVENTOS:
+                yield 'event: recargar\ndata: {}\n\n'
+                return
+            for evento in perdidos:
+                reenviados.add(evento['id'])
+                yield formatear(evento)
+        yield 'retry: 5000\n\n'
+
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), LATIDO)
+            except asyncio.TimeoutError:
+                yield ': latido\n\n'
+                continue
+            if evento is None:
+                yield 'event: recargar\ndata: {}\n\n'
+                return
+            # No se compara con el último id: uno menor puede llegar después
+            if evento['id'] not in reenviados:
+                yield formatear(evento)
+    finally:
+        BROKER.desuscribir(suscripcion)
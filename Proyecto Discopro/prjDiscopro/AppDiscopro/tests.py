@@ -1,3 +1,759 @@
-from django.test import TestCase
+"""
+Pruebas de AppDiscopro
 
-# Create your tests here.
+Uso: python manage.py test AppDiscopro
+"""
+import functools
+import importlib
+import io
+import json
+import tracemalloc
+from datetime import date, datetime, time, timedelta
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.db import connection, models
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalogos, views
+from .api import Recurso
+from .asignaciones import PlanInvalido, aplicar_plan, leer_plan
+from .busqueda import buscar
+from .cambios import cambios_desde
+from .cargas import carga_moto, carga_motorista, reconciliar_cargas
+from .estados import TransicionInvalida, transicionar
+from .lotes import crear_lote
+from .models import (
+    AsignacionMotoristaFarmacia, CargaMotorista, Comuna, Despacho, DespachoEvento, DespachoResumenDiario, Farmacia, Eliminacion, IndiceBusqueda, Moto, Motorista, RecetaDespacho, Region, Rol,
+    TipoDespacho, UsuarioPersonalizado,
+)
+from .recomendacion import INDICE, IndiceMotoristas
+from .reportes import construir_reporte
+from .resumen import reconstruir_resumen
+from .utils import rango_dia, rango_fechas
+from .views import despacho_exportar, filtrar_despachos
+
+DIA = date(2025, 3, 10)
+
+
+def setUpModule():
+    # 0001_initial crea usuario_personalizado.password, pero el modelo usa la
+    # columna PSWD de la base existente: se alinea la base de pruebas
+    campo = UsuarioPersonalizado._meta.get_field('password')
+    with connection.cursor() as cursor:
+        columnas = [c.name for c in connection.introspection.get_table_description(cursor, campo.model._meta.db_table)]
+    if campo.column not in columnas:
+        anterior = models.CharField(max_length=128)
+        anterior.set_attributes_from_name('password')
+        anterior.model = UsuarioPersonalizado
+        with connection.schema_editor() as editor:
+            editor.alter_field(UsuarioPersonalizado, anterior, campo)
+
+
+def _fecha(dia, hora=time.min):
+    return timezone.make_aware(datetime.combine(dia, hora))
+
+
+def crear_usuario(nombre_rol, nombre_usuario=None):
+    rol, _ = Rol.objects.get_or_create(nombre_rol=nombre_rol)
+    nombre_usuario = nombre_usuario or nombre_rol.lower()
+    return UsuarioPersonalizado.objects.create_user(
+        nombre_usuario, f'{nombre_usuario}@discopro.cl', 'clave12345', nombre_completo=nombre_usuario, id_rol=rol,
+    )
+
+
+class DatosDespachoMixin:
+    """Un tipo, una farmacia, un motorista con su moto y despachos en fechas dadas"""
+
+    @classmethod
+    def crear_base(cls):
+        cls.tipo = TipoDespacho.objects.create(nombre_tipo='DESPACHO DIRECTO')
+        cls.farmacia = Farmacia.objects.create(codigo_farmacia=1, nombre_farmacia='Farmacia 1', direccion='Calle 1')
+        cls.motorista = Motorista.objects.create(
+            codigo_motorista=1, rut='1-9', nombre='Ana', apellido_paterno='Pérez', apellido_materno='Soto',
+            fecha_nacimiento=date(1990, 1, 1), telefono='1', correo='ana@discopro.cl', incluye_moto_personal=0,
+        )
+        cls.moto = Moto.objects.create(
+            codigo_moto=1, patente='AB12', numero_chasis='CH1', propietario_moto='Empresa',
+            id_motorista_asignado=cls.motorista,
+        )
+
+    @classmethod
+    def crear_despacho(cls, fecha_creacion, estado='CREADO'):
+        despacho = Despacho.objects.create(
+            id_tipo_despacho=cls.tipo, id_farmacia_origen=cls.farmacia, id_motorista=cls.motorista,
+            id_moto=cls.moto, direccion_entrega='Destino', estado=estado,
+        )
+        # fecha_creacion es auto_now_add: se fija después del INSERT
+        Despacho.objects.filter(pk=despacho.pk).update(fecha_creacion=fecha_creacion)
+        return despacho.pk
+
+
+# ============= RANGOS DE FECHAS E ÍNDICES =============
+
+class RangoFechasTests(DatosDespachoMixin, TestCase):
+    """Filtros por fecha como rangos semiabiertos [inicio, fin) sobre FECHA_CREACION"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.antes = cls.crear_despacho(_fecha(DIA) - timedelta(microseconds=1))
+        cls.inicio = cls.crear_despacho(_fecha(DIA), estado='ASIGNADO')
+        cls.final = cls.crear_despacho(_fecha(DIA, time.max), estado='ASIGNADO')
+        cls.siguiente = cls.crear_despacho(_fecha(DIA + timedelta(days=1)))
+
+    def filtrar(self, consulta):
+        return filtrar_despachos(Despacho.objects.all(), QueryDict(consulta))
+
+    def test_rango_dia_semiabierto(self):
+        inicio, fin = rango_dia(DIA)
+        self.assertEqual(inicio, _fecha(DIA))
+        self.assertEqual(fin, _fecha(DIA + timedelta(days=1)))
+        self.assertEqual(rango_fechas(DIA, DIA + timedelta(days=2))[1], _fecha(DIA + timedelta(days=3)))
+
+    def test_filtro_fecha_incluye_solo_el_dia(self):
+        ids = set(self.filtrar(f'fecha={DIA.isoformat()}').values_list('pk', flat=True))
+        self.assertEqual(ids, {self.inicio, self.final})
+
+    def test_filtro_desde_hasta_inclusivos(self):
+        ids = set(self.filtrar(f'desde={DIA.isoformat()}&hasta={DIA.isoformat()}').values_list('pk', flat=True))
+        self.assertEqual(ids, {self.inicio, self.final})
+        ids = set(self.filtrar(f'desde={(DIA + timedelta(days=1)).isoformat()}').values_list('pk', flat=True))
+        self.assertEqual(ids, {self.siguiente})
+
+    def test_reporte_cuenta_el_dia_completo(self):
+        # Los reportes leen el resumen diario; crear_despacho movió las fechas con .update()
+        reconstruir_resumen(DIA - timedelta(days=1), DIA + timedelta(days=1))
+        self.assertEqual(construir_reporte(DIA, DIA)['total_despachos'], 2)
+        self.assertEqual(construir_reporte(DIA - timedelta(days=1), DIA + timedelta(days=1))['total_despachos'], 4)
+
+    @skipUnless(connection.vendor in ('sqlite', 'mysql'), 'EXPLAIN con nombres de índice')
+    def test_filtro_fecha_usa_indice(self):
+        plan = self.filtrar(f'fecha={DIA.isoformat()}').explain()
+        self.assertIn('idx_despacho_fecha', plan)
+
+    @skipUnless(connection.vendor in ('sqlite', 'mysql'), 'EXPLAIN con nombres de índice')
+    def test_filtro_estado_fecha_usa_indice(self):
+        plan = self.filtrar(f'estado=ASIGNADO&fecha={DIA.isoformat()}').explain()
+        self.assertIn('idx_despacho_estado_fecha', plan)
+
+    def test_fecha_mal_escrita_se_ignora(self):
+        todos = set(Despacho.objects.values_list('pk', flat=True))
+        for consulta in ('fecha=2025-13-40', 'desde=ayer', 'hasta=10/03/2025', 'fecha='):
+            with self.subTest(consulta=consulta):
+                self.assertEqual(set(self.filtrar(consulta).values_list('pk', flat=True)), todos)
+
+
+class ResumenRegionTests(DatosDespachoMixin, TestCase):
+    """La región del resumen diario sigue a la comuna de la farmacia"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.norte = Region.objects.create(id_region=1, nombre_region='Norte')
+        cls.sur = Region.objects.create(id_region=2, nombre_region='Sur')
+        cls.comuna_norte = Comuna.objects.create(id_comuna=1, nombre_comuna='Arica', id_region=cls.norte)
+        cls.comuna_sur = Comuna.objects.create(id_comuna=2, nombre_comuna='Osorno', id_region=cls.sur)
+        Farmacia.objects.filter(pk=cls.farmacia.pk).update(id_comuna=cls.comuna_norte)
+        cls.crear_despacho(_fecha(DIA))
+        cls.crear_despacho(_fecha(DIA), estado='ASIGNADO')
+        reconstruir_resumen(DIA, DIA)
+
+    def regiones(self):
+        return set(DespachoResumenDiario.objects.values_list('id_region', flat=True))
+
+    def test_cambio_de_comuna_mueve_el_resumen(self):
+        self.assertEqual(self.regiones(), {self.norte.pk})
+        farmacia = Farmacia.objects.get(pk=self.farmacia.pk)
+
+        farmacia.telefono = '123'
+        farmacia.save()
+        self.assertEqual(self.regiones(), {self.norte.pk})
+
+        farmacia.id_comuna = self.comuna_sur
+        farmacia.save()
+        self.assertEqual(self.regiones(), {self.sur.pk})
+        catalogos.REGIONES.invalidar()  # la señal lo hace al confirmar; aquí no hay commit
+        por_region = {fila['codigo']: fila['total'] for fila in construir_reporte(DIA, DIA)['por_region']}
+        self.assertEqual((por_region[self.norte.pk], por_region[self.sur.pk]), (0, 2))
+
+        farmacia.id_comuna = None
+        farmacia.save(update_fields=['id_comuna'])
+        self.assertEqual(self.regiones(), {None})
+
+
+# ============= EXPORTACIÓN CSV =============
+
+class ExportacionTests(DatosDespachoMixin, TestCase):
+    """despacho_exportar responde en streaming con memoria acotada por el lote"""
+
+    LOTE = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.rol = Rol.objects.create(nombre_rol='SUPERVISOR')
+
+    def exportar(self, consulta=''):
+        request = RequestFactory().get('/despacho/exportar/', QueryDict(consulta))
+        # Usuario sin guardar: los decoradores solo miran is_authenticated y el rol
+        request.user = UsuarioPersonalizado(nombre_usuario='supervisor', id_rol=self.rol)
+        return despacho_exportar(request)
+
+    def crear_despachos(self, cantidad):
+        ahora = timezone.now()
+        Despacho.objects.bulk_create(
+            Despacho(
+                id_tipo_despacho=self.tipo, id_farmacia_origen=self.farmacia, id_motorista=self.motorista,
+                id_moto=self.moto, direccion_entrega=f'Destino {i}', fecha_creacion=ahora - timedelta(minutes=i),
+            )
+            for i in range(cantidad)
+        )
+
+    def pico_memoria(self):
+        """(filas exportadas, pico de memoria en bytes) consumiendo la respuesta"""
+        with mock.patch.object(views, 'TAMANO_LOTE_EXPORTACION', self.LOTE):
+            response = self.exportar()
+            tracemalloc.start()
+            try:
+                lineas = sum(pedazo.count(b'\n') for pedazo in response.streaming_content)
+                return lineas - 1, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    def test_fecha_mal_escrita_no_falla(self):
+        response = self.exportar('desde=2025-02-30&hasta=x')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+    def test_memoria_no_crece_con_las_filas(self):
+        self.crear_despachos(5 * self.LOTE)
+        filas_chico, pico_chico = self.pico_memoria()
+        self.crear_despachos(15 * self.LOTE)
+        filas_grande, pico_grande = self.pico_memoria()
+
+        self.assertEqual((filas_chico, filas_grande), (5 * self.LOTE, 20 * self.LOTE))
+        # Con 4 veces más filas el pico se mantiene (armar todo el CSV lo multiplicaría)
+        self.assertLess(pico_grande, pico_chico * 1.5)
+
+
+# ============= BÚSQUEDA =============
+
+class BusquedaTests(DatosDespachoMixin, TestCase):
+    """buscar() por prefijo de término, ID numérico, RUT y patente"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.otro = Motorista.objects.create(
+            codigo_motorista=2, rut='12.345.678-5', nombre='Luis', apellido_paterno='Rojas', apellido_materno='Vera',
+            fecha_nacimiento=date(1985, 5, 5), telefono='2', correo='luis@discopro.cl', incluye_moto_personal=0,
+        )
+
+    def ids(self, modelo, q):
+        return set(buscar(modelo, q).values_list('pk', flat=True))
+
+    def test_por_termino(self):
+        self.assertEqual(self.ids(Motorista, 'ana'), {self.motorista.pk})
+        self.assertEqual(self.ids(Motorista, 'PERE'), {self.motorista.pk})  # sin tildes ni mayúsculas
+        self.assertEqual(self.ids(Motorista, 'luis roj'), {self.otro.pk})
+        self.assertEqual(self.ids(Motorista, 'zzz'), set())
+        self.assertEqual(self.ids(Farmacia, 'farm'), {self.farmacia.pk})
+
+    def test_por_id_numerico(self):
+        self.assertEqual(self.ids(Motorista, '2'), {self.otro.pk})
+        self.assertEqual(self.ids(Moto, str(self.moto.pk)), {self.moto.pk})
+
+    def test_por_rut_y_patente(self):
+        self.assertEqual(self.ids(Motorista, '12.345.678-5'), {self.otro.pk})
+        self.assertEqual(self.ids(Motorista, '12345678-5'), {self.otro.pk})
+        self.assertEqual(self.ids(Moto, 'ab12'), {self.moto.pk})
+        self.assertEqual(self.ids(Moto, 'AB-12'), {self.moto.pk})
+
+    def test_migracion_rellena_indice_vacio(self):
+        IndiceBusqueda.objects.all().delete()
+        self.assertEqual(self.ids(Motorista, 'ana'), set())
+
+        migracion = importlib.import_module('AppDiscopro.migrations.0011_rellenar_indice_busqueda')
+        migracion.rellenar_indice(apps, None)
+
+        self.assertEqual(self.ids(Motorista, 'ana'), {self.motorista.pk})
+        self.assertEqual(self.ids(Moto, 'AB-12'), {self.moto.pk})
+
+
+# ============= LOTES =============
+
+class LoteTests(DatosDespachoMixin, TestCase):
+    """crear_lote informa las filas inválidas y mantiene las tablas derivadas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        for nombre in (TipoDespacho.CON_RECETA, TipoDespacho.CON_TRASLADO):
+            TipoDespacho.objects.create(nombre_tipo=nombre)
+        cls.usuario = crear_usuario('OPERADORA')
+
+    def setUp(self):
+        # Los catálogos e INDICE son del proceso y sobreviven al rollback de cada prueba
+        catalogos.TIPOS_DESPACHO.invalidar()
+        INDICE.reconstruir()
+        self.addCleanup(INDICE.invalidar)
+
+    def fila(self, **cambios):
+        fila = {'farmacia': '1', 'motorista': '1', 'moto': '1', 'direccion_entrega': 'Los Aromos 123', 'codigo_orden': 'OC-77'}
+        fila.update(cambios)
+        return fila
+
+    def test_filas_invalidas_se_informan(self):
+        filas = [
+            self.fila(),
+            self.fila(farmacia='99'),
+            self.fila(direccion_entrega=''),
+            self.fila(tipo='receta', numero_receta='R1', nombre_medico='Dr. Soto', fecha_emision='10/03/2025'),
+            'no es un objeto',
+        ]
+        resultado = crear_lote(filas, usuario=self.usuario)
+
+        self.assertFalse(resultado.aplicado)
+        self.assertEqual(sorted(resultado.errores), [2, 3, 4, 5])
+        self.assertIn('Farmacia 99 no existe', resultado.errores[2])
+        self.assertIn('Falta "direccion_entrega"', resultado.errores[3])
+        self.assertFalse(Despacho.objects.exists())
+
+        resultado = crear_lote(filas, usuario=self.usuario, parcial=True)
+        self.assertTrue(resultado.aplicado)
+        self.assertEqual(resultado.como_dict()['creados'], 1)
+        self.assertEqual(list(Despacho.objects.values_list('pk', flat=True)), resultado.creados)
+
+    def test_tablas_derivadas(self):
+        filas = [self.fila(), self.fila(codigo_orden=None)] + [
+            self.fila(tipo='receta', numero_receta='R1', nombre_medico='Dr. Soto', fecha_emision='2025-03-10')
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = crear_lote(filas, usuario=self.usuario, tamano_tanda=2)
+
+        self.assertTrue(resultado.aplicado)
+        self.assertEqual(len(resultado.creados), 3)
+        self.assertEqual(set(Despacho.objects.values_list('pk', flat=True)), set(resultado.creados))
+        self.assertEqual(RecetaDespacho.objects.get().id_despacho_id, resultado.creados[2])
+
+        # Resumen diario: una fila por tipo, todos ASIGNADO
+        resumen = dict(DespachoResumenDiario.objects.values_list('id_tipo_despacho__nombre_tipo', 'total_despachos'))
+        self.assertEqual(resumen, {TipoDespacho.DIRECTO: 2, TipoDespacho.CON_RECETA: 1})
+
+        # Contadores de carga e índice de recomendación
+        self.assertEqual((carga_motorista(1), carga_moto(1)), (3, 3))
+        self.assertEqual(INDICE.carga[1], 3)
+
+        # Términos de búsqueda y un evento de creación por despacho
+        self.assertEqual(set(buscar(Despacho, 'aromos').values_list('pk', flat=True)), set(resultado.creados))
+        self.assertEqual(set(buscar(Despacho, 'oc-77').values_list('pk', flat=True)), set(resultado.creados[::2]))
+        eventos = DespachoEvento.objects.order_by('id_despacho')
+        self.assertEqual(
+            list(eventos.values_list('id_despacho', 'estado_anterior', 'estado_nuevo', 'usuario')),
+            [(pk, None, 'ASIGNADO', self.usuario.pk) for pk in resultado.creados],
+        )
+
+
+# ============= ÍNDICE DE RECOMENDACIÓN =============
+
+class IndiceRecomendacionTests(DatosDespachoMixin, TestCase):
+    """Los deltas que llegan durante una reconstrucción no se pierden ni se cuentan dos veces"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        CargaMotorista.objects.create(id_motorista=cls.motorista, despachos_abiertos=2)
+
+    def setUp(self):
+        self.indice = IndiceMotoristas()
+        self.indice.reconstruir()
+
+    def durante_lectura(self, seccion, delta):
+        """Reconstruye el índice ejecutando `delta` justo antes de leer `seccion`"""
+        original = getattr(self.indice, f'_leer_{seccion}')
+
+        def leer():
+            delta()
+            return original()
+        with mock.patch.object(self.indice, f'_leer_{seccion}', leer):
+            self.indice.reconstruir()
+
+    def test_delta_durante_reconstruccion_sobrevive(self):
+        codigo = self.motorista.pk
+
+        def delta():
+            self.indice.ajustar_carga(codigo, 1)
+            self.indice.asignacion(self.farmacia.pk, codigo, True)
+        # Las coordenadas se leen al final: la carga y las asignaciones ya se leyeron sin el delta
+        self.durante_lectura('coordenadas', delta)
+
+        self.assertEqual(self.indice.carga[codigo], 3)
+        self.assertEqual(self.indice.por_farmacia[self.farmacia.pk], {codigo})
+        self.assertIsNone(self.indice._diario)
+
+    def test_delta_ya_leido_no_se_repite(self):
+        codigo = self.motorista.pk
+
+        def delta():
+            # Confirmado antes de leer la carga: la lectura ya lo incluye
+            CargaMotorista.objects.filter(id_motorista=codigo).update(despachos_abiertos=3)
+            self.indice.ajustar_carga(codigo, 1)
+        self.durante_lectura('motos', delta)
+
+        self.assertEqual(self.indice.carga[codigo], 3)
+
+
+# ============= CONTADORES DE CARGA =============
+
+class CargaTests(DatosDespachoMixin, TestCase):
+    """Contadores de carga e INDICE.carga siguen a los despachos abiertos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.otro = Motorista.objects.create(
+            codigo_motorista=2, rut='2-7', nombre='Luis', apellido_paterno='Rojas', apellido_materno='Vera',
+            fecha_nacimiento=date(1985, 5, 5), telefono='2', correo='luis@discopro.cl', incluye_moto_personal=0,
+        )
+        cls.otra_moto = Moto.objects.create(
+            codigo_moto=2, patente='CD34', numero_chasis='CH2', propietario_moto='Empresa', id_motorista_asignado=cls.otro,
+        )
+
+    def setUp(self):
+        INDICE.reconstruir()
+        self.addCleanup(INDICE.invalidar)
+
+    def assertCargas(self, esperadas):
+        for motorista, carga in esperadas.items():
+            with self.subTest(motorista=motorista):
+                self.assertEqual(carga_motorista(motorista), carga)
+                self.assertEqual(carga_moto(motorista), carga)  # moto N es del motorista N
+                self.assertEqual(INDICE.carga.get(motorista, 0), carga)
+        self.assertEqual(reconciliar_cargas(corregir=False), [])
+
+    def test_crear_reasignar_y_cerrar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pks = [self.crear_despacho(_fecha(DIA), estado='ASIGNADO') for _ in range(4)]
+            self.crear_despacho(_fecha(DIA))  # CREADO: sin carga
+        self.assertCargas({1: 4, 2: 0})
+
+        primero, segundo, tercero, cuarto = Despacho.objects.filter(pk__in=pks).order_by('pk')
+        with self.captureOnCommitCallbacks(execute=True):
+            # Reasignación con save() y con transicionar()
+            primero.id_motorista, primero.id_moto = self.otro, self.otra_moto
+            primero.save()
+            self.assertTrue(transicionar(segundo, 'EN_CURSO', id_motorista=self.otro, id_moto=self.otra_moto))
+        self.assertCargas({1: 2, 2: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(transicionar(segundo, 'FINALIZADO'))
+            self.assertTrue(transicionar(tercero, 'CANCELADO'))
+            cuarto.delete()
+        self.assertCargas({1: 0, 2: 1})
+
+
+# ============= ASIGNACIÓN MASIVA =============
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AsignacionPlanTests(DatosDespachoMixin, TestCase):
+    """aplicar_plan: deltas del índice de recomendación, planes inválidos y choques con otro plan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.gerente = crear_usuario('GERENTE')
+
+    def setUp(self):
+        self.client.force_login(self.gerente)
+        INDICE.reconstruir()
+        self.addCleanup(INDICE.invalidar)
+
+    def enviar(self, datos):
+        return self.client.post(reverse('asignacion_masiva'), json.dumps(datos), content_type='application/json')
+
+    def activas(self):
+        return set(AsignacionMotoristaFarmacia.objects.filter(es_activo=True).values_list('id_farmacia', 'id_motorista'))
+
+    def test_deltas_del_indice(self):
+        par = (self.farmacia.pk, self.motorista.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = aplicar_plan([(*par, True)])
+        self.assertEqual(resultado.creadas, [par])
+        self.assertEqual(INDICE.por_farmacia[self.farmacia.pk], {self.motorista.pk})
+        self.assertEqual(INDICE.por_motorista[self.motorista.pk], {self.farmacia.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = aplicar_plan([(*par, False)])
+        self.assertEqual(resultado.desactivadas, [par])
+        self.assertEqual(INDICE.por_farmacia[self.farmacia.pk], set())
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            resultado = aplicar_plan([(*par, True)], simular=True)
+        self.assertEqual((resultado.reactivadas, resultado.aplicado, callbacks), ([par], False, []))
+        self.assertEqual(self.activas(), set())
+
+    def test_plan_que_no_es_lista(self):
+        for cuerpo in ({'asignaciones': {'farmacia': 1, 'motorista': 1}}, [{'farmacia': 1, 'motorista': 1}]):
+            with self.subTest(cuerpo=cuerpo):
+                response = self.enviar(cuerpo)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['aplicado'])
+        with self.assertRaises(PlanInvalido):
+            leer_plan(io.StringIO('{"asignaciones": "1,1"}'), 'json')
+        self.assertEqual(self.activas(), set())
+
+    def test_choque_con_otro_plan_responde_409(self):
+        manager = AsignacionMotoristaFarmacia.objects
+        bulk_create = manager.bulk_create
+
+        def otro_plan_primero(objetos, *args, **kwargs):
+            # Otro plan inserta el mismo par después del SELECT ... FOR UPDATE
+            manager.create(id_farmacia=self.farmacia, id_motorista=self.motorista, es_activo=True)
+            return bulk_create(objetos, *args, **kwargs)
+
+        with mock.patch.object(manager, 'bulk_create', otro_plan_primero):
+            response = self.enviar({'asignaciones': [{'farmacia': self.farmacia.pk, 'motorista': self.motorista.pk}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['aplicado'])
+        self.assertEqual(response.json()['creadas'], [])
+        self.assertEqual(self.activas(), set())
+        self.assertEqual(INDICE.por_farmacia.get(self.farmacia.pk, set()), set())
+
+
+# ============= TRANSICIONES DE ESTADO =============
+
+class TransicionTests(DatosDespachoMixin, TestCase):
+    """transicionar: UPDATE condicional por estado y versión, un evento por transición ganada"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+
+    def setUp(self):
+        self.despacho = Despacho.objects.get(pk=self.crear_despacho(_fecha(DIA), estado='ASIGNADO'))
+
+    def fila(self):
+        return Despacho.objects.values('estado', 'version', 'direccion_entrega').get(pk=self.despacho.pk)
+
+    def eventos(self):
+        """Eventos de transición (sin el de creación)"""
+        return DespachoEvento.objects.filter(id_despacho=self.despacho.pk, estado_anterior__isnull=False)
+
+    def test_transicion_no_permitida(self):
+        antes = self.fila()
+        with self.assertRaises(TransicionInvalida):
+            transicionar(self.despacho, 'FINALIZADO')
+        with self.assertRaises(TransicionInvalida):
+            transicionar(self.despacho, 'ASIGNADO', esperado='CANCELADO')
+        self.assertEqual(self.fila(), antes)
+        self.assertFalse(self.eventos().exists())
+
+    def test_esperado_desactualizado_pierde(self):
+        # Otra petición ya lo pasó a EN_CURSO; esta aún lo ve ASIGNADO
+        otra = Despacho.objects.get(pk=self.despacho.pk)
+        self.assertTrue(transicionar(otra, 'EN_CURSO'))
+        antes = self.fila()
+
+        self.assertFalse(transicionar(self.despacho, 'CANCELADO', esperado='ASIGNADO', direccion_entrega='Otra'))
+        self.assertEqual(self.fila(), antes)
+        self.assertEqual(self.despacho.estado, 'ASIGNADO')  # la instancia perdedora no se toca
+        self.assertEqual(self.eventos().count(), 1)
+
+    def test_version_desactualizada_pierde(self):
+        version = self.fila()['version']
+        otra = Despacho.objects.get(pk=self.despacho.pk)
+        self.assertTrue(transicionar(otra, 'ASIGNADO', direccion_entrega='Editada'))  # mismo estado, otra versión
+        antes = self.fila()
+        self.assertEqual(antes['version'], version + 1)
+
+        self.assertFalse(transicionar(self.despacho, 'EN_CURSO', version_esperada=version))
+        self.assertEqual(self.fila(), antes)
+
+    def test_ganador_escribe_un_evento(self):
+        version = self.fila()['version']
+        self.assertTrue(transicionar(self.despacho, 'EN_CURSO', version_esperada=version, motivo='Salió a ruta'))
+        self.assertFalse(transicionar(Despacho.objects.get(pk=self.despacho.pk), 'CANCELADO', esperado='ASIGNADO'))
+
+        self.assertEqual(self.fila()['estado'], 'EN_CURSO')
+        self.assertEqual(self.fila()['version'], version + 1)
+        evento = self.eventos().get()
+        self.assertEqual((evento.estado_anterior, evento.estado_nuevo), ('ASIGNADO', 'EN_CURSO'))
+        self.assertEqual(evento.datos['motivo'], 'Salió a ruta')
+
+
+# ============= API JSON =============
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ApiDespachoTests(DatosDespachoMixin, TestCase):
+    """Condiciones HTTP (ETag, If-None-Match, If-Match) de /api/v1/despachos/<id>/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.gerente = crear_usuario('GERENTE')
+        cls.pk = cls.crear_despacho(timezone.now(), estado='ASIGNADO')
+
+    def setUp(self):
+        self.client.force_login(self.gerente)
+        self.url = reverse('api_detalle', args=['despachos', self.pk])
+
+    def patch(self, datos, **encabezados):
+        return self.client.patch(self.url, json.dumps(datos), content_type='application/json', headers=encabezados)
+
+    def editar_en_paralelo(self, direccion='Otra dirección'):
+        """Edición de otro usuario que cambia la dirección sin tocar el estado"""
+        self.assertTrue(transicionar(Despacho.objects.get(pk=self.pk), 'ASIGNADO', direccion_entrega=direccion))
+
+    def test_sin_sesion_responde_401(self):
+        self.client.logout()
+        for url in (self.url, reverse('api_lista', args=['despachos']), reverse('api_cambios')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 401)
+                self.assertIn('error', response.json())
+
+    def test_get_con_if_none_match_responde_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.editar_en_paralelo()
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_patch_con_if_match_vencido_responde_412(self):
+        etag = self.client.get(self.url)['ETag']
+        self.editar_en_paralelo()
+        response = self.patch({'estado': 'EN_CURSO'}, **{'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        despacho = Despacho.objects.get(pk=self.pk)
+        self.assertEqual((despacho.estado, despacho.direccion_entrega), ('ASIGNADO', 'Otra dirección'))
+
+    def test_if_match_cubre_cambios_entre_la_comprobacion_y_el_update(self):
+        etag = self.client.get(self.url)['ETag']
+
+        def permiso_con_carrera(usuario, despacho):
+            self.editar_en_paralelo()
+            return True
+
+        with mock.patch.object(views, 'usuario_puede_modificar_despacho', permiso_con_carrera):
+            response = self.patch({'direccion_entrega': 'Mía'}, **{'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Despacho.objects.get(pk=self.pk).direccion_entrega, 'Otra dirección')
+
+    def test_patch_sin_if_match_tras_edicion_concurrente_responde_409(self):
+        def permiso_con_carrera(usuario, despacho):
+            self.editar_en_paralelo()
+            return True
+
+        with mock.patch.object(views, 'usuario_puede_modificar_despacho', permiso_con_carrera):
+            response = self.patch({'estado': 'EN_CURSO'})
+        self.assertEqual(response.status_code, 409)
+        despacho = Despacho.objects.get(pk=self.pk)
+        self.assertEqual((despacho.estado, despacho.direccion_entrega), ('ASIGNADO', 'Otra dirección'))
+
+    def test_patch_con_if_match_vigente_aplica(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.patch({'estado': 'EN_CURSO'}, **{'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['estado'], 'EN_CURSO')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_despacho_borrado_tras_leer_el_etag_responde_404(self):
+        original = Recurso.etag_y_version
+
+        def etag_y_borrar(recurso, *args):
+            resultado = original(recurso, *args)
+            Despacho.objects.filter(pk=self.pk).delete()
+            return resultado
+
+        with mock.patch.object(Recurso, 'etag_y_version', etag_y_borrar):
+            response = self.patch({'estado': 'EN_CURSO'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ApiCambiosTests(DatosDespachoMixin, TestCase):
+    """/api/v1/cambios/: orden por cursor, lápidas de borrados y cursor vencido"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_base()
+        cls.gerente = crear_usuario('GERENTE')
+
+    def setUp(self):
+        self.client.force_login(self.gerente)
+        # Reloj de cambios.py controlado por la prueba (MARGEN y retención de lápidas)
+        self.ahora = timezone.now()
+        reloj = mock.Mock(now=lambda: self.ahora)
+        for objetivo in (mock.patch('AppDiscopro.cambios.timezone', reloj),
+                         mock.patch.object(views, 'cambios_desde', functools.partial(cambios_desde, limite=2))):
+            objetivo.start()
+            self.addCleanup(objetivo.stop)
+
+    def segundos(self, n):
+        return self.ahora + timedelta(seconds=n)
+
+    def pedir(self, cursor=None, status=200):
+        response = self.client.get(reverse('api_cambios'), {'desde': cursor} if cursor else {})
+        self.assertEqual(response.status_code, status)
+        if status != 200:
+            return response.json()
+        lineas = [json.loads(linea) for linea in b''.join(response.streaming_content).splitlines()]
+        return lineas[:-1], lineas[-1]
+
+    def sincronizar(self, cursor=None):
+        """Sigue los cursores mientras haya más; retorna (líneas, último cursor)"""
+        todas = []
+        while True:
+            lineas, final = self.pedir(cursor)
+            todas.extend(lineas)
+            cursor = final['cursor']
+            if not final['mas']:
+                return todas, cursor
+
+    def test_crear_modificar_y_borrar(self):
+        pks = [self.crear_despacho(_fecha(DIA)) for _ in range(3)]
+        for segundos, pk in zip((-60, -40, -50), pks):
+            Despacho.objects.filter(pk=pk).update(actualizado_en=self.segundos(segundos))
+
+        # Primera página: 2 cambios y `mas`; se sigue con el cursor en orden de actualizado_en
+        lineas, final = self.pedir()
+        self.assertEqual([linea['id'] for linea in lineas], [pks[0], pks[2]])
+        self.assertTrue(final['mas'])
+        lineas, cursor = self.sincronizar(final['cursor'])
+        self.assertEqual([(linea['tipo'], linea['id']) for linea in lineas], [('despacho', pks[1])])
+        self.assertEqual(lineas[0]['datos']['id'], pks[1])
+
+        # Modificación y borrado posteriores al cursor; también uno aún dentro del MARGEN
+        despacho = Despacho.objects.get(pk=pks[0])
+        despacho.direccion_entrega = 'Nueva dirección'
+        despacho.save()
+        Despacho.objects.filter(pk=pks[0]).update(actualizado_en=self.segundos(10))
+        Despacho.objects.get(pk=pks[1]).delete()
+        Eliminacion.objects.filter(tipo='despacho', clave=pks[1]).update(eliminado_en=self.segundos(20))
+        Despacho.objects.filter(pk=pks[2]).update(actualizado_en=self.segundos(28))
+        self.ahora = self.segundos(30)
+
+        lineas, cursor = self.sincronizar(cursor)
+        self.assertEqual(lineas, [
+            {'tipo': 'despacho', 'id': pks[0], 'datos': mock.ANY},
+            {'tipo': 'despacho', 'id': pks[1], 'eliminado': True},
+        ])
+        self.assertEqual(lineas[0]['datos']['direccion_entrega'], 'Nueva dirección')
+
+        # Pasado el MARGEN llega el que faltaba, y nada se repite
+        self.ahora += timedelta(seconds=10)
+        lineas, cursor = self.sincronizar(cursor)
+        self.assertEqual([linea['id'] for linea in lineas], [pks[2]])
+        self.assertEqual(self.sincronizar(cursor), ([], mock.ANY))
+
+    def test_cursor_vencido_e_invalido(self):
+        _, cursor = self.sincronizar()
+        self.ahora += timedelta(days=91)
+        self.assertIn('error', self.pedir(cursor, status=410))
+        self.assertIn('error', self.pedir('no-es-un-cursor', status=400))
@@ -0,0 +1,185 @@
+"""
+Tiempos de entrega (SLA) de los despachos finalizados
+
+El tiempo de entrega de un despacho es FECHA_FINALIZACION - FECHA_CREACION.
+Para los despachos FINALIZADO creados en un rango de fechas se calculan, por
+farmacia, motorista, región o tipo de despacho: cantidad, promedio y los
+percentiles p50/p90/p99 (interpolación lineal, como numpy.percentile).
+
+La base de datos filtra por el índice (estado, fecha_creacion), calcula la
+diferencia de fechas y entrega las duraciones ordenadas por (grupo,
+duración); así cada grupo llega contiguo y ordenado y los percentiles son
+accesos por posición. Con NumPy ese cálculo se hace vectorizado para todos
+los grupos a la vez; sin NumPy se usa el mismo cálculo en Python.
+
+Los resultados se guardan en la caché por (dimensión, desde, hasta) durante
+TIEMPO_CACHE segundos.
+
+Uso:
+    tiempos_entrega('farmacia', desde, hasta)
+    -> [{'codigo', 'nombre', 'total', 'promedio', 'p50', 'p90', 'p99'}, ...]  (minutos)
+"""
+import math
+
+from django.core.cache import cache
+from django.db.models import DurationField, ExpressionWrapper, F
+
+from . import catalogos
+from .models import Despacho, Farmacia, Motorista
+from .utils import rango_fechas
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el cálculo en Python
+    np = None
+
+TIEMPO_CACHE = 600  # segundos
+PERCENTILES = (50, 90, 99)
+FILAS_REPORTE = 10  # filas por dimensión en el reporte mensual y el PDF
+
+
+# ============= DIMENSIONES =============
+
+def _nombres_farmacias(codigos):
+    return dict(Farmacia.objects.filter(codigo_farmacia__in=codigos).values_list('codigo_farmacia', 'nombre_farmacia'))
+
+
+def _nombres_motoristas(codigos):
+    return {
+        codigo: f'{nombre} {apellido}'
+        for codigo, nombre, apellido in Motorista.objects.filter(codigo_motorista__in=codigos).values_list(
+            'codigo_motorista', 'nombre', 'apellido_paterno'
+        )
+    }
+
+
+def _nombres_regiones(codigos):
+    return {region.id_region: region.nombre_region for region in catalogos.REGIONES.todos()}
+
+
+def _nombres_tipos(codigos):
+    return {tipo.id_tipo_despacho: tipo.nombre_tipo for tipo in catalogos.TIPOS_DESPACHO.todos()}
+
+
+# dimensión -> (campo de agrupación, nombres de los códigos)
+DIMENSIONES = {
+    'farmacia': ('id_farmacia_origen', _nombres_farmacias),
+    'motorista': ('id_motorista', _nombres_motoristas),
+    'region': ('id_farmacia_origen__id_comuna__id_region', _nombres_regiones),
+    'tipo': ('id_tipo_despacho', _nombres_tipos),
+}
+
+
+# ============= CÁLCULO =============
+
+def _duraciones(campo, desde, hasta):
+    """(códigos, segundos) de los despachos finalizados, ordenados por (código, duración)"""
+    inicio, fin = rango_fechas(desde, hasta)
+    duracion = ExpressionWrapper(F('fecha_finalizacion') - F('fecha_creacion'), output_field=DurationField())
+    filas = Despacho.objects.filter(
+        estado='FINALIZADO', fecha_creacion__gte=inicio, fecha_creacion__lt=fin,
+        fecha_finalizacion__isnull=False,
+    ).annotate(duracion=duracion).order_by(campo, 'duracion').values_list(campo, 'duracion')
+
+    codigos, segundos = [], []
+    for codigo, valor in filas.iterator(chunk_size=5000):
+        codigos.append(codigo)
+        segundos.append(valor.total_seconds())
+    return codigos, segundos
+
+
+def _percentil(ordenados, inicio, cantidad, q):
+    """Percentil q (0-100) del tramo ordenado [inicio, inicio + cantidad)"""
+    posicion = (cantidad - 1) * q / 100
+    bajo = math.floor(posicion)
+    alto = min(bajo + 1, cantidad - 1)
+    a, b = ordenados[inicio + bajo], ordenados[inicio + alto]
+    return a + (b - a) * (posicion - bajo)
+
+
+def _estadisticas_python(codigos, segundos):
+    grupos = []
+    inicio = 0
+    for fin in range(1, len(codigos) + 1):
+        if fin == len(codigos) or codigos[fin] != codigos[inicio]:
+            cantidad = fin - inicio
+            grupos.append((
+                codigos[inicio], cantidad, sum(segundos[inicio:fin]) / cantidad,
+                [_percentil(segundos, inicio, cantidad, q) for q in PERCENTILES],
+            ))
+            inicio = fin
+    return grupos
+
+
+def _estadisticas_numpy(codigos, segundos):
+    valores = np.asarray(segundos, dtype=float)
+    claves = np.fromiter((-1 if codigo is None else codigo for codigo in codigos), dtype=np.int64, count=len(codigos))
+    # Inicio de cada grupo: posiciones donde cambia el código
+    inicios = np.concatenate(([0], np.flatnonzero(claves[1:] != claves[:-1]) + 1))
+    cantidades = np.diff(np.append(inicios, len(valores)))
+    promedios = np.add.reduceat(valores, inicios) / cantidades
+
+    columnas = []
+    for q in PERCENTILES:
+        posiciones = (cantidades - 1) * (q / 100)
+        bajos = np.floor(posiciones).astype(np.int64)
+        altos = np.minimum(bajos + 1, cantidades - 1)
+        a, b = valores[inicios + bajos], valores[inicios + altos]
+        columnas.append(a + (b - a) * (posiciones - bajos))
+
+    return [
+        (codigos[inicio], int(cantidad), float(promedio), [float(columna[i]) for columna in columnas])
+        for i, (inicio, cantidad, promedio) in enumerate(zip(inicios, cantidades, promedios))
+    ]
+
+
+def calcular_tiempos(dimension, desde, hasta):
+    """Tiempos de entrega por `dimension` sin caché (ver tiempos_entrega)"""
+    campo, nombres = DIMENSIONES[dimension]
+    codigos, segundos = _duraciones(campo, desde, hasta)
+    if not codigos:
+        return []
+
+    grupos = (_estadisticas_numpy if np is not None else _estadisticas_python)(codigos, segundos)
+    etiquetas = nombres({codigo for codigo, *_ in grupos if codigo is not None})
+    filas = []
+    for codigo, cantidad, promedio, percentiles in grupos:
+        fila = {
+            'codigo': codigo,
+            'nombre': etiquetas.get(codigo, 'Sin región' if codigo is None else str(codigo)),
+            'total': cantidad,
+            'promedio': round(promedio / 60, 1),
+        }
+        for q, valor in zip(PERCENTILES, percentiles):
+            fila[f'p{q}'] = round(valor / 60, 1)
+        filas.append(fila)
+    filas.sort(key=lambda fila: (-fila['total'], fila['nombre']))
+    return filas
+
+
+def tiempos_entrega(dimension, desde, hasta):
+    """
+    Tiempos de entrega en minutos por `dimension` (farmacia, motorista,
+    region o tipo) de los despachos creados entre `desde` y `hasta`
+    (inclusive), ordenados por cantidad de despachos.
+    """
+    if dimension not in DIMENSIONES:
+        raise ValueError(f'Dimensión desconocida: {dimension}')
+    clave = f'tiempos_entrega:{dimension}:{desde.isoformat()}:{hasta.isoformat()}'
+    return cache.get_or_set(clave, lambda: calcular_tiempos(dimension, desde, hasta), TIEMPO_CACHE)
+
+
+TITULOS = {
+    'farmacia': 'Farmacia',
+    'motorista': 'Motorista',
+    'region': 'Región',
+    'tipo': 'Tipo de Despacho',
+}
+
+
+def tiempos_por_dimension(desde, hasta):
+    """[{'dimension', 'titulo', 'filas'}] de todas las dimensiones, para reportes"""
+    return [
+        {'dimension': dimension, 'titulo': TITULOS[dimension], 'filas': tiempos_entrega(dimension, desde, hasta)}
+        for dimension in DIMENSIONES
+    ]
@@ -29,10 +29,13 @@ urlpatterns = [
     path('farmacia/<int:pk>/', views.farmacia_detail, name='farmacia_detail'),
     path('farmacia/<int:pk>/editar/', views.FarmaciaUpdateView.as_view(), name='farmacia_update'),
     path('farmacia/<int:pk>/eliminar/', views.FarmaciaDeleteView.as_view(), name='farmacia_delete'),
+    path('farmacia/asignaciones/masiva/', views.asignacion_masiva, name='asignacion_masiva'),
+    path('farmacia/cercanas/', views.farmacia_cercanas, name='farmacia_cercanas'),
     
     # Motorista
     path('motorista/', views.MotoristaListView.as_view(), name='motorista_list'),
     path('motorista/crear/', views.MotoristaCreateView.as_view(), name='motorista_create'),
+    path('motorista/buscar/', views.motorista_buscar, name='motorista_buscar'),
     path('motorista/<int:pk>/', views.motorista_detail, name='motorista_detail'),
     path('motorista/<int:pk>/editar/', views.MotoristaUpdateView.as_view(), name='motorista_update'),
     path('motorista/<int:pk>/eliminar/', views.MotoristaDeleteView.as_view(), name='motorista_delete'),
@@ -44,8 +47,14 @@ urlpatterns = [
     path('moto/<int:pk>/editar/', views.MotoUpdateView.as_view(), name='moto_update'),
     path('moto/<int:pk>/eliminar/', views.MotoDeleteView.as_view(), name='moto_delete'),
 
+    # Autocompletado de selectores
+    path('autocompletar/<str:fuente>/', views.autocompletar, name='autocompletar'),
+    
     # Despacho - Lista y detalle
     path('despacho/', views.DespachoListView.as_view(), name='despacho_list'),
+    path('despacho/exportar/', views.despacho_exportar, name='despacho_exportar'),
+    path('despacho/eventos/', views.despacho_tablero_eventos, name='despacho_tablero_eventos'),
+    path('despacho/recomendar/', views.despacho_recomendar, name='despacho_recomendar'),
     path('despacho/<int:pk>/', views.despacho_detail, name='despacho_detail'),
     
     # Crear despachos
@@ -53,11 +62,18 @@ urlpatterns = [
     path('despacho/receta/crear/', views.despacho_receta_create, name='despacho_receta_create'),
     path('despacho/traslado/crear/', views.despacho_traslado_create, name='despacho_traslado_create'),
     path('despacho/reenvio/crear/', views.despacho_reenvio_create, name='despacho_reenvio_create'),
+    path('despacho/reenvio/pendientes/', views.despacho_reenvio_cola, name='despacho_reenvio_cola'),
+    path('despacho/lote/', views.despacho_lote, name='despacho_lote'),
     
     # Modificar y anular
     path('despacho/<int:pk>/modificar/', views.despacho_update, name='despacho_update'),
     path('despacho/<int:pk>/anular/', views.despacho_anular, name='despacho_anular'),
     
+    # API JSON (ver AppDiscopro/api.py)
+    path('api/v1/cambios/', views.api_cambios, name='api_cambios'),
+    path('api/v1/<str:recurso>/', views.api_lista, name='api_lista'),
+    path('api/v1/<str:recurso>/<int:pk>/', views.api_detalle, name='api_detalle'),
+    
     # Reportes
     path('reportes/diario/', views.reporte_diario, name='reporte_diario'),
     path('reportes/mensual/', views.reporte_mensual, name='reporte_mensual'),
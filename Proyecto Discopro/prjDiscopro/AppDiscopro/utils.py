@@ -0,0 +1,89 @@
+"""
+Utilidades compartidas por vistas y reportes
+"""
+import math
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+# ============= RANGOS DE FECHAS =============
+# Los filtros por fecha se expresan como intervalos semiabiertos [inicio, fin)
+# sobre datetimes con zona horaria. Así la consulta compara directamente la
+# columna FECHA_CREACION (sin envolverla en DATE()) y MySQL puede usar los
+# índices sobre ella con un range scan.
+
+def fecha_de_parametro(valor):
+    """date de un parámetro GET 'AAAA-MM-DD', o None si falta o no es válido"""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def inicio_del_dia(fecha):
+    """Retorna la medianoche local (aware) de la fecha indicada"""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rango_fechas(desde, hasta):
+    """
+    Retorna (inicio, fin) para filtrar desde el día `desde` hasta el día
+    `hasta`, ambos inclusive.
+    Uso: Despacho.objects.filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+    """
+    return inicio_del_dia(desde), inicio_del_dia(hasta + timedelta(days=1))
+
+
+def rango_dia(fecha):
+    """Retorna (inicio, fin) que cubre un único día"""
+    return rango_fechas(fecha, fecha)
+
+
+def limites_mes(fecha):
+    """Retorna (primer_dia, ultimo_dia) del mes de la fecha indicada"""
+    primer_dia = fecha.replace(day=1)
+    if fecha.month == 12:
+        ultimo_dia = fecha.replace(year=fecha.year + 1, month=1, day=1) - timedelta(days=1)
+    else:
+        ultimo_dia = fecha.replace(month=fecha.month + 1, day=1) - timedelta(days=1)
+    return primer_dia, ultimo_dia
+
+
+# ============= RECORRIDO POR CURSOR (KEYSET) =============
+# Los despachos se recorren en orden (-fecha_creacion, -id_despacho), que
+# coincide con el índice idx_despacho_fecha. En lugar de OFFSET se filtra por
+# "lo que viene después de la última fila vista", así cada lote cuesta lo
+# mismo sin importar cuán profundo esté en el historial.
+
+def filtro_despues_de(fecha_creacion, id_despacho):
+    """Q de los despachos que siguen a (fecha_creacion, id_despacho) en orden descendente"""
+    return (
+        Q(fecha_creacion__lt=fecha_creacion) |
+        Q(fecha_creacion=fecha_creacion, id_despacho__lt=id_despacho)
+    )
+
+
+def filtro_antes_de(fecha_creacion, id_despacho):
+    """Q de los despachos que preceden a (fecha_creacion, id_despacho) en orden descendente"""
+    return (
+        Q(fecha_creacion__gt=fecha_creacion) |
+        Q(fecha_creacion=fecha_creacion, id_despacho__gt=id_despacho)
+    )
+
+
+# ============= DISTANCIAS =============
+
+RADIO_TIERRA_KM = 6371.0
+
+
+def distancia_km(origen, destino):
+    """Distancia haversine entre dos pares (latitud, longitud) en km"""
+    lat1, lon1 = map(math.radians, origen)
+    lat2, lon2 = map(math.radians, destino)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return RADIO_TIERRA_KM * 2 * math.asin(math.sqrt(a))
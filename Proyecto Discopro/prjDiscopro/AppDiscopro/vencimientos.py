@@ -0,0 +1,177 @@
+"""
+Vencimientos de licencias de motoristas y documentación de motos
+
+Un motorista queda inhabilitado si su licencia (LicenciaMotorista) venció.
+Una moto queda inhabilitada si, para algún tipo de documento, el documento
+más reciente (mayor FECHA_VENCIMIENTO) ya venció; los documentos de años
+anteriores reemplazados por uno vigente no cuentan.
+
+INHABILITADOS guarda ambos conjuntos para que los formularios de despacho,
+los lotes y la recomendación de motoristas verifiquen con una búsqueda en
+un set en vez de consultar licencias y documentos por cada candidato. Se
+cachea igual que los catálogos (comparte catalogos.CacheVersionada): en
+memoria del proceso y en la caché compartida, con una versión que las
+señales de LicenciaMotorista y DocumentacionMoto incrementan al confirmar.
+La clave incluye la fecha del día, así que los conjuntos se recalculan
+solos al cambiar el día.
+
+proximos_vencimientos() recorre los vencimientos en orden de fecha por
+tandas (índices sobre FECHA_VENCIMIENTO); lo usa el comando
+`revisar_vencimientos`.
+
+Uso:
+    if INHABILITADOS.motorista(codigo_motorista): ...
+    INHABILITADOS.motos()   # frozenset de codigo_moto
+"""
+import heapq
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from .catalogos import CacheVersionada
+from .models import DocumentacionMoto, LicenciaMotorista
+
+TIEMPO_CACHE = 60 * 60 * 24
+VERIFICAR_CADA = 5
+TAMANO_TANDA = 500
+
+
+# ============= INHABILITADOS =============
+
+def motoristas_con_licencia_vencida(hoy):
+    return frozenset(
+        LicenciaMotorista.objects.filter(fecha_vencimiento__lt=hoy).values_list('id_motorista', flat=True)
+    )
+
+
+def motos_con_documentos_vencidos(hoy):
+    return frozenset(
+        DocumentacionMoto.objects.filter(fecha_vencimiento__isnull=False)
+        .order_by().values('id_moto', 'tipo_documento')
+        .annotate(ultimo=Max('fecha_vencimiento'))
+        .filter(ultimo__lt=hoy)
+        .values_list('id_moto', flat=True)
+    )
+
+
+class Inhabilitados(CacheVersionada):
+    """Motoristas y motos con vencimientos, cacheados por día y versión"""
+
+    # _estado: (hoy, version, verificado_en, motoristas, motos); se reemplaza completo
+    clave = 'vencimientos:inhabilitados'
+
+    def _cargar(self):
+        estado = self._estado
+        ahora = time.monotonic()
+        hoy = timezone.localdate()
+        if estado is not None and estado[0] == hoy and ahora - estado[2] < VERIFICAR_CADA:
+            return estado
+
+        version = self._version()
+        if estado is not None and estado[0] == hoy and estado[1] == version:
+            estado = (hoy, version, ahora, estado[3], estado[4])
+        else:
+            clave_datos = f'{self.clave}:{hoy.isoformat()}:{version}'
+            conjuntos = cache.get(clave_datos)
+            if conjuntos is None:
+                conjuntos = (motoristas_con_licencia_vencida(hoy), motos_con_documentos_vencidos(hoy))
+                cache.set(clave_datos, conjuntos, TIEMPO_CACHE)
+            estado = (hoy, version, ahora) + tuple(conjuntos)
+        self._estado = estado
+        return estado
+
+    def motoristas(self):
+        return self._cargar()[3]
+
+    def motos(self):
+        return self._cargar()[4]
+
+    def motorista(self, codigo_motorista):
+        return codigo_motorista in self.motoristas()
+
+    def moto(self, codigo_moto):
+        return codigo_moto in self.motos()
+
+
+INHABILITADOS = Inhabilitados()
+
+
+# ============= RECORRIDO POR FECHA DE VENCIMIENTO =============
+
+class Vencimiento:
+    """Una licencia o documento que vence (o venció) en `fecha`"""
+
+    def __init__(self, tipo, fecha, codigo, descripcion):
+        self.tipo = tipo                # 'licencia' | 'documento'
+        self.fecha = fecha
+        self.codigo = codigo            # codigo_motorista o codigo_moto
+        self.descripcion = descripcion
+
+    def vencido(self, hoy):
+        return self.fecha < hoy
+
+    def como_dict(self):
+        return {
+            'tipo': self.tipo,
+            'fecha': self.fecha.isoformat(),
+            'codigo': self.codigo,
+            'descripcion': self.descripcion,
+        }
+
+
+def _recorrer(queryset, convertir, tamano):
+    """Recorre `queryset` por (fecha_vencimiento, pk) en tandas de `tamano` filas"""
+    ultimo = None
+    while True:
+        tanda = queryset
+        if ultimo is not None:
+            fecha, pk = ultimo
+            tanda = tanda.filter(Q(fecha_vencimiento__gt=fecha) | Q(fecha_vencimiento=fecha, pk__gt=pk))
+        filas = list(tanda.order_by('fecha_vencimiento', 'pk')[:tamano])
+        if not filas:
+            return
+        for fila in filas:
+            yield convertir(fila)
+        ultimo = (filas[-1].fecha_vencimiento, filas[-1].pk)
+
+
+def _descripcion_licencia(licencia):
+    motorista = licencia.id_motorista
+    tipo = f' {licencia.tipo_licencia}' if licencia.tipo_licencia else ''
+    return f'Licencia{tipo} de {motorista.nombre} {motorista.apellido_paterno}'
+
+
+def _descripcion_documento(documento):
+    return f'{documento.tipo_documento} {documento.anio} de la moto {documento.id_moto.patente}'
+
+
+def proximos_vencimientos(dias=30, hoy=None, tamano=TAMANO_TANDA):
+    """
+    Licencias y documentos vencidos o que vencen en los próximos `dias`,
+    en orden de fecha. Los documentos reemplazados por otro más reciente del
+    mismo tipo se omiten. Generador: lee la base en tandas de `tamano`.
+    """
+    hoy = hoy or timezone.localdate()
+    limite = hoy + timedelta(days=dias)
+
+    licencias = LicenciaMotorista.objects.filter(fecha_vencimiento__lte=limite).select_related('id_motorista')
+    reemplazo = DocumentacionMoto.objects.filter(
+        id_moto=OuterRef('id_moto'), tipo_documento=OuterRef('tipo_documento'),
+        fecha_vencimiento__gt=OuterRef('fecha_vencimiento'),
+    )
+    documentos = DocumentacionMoto.objects.filter(
+        fecha_vencimiento__lte=limite
+    ).filter(~Exists(reemplazo)).select_related('id_moto')
+
+    return heapq.merge(
+        _recorrer(licencias, lambda licencia: Vencimiento(
+            'licencia', licencia.fecha_vencimiento, licencia.id_motorista_id, _descripcion_licencia(licencia)
+        ), tamano),
+        _recorrer(documentos, lambda documento: Vencimiento(
+            'documento', documento.fecha_vencimiento, documento.id_moto_id, _descripcion_documento(documento)
+        ), tamano),
+        key=lambda vencimiento: vencimiento.fecha,
+    )
@@ -3,12 +3,20 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.db.models import Q, Count
 from django.contrib import messages
 from django.utils import timezone
 from datetime import datetime, timedelta
-from django.http import HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.core.handlers.asgi import ASGIRequest
+from django.core.exceptions import ValidationError
+import csv
+import io
+import json
+import logging
 
 from .models import (Farmacia, Motorista, Moto, ContactoEmergencia, 
                      LicenciaMotorista, DocumentacionMoto, AsignacionMotoristaFarmacia, 
@@ -18,10 +26,27 @@ from .forms import (FarmaciaForm, MotoristaForm, ContactoEmergenciaForm,
                     DespachoDirectoForm, DespachoConRecetaForm, DespachoConTrasladoForm, 
                     DespachoConReenvioForm, ModificarDespachoForm, IncidenciaForm)
 from .decorators import (
-    operadora_o_gerente, supervisor_o_gerente, 
+    operadora_o_gerente, supervisor_o_gerente, gerente_requerido, api_login_requerido,
     OperadoraOGerenteMixin, SupervisorOGerenteMixin,
-    usuario_puede_modificar_despacho, usuario_puede_anular_despacho
+    usuario_puede_modificar_despacho, usuario_puede_anular_despacho, usuario_puede_crear_despacho
 )
+from .utils import rango_dia, limites_mes, inicio_del_dia, filtro_despues_de, fecha_de_parametro
+from .reportes import construir_reporte
+from .busqueda import buscar
+from .asignaciones import aplicar_plan, normalizar_plan, PlanInvalido
+from .recomendacion import recomendar_motoristas
+from .geoespacial import farmacias_cercanas, farmacias_cercanas_a
+from .autocompletar import FUENTES
+from .reenvios import TAMANO_COLA, pendientes_de_reenvio
+from .lotes import LoteInvalido, crear_lote, leer_lote
+from .estados import TRANSICIONES, transicionar
+from .tiempos_entrega import FILAS_REPORTE, tiempos_por_dimension
+from .cargas import carga_moto, carga_motorista
+from .tablero import flujo_eventos
+from .api import MAX_TAMANO_PAGINA, RECURSOS, TAMANO_PAGINA, CampoInvalido, etag_coincide
+from .cambios import CursorInvalido, CursorVencido, cambios_desde, decodificar_posiciones
+from . import catalogos
+from .paginacion import paginar_por_cursor, decodificar_cursor, total_en_cache
 
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
@@ -30,6 +55,8 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from io import BytesIO
 
+logger = logging.getLogger('AppDiscopro')
+
 # Vistas principales (CBV y funciones):
 # - ListView / CreateView / UpdateView / DeleteView para operaciones CRUD.
 # - Funciones para casos especiales (detalle con modales, registros asociados, reportes).
@@ -53,12 +80,7 @@ class FarmaciaListView(LoginRequiredMixin, ListView):
         query = self.request.GET.get('q')
         
         if query:
-            queryset = queryset.filter(
-                Q(nombre_farmacia__icontains=query) |
-                Q(direccion__icontains=query) |
-                Q(telefono__icontains=query) |
-                Q(codigo_farmacia__icontains=query)
-            )
+            queryset = buscar(queryset, query)
         
         return queryset.order_by('codigo_farmacia')
     
@@ -101,61 +123,132 @@ def farmacia_detail(request, pk):
         es_activo=True
     ).select_related('id_motorista')
     
-    # Obtener motoristas disponibles (no asignados a esta farmacia)
-    motoristas_asignados_ids = [a.id_motorista.codigo_motorista for a in asignaciones]
-    motoristas_disponibles = Motorista.objects.exclude(codigo_motorista__in=motoristas_asignados_ids)
+    # Los motoristas disponibles se cargan bajo demanda desde motorista_buscar
     
     if request.method == 'POST':
+        plan = None
         if 'asignar_motorista' in request.POST:
             motorista_id = request.POST.get('motorista_id')
             if motorista_id:
                 motorista = get_object_or_404(Motorista, codigo_motorista=motorista_id)
-                AsignacionMotoristaFarmacia.objects.create(
-                    id_farmacia=farmacia,
-                    id_motorista=motorista,
-                    es_activo=True
-                )
-                messages.success(request, f"Motorista {motorista.nombre} asignado exitosamente")
-                return redirect('farmacia_detail', pk=pk)
+                plan = [(farmacia.codigo_farmacia, motorista.codigo_motorista, True)]
+                mensaje = f"Motorista {motorista.nombre} asignado exitosamente"
         
         elif 'reemplazar_motorista' in request.POST:
             asignacion_id = request.POST.get('asignacion_id')
             nuevo_motorista_id = request.POST.get('nuevo_motorista_id')
             
             if asignacion_id and nuevo_motorista_id:
-                # Desactivar asignación actual
-                asignacion_actual = get_object_or_404(AsignacionMotoristaFarmacia, id_asignacion=asignacion_id)
-                asignacion_actual.es_activo = False
-                asignacion_actual.save()
-                
-                # Crear nueva asignación
-                nuevo_motorista = get_object_or_404(Motorista, codigo_motorista=nuevo_motorista_id)
-                AsignacionMotoristaFarmacia.objects.create(
-                    id_farmacia=farmacia,
-                    id_motorista=nuevo_motorista,
-                    es_activo=True
+                # Desactivar asignación actual y activar la nueva en una transacción
+                asignacion_actual = get_object_or_404(
+                    AsignacionMotoristaFarmacia, id_asignacion=asignacion_id, id_farmacia=farmacia
                 )
-                messages.success(request, f"Motorista reemplazado por {nuevo_motorista.nombre}")
-                return redirect('farmacia_detail', pk=pk)
+                nuevo_motorista = get_object_or_404(Motorista, codigo_motorista=nuevo_motorista_id)
+                plan = [
+                    (farmacia.codigo_farmacia, asignacion_actual.id_motorista_id, False),
+                    (farmacia.codigo_farmacia, nuevo_motorista.codigo_motorista, True),
+                ]
+                mensaje = f"Motorista reemplazado por {nuevo_motorista.nombre}"
         
         elif 'desasignar_motorista' in request.POST:
             asignacion_id = request.POST.get('asignacion_id')
             if asignacion_id:
-                asignacion = get_object_or_404(AsignacionMotoristaFarmacia, id_asignacion=asignacion_id)
-                asignacion.es_activo = False
-                asignacion.save()
-                messages.success(request, "Motorista desasignado exitosamente")
-                return redirect('farmacia_detail', pk=pk)
+                asignacion = get_object_or_404(
+                    AsignacionMotoristaFarmacia, id_asignacion=asignacion_id, id_farmacia=farmacia
+                )
+                plan = [(farmacia.codigo_farmacia, asignacion.id_motorista_id, False)]
+                mensaje = "Motorista desasignado exitosamente"
+        
+        if plan is not None:
+            resultado = aplicar_plan(plan)
+            if resultado.errores:
+                messages.error(request, '; '.join(resultado.errores))
+            else:
+                messages.success(request, mensaje)
+            return redirect('farmacia_detail', pk=pk)
     
     context = {
         'farmacia': farmacia,
         'asignaciones': asignaciones,
-        'motoristas_disponibles': motoristas_disponibles,
     }
     
     return render(request, 'farmacia/detail.html', context)
 
 
+@login_required
+@gerente_requerido
+@require_POST
+def asignacion_masiva(request):
+    """
+    Aplica un plan de asignaciones motorista-farmacia enviado como JSON:
+        {"asignaciones": [{"farmacia": 1, "motorista": 5, "activo": true}, ...],
+         "reemplazar": false, "simular": false}
+    Retorna el diff (ver asignaciones.aplicar_plan). Status 400 si hay errores
+    y 409 si otro plan creó las mismas asignaciones al mismo tiempo.
+    """
+    try:
+        datos = json.loads(request.body)
+        if not isinstance(datos, dict):
+            raise PlanInvalido('Se esperaba un objeto JSON')
+        asignaciones = datos.get('asignaciones', [])
+        if not isinstance(asignaciones, list):
+            raise PlanInvalido('"asignaciones" debe ser una lista')
+        plan = normalizar_plan(asignaciones)
+    except (ValueError, PlanInvalido) as e:
+        return JsonResponse({'aplicado': False, 'errores': [str(e)]}, status=400)
+    
+    resultado = aplicar_plan(
+        plan,
+        reemplazar=bool(datos.get('reemplazar')),
+        simular=bool(datos.get('simular')),
+    )
+    if resultado.aplicado and resultado.total_cambios:
+        logger.info(
+            f"Asignación masiva por {request.user.nombre_usuario}: "
+            f"{len(resultado.creadas)} creadas, {len(resultado.reactivadas)} reactivadas, "
+            f"{len(resultado.desactivadas)} desactivadas"
+        )
+    if resultado.conflicto:
+        return JsonResponse(resultado.como_dict(), status=409)
+    return JsonResponse(resultado.como_dict(), status=400 if resultado.errores else 200)
+
+MAX_FARMACIAS_CERCANAS = 20
+
+@login_required
+def farmacia_cercanas(request):
+    """
+    Farmacias más cercanas (GET) a la farmacia `farmacia` o al punto `lat`/`lon`.
+    `k` limita la cantidad; con `abiertas=1` solo las abiertas a la hora actual.
+    Retorna JSON {'farmacias': [{'codigo_farmacia', 'nombre', 'distancia_km', ...}]}
+    """
+    try:
+        k = min(max(int(request.GET.get('k', 5)), 1), MAX_FARMACIAS_CERCANAS)
+    except ValueError:
+        k = 5
+    abiertas_a = timezone.localtime().time() if request.GET.get('abiertas') == '1' else None
+
+    farmacia = request.GET.get('farmacia', '')
+    if farmacia.isdigit():
+        cercanas = farmacias_cercanas_a(int(farmacia), k=k, abiertas_a=abiertas_a)
+    else:
+        try:
+            latitud, longitud = float(request.GET['lat']), float(request.GET['lon'])
+        except (KeyError, ValueError):
+            return JsonResponse({'farmacias': []})
+        cercanas = farmacias_cercanas(latitud, longitud, k=k, abiertas_a=abiertas_a)
+
+    return JsonResponse({'farmacias': [
+        {
+            'codigo_farmacia': f['codigo_farmacia'],
+            'nombre': f['nombre_farmacia'],
+            'distancia_km': round(distancia, 2),
+            'horario_apertura': f['horario_apertura'].strftime('%H:%M') if f['horario_apertura'] else None,
+            'horario_cierre': f['horario_cierre'].strftime('%H:%M') if f['horario_cierre'] else None,
+        }
+        for distancia, f in cercanas
+    ]})
+
+
 # ============= VIEWS MOTORISTA =============
 
 class MotoristaListView(LoginRequiredMixin,ListView):
@@ -169,15 +262,7 @@ class MotoristaListView(LoginRequiredMixin,ListView):
         query = self.request.GET.get('q')
         
         if query:
-            queryset = queryset.filter(
-                Q(nombre__icontains=query) |
-                Q(apellido_paterno__icontains=query) |
-                Q(apellido_materno__icontains=query) |
-                Q(rut__icontains=query) |
-                Q(correo__icontains=query) |
-                Q(telefono__icontains=query) |
-                Q(codigo_motorista__icontains=query)
-            )
+            queryset = buscar(queryset, query)
         
         return queryset.order_by('codigo_motorista')
     
@@ -249,6 +334,54 @@ def motorista_detail(request, pk):
         'contacto_form': contacto_form,
         'licencia_form': licencia_form,
         'farmacias_asignadas': farmacias_asignadas,
+        'despachos_abiertos': carga_motorista(pk),
+    })
+
+
+TAMANO_SELECTOR_MOTORISTA = 20
+
+@login_required
+def motorista_buscar(request):
+    """
+    Selector asíncrono de motoristas (static/js/selector_motorista.js)
+    GET: q                 texto a buscar (ver busqueda.buscar)
+         excluir_farmacia  omite los motoristas con asignación activa a esa farmacia
+         despues           último codigo_motorista recibido (página siguiente)
+    Retorna JSON {'resultados': [{'id', 'texto'}], 'siguiente': codigo | null}
+    """
+    queryset = buscar(Motorista, request.GET.get('q'))
+    
+    excluir_farmacia = request.GET.get('excluir_farmacia', '')
+    if excluir_farmacia.isdigit():
+        queryset = queryset.exclude(
+            codigo_motorista__in=AsignacionMotoristaFarmacia.objects.filter(
+                id_farmacia=excluir_farmacia, es_activo=True
+            ).values('id_motorista')
+        )
+    
+    # Paginación por cursor sobre la clave primaria
+    despues = request.GET.get('despues', '')
+    if despues.isdigit():
+        queryset = queryset.filter(codigo_motorista__gt=int(despues))
+    
+    motoristas = list(
+        queryset.order_by('codigo_motorista').values(
+            'codigo_motorista', 'nombre', 'apellido_paterno', 'apellido_materno', 'rut'
+        )[:TAMANO_SELECTOR_MOTORISTA + 1]
+    )
+    hay_mas = len(motoristas) > TAMANO_SELECTOR_MOTORISTA
+    motoristas = motoristas[:TAMANO_SELECTOR_MOTORISTA]
+    
+    return JsonResponse({
+        'resultados': [
+            {
+                'id': m['codigo_motorista'],
+                'texto': f"{m['codigo_motorista']} - {m['nombre']} {m['apellido_paterno']} "
+                         f"{m['apellido_materno']} ({m['rut']})",
+            }
+            for m in motoristas
+        ],
+        'siguiente': motoristas[-1]['codigo_motorista'] if hay_mas else None,
     })
 
 
@@ -265,13 +398,7 @@ class MotoListView(LoginRequiredMixin, ListView):
         query = self.request.GET.get('q')
         
         if query:
-            queryset = queryset.filter(
-                Q(patente__icontains=query) |
-                Q(marca__icontains=query) |
-                Q(modelo__icontains=query) |
-                Q(numero_chasis__icontains=query) |
-                Q(codigo_moto__icontains=query)
-            )
+            queryset = buscar(queryset, query)
         
         return queryset.order_by('codigo_moto')
     
@@ -322,10 +449,77 @@ def moto_detail(request, pk):
         'moto': moto,
         'documentacion': documentacion,
         'doc_form': doc_form,
+        'despachos_abiertos': carga_moto(pk),
     })
 
+# ============= AUTOCOMPLETADO =============
+
+@login_required
+def autocompletar(request, fuente):
+    """
+    Opciones de los selectores AutocompletarSelect (static/js/autocompletar.js)
+    GET: q        texto a buscar (ver busqueda.buscar)
+         despues  último id recibido (página siguiente)
+         id       ids a etiquetar (repetible); ignora q y despues
+    Retorna JSON {'resultados': [{'id', 'texto'}], 'siguiente': id | null}
+    """
+    origen = FUENTES.get(fuente)
+    if origen is None:
+        return JsonResponse({'error': 'Fuente desconocida'}, status=404)
+    
+    claves = [c for c in request.GET.getlist('id') if c.isdigit()]
+    if claves:
+        return JsonResponse({'resultados': origen.etiquetas(claves), 'siguiente': None})
+    
+    despues = request.GET.get('despues', '')
+    resultados, siguiente = origen.pagina(
+        request.GET.get('q'), despues=int(despues) if despues.isdigit() else None
+    )
+    return JsonResponse({'resultados': resultados, 'siguiente': siguiente})
+
+
 # ============= VIEWS DESPACHO =============
 
+def filtrar_despachos(queryset, params):
+    """
+    Aplica los filtros del listado de despachos (q, estado, tipo, farmacia,
+    fecha y el rango desde/hasta) a partir de los parámetros GET.
+    Compartido por DespachoListView, despacho_exportar y despacho_reenvio_cola.
+    """
+    query = params.get('q')
+    estado = params.get('estado')
+    tipo = params.get('tipo')
+    farmacia = params.get('farmacia')
+    # Una fecha mal escrita se ignora, igual que una farmacia no numérica
+    fecha = fecha_de_parametro(params.get('fecha'))
+    desde = fecha_de_parametro(params.get('desde'))
+    hasta = fecha_de_parametro(params.get('hasta'))
+    
+    if query:
+        queryset = buscar(queryset, query)
+    
+    if estado:
+        queryset = queryset.filter(estado=estado)
+    
+    if tipo:
+        queryset = queryset.filter(id_tipo_despacho__id_tipo_despacho=tipo)
+    
+    if farmacia and farmacia.isdigit():
+        queryset = queryset.filter(id_farmacia_origen=farmacia)
+    
+    if fecha:
+        inicio, fin = rango_dia(fecha)
+        queryset = queryset.filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+    
+    if desde:
+        queryset = queryset.filter(fecha_creacion__gte=inicio_del_dia(desde))
+    
+    if hasta:
+        queryset = queryset.filter(fecha_creacion__lt=inicio_del_dia(hasta + timedelta(days=1)))
+    
+    return queryset
+
+
 class DespachoListView(LoginRequiredMixin, ListView):
     model = Despacho
     template_name = 'despacho/list.html'
@@ -339,49 +533,138 @@ class DespachoListView(LoginRequiredMixin, ListView):
             'id_motorista',
             'id_moto'
         )
-        
-        # Filtros
-        query = self.request.GET.get('q')
-        estado = self.request.GET.get('estado')
-        tipo = self.request.GET.get('tipo')
-        fecha = self.request.GET.get('fecha')
-        
-        if query:
-            queryset = queryset.filter(
-                Q(id_despacho__icontains=query) |
-                Q(codigo_orden_farmacia__icontains=query) |
-                Q(direccion_entrega__icontains=query) |
-                Q(id_motorista__nombre__icontains=query) |
-                Q(id_motorista__apellido_paterno__icontains=query)
-            )
-        
-        if estado:
-            queryset = queryset.filter(estado=estado)
-        
-        if tipo:
-            queryset = queryset.filter(id_tipo_despacho__id_tipo_despacho=tipo)
-        
-        if fecha:
-            fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
-            queryset = queryset.filter(fecha_creacion__date=fecha_obj)
-        
+        queryset = filtrar_despachos(queryset, self.request.GET)
         return queryset.order_by('-fecha_creacion')
     
+    def usa_cursor(self):
+        """Paginación por cursor (opcional): ?paginacion=cursor"""
+        return self.request.GET.get('paginacion') == 'cursor'
+    
+    def paginate_queryset(self, queryset, page_size):
+        if not self.usa_cursor():
+            return super().paginate_queryset(queryset, page_size)
+        
+        # Sin COUNT(*) ni OFFSET: cada página cuesta lo mismo que la primera
+        pagina = paginar_por_cursor(
+            queryset,
+            despues=decodificar_cursor(self.request.GET.get('despues')),
+            antes=decodificar_cursor(self.request.GET.get('antes')),
+            tamano=page_size,
+        )
+        return None, pagina, pagina.object_list, pagina.has_previous() or pagina.has_next()
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        if self.usa_cursor():
+            filtros = self.request.GET.copy()
+            for clave in ('page', 'despues', 'antes'):
+                filtros.pop(clave, None)
+            context['modo_cursor'] = True
+            context['filtros_url'] = filtros.urlencode()
+            context['total_aproximado'] = total_en_cache(self.object_list, self.request.GET)
         context['query'] = self.request.GET.get('q', '')
         context['estados'] = Despacho.ESTADO_CHOICES
-        context['tipos_despacho'] = TipoDespacho.objects.all()
+        context['tipos_despacho'] = catalogos.TIPOS_DESPACHO.todos()
         context['estado_filtro'] = self.request.GET.get('estado', '')
         context['tipo_filtro'] = self.request.GET.get('tipo', '')
         context['fecha_filtro'] = self.request.GET.get('fecha', '')
         return context
 
+# Columnas del CSV: (encabezado, campo para values_list)
+COLUMNAS_EXPORTACION = [
+    ('ID', 'id_despacho'),
+    ('Fecha Creación', 'fecha_creacion'),
+    ('Tipo', 'id_tipo_despacho__nombre_tipo'),
+    ('Estado', 'estado'),
+    ('Código Orden', 'codigo_orden_farmacia'),
+    ('Farmacia Origen', 'id_farmacia_origen__nombre_farmacia'),
+    ('Farmacia Secundaria', 'id_farmacia_origen_secundaria__nombre_farmacia'),
+    ('Motorista Nombre', 'id_motorista__nombre'),
+    ('Motorista Apellido', 'id_motorista__apellido_paterno'),
+    ('Motorista RUT', 'id_motorista__rut'),
+    ('Moto Patente', 'id_moto__patente'),
+    ('Dirección Entrega', 'direccion_entrega'),
+    ('Fecha Finalización', 'fecha_finalizacion'),
+]
+TAMANO_LOTE_EXPORTACION = 2000
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: retorna la línea en vez de guardarla"""
+    def write(self, value):
+        return value
+
+
+def _filas_exportacion(queryset):
+    """
+    Recorre el queryset por lotes usando el cursor (fecha_creacion, id_despacho)
+    en lugar de OFFSET. Cada lote es un SELECT con JOIN de los nombres
+    relacionados, por lo que la memoria usada no depende del total de filas.
+    """
+    campos = [campo for _, campo in COLUMNAS_EXPORTACION]
+    queryset = queryset.order_by('-fecha_creacion', '-id_despacho').values_list(*campos)
+    ultimo = None
+    while True:
+        lote = queryset.filter(filtro_despues_de(*ultimo)) if ultimo else queryset
+        filas = list(lote[:TAMANO_LOTE_EXPORTACION])
+        if not filas:
+            return
+        for fila in filas:
+            yield fila
+        ultima = filas[-1]
+        ultimo = (ultima[1], ultima[0])  # (fecha_creacion, id_despacho)
+
+
+def _formatear_celda(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%d/%m/%Y %H:%M')
+    return '' if valor is None else valor
+
+
+@login_required
+@supervisor_o_gerente
+def despacho_exportar(request):
+    """Exportar despachos filtrados a CSV (respuesta en streaming)"""
+    queryset = filtrar_despachos(Despacho.objects.all(), request.GET)
+    escritor = csv.writer(_Eco(), delimiter=';')
+    
+    def generar():
+        # BOM para que Excel reconozca el archivo como UTF-8
+        yield '\ufeff'
+        yield escritor.writerow([encabezado for encabezado, _ in COLUMNAS_EXPORTACION])
+        for fila in _filas_exportacion(queryset):
+            yield escritor.writerow([_formatear_celda(valor) for valor in fila])
+    
+    response = StreamingHttpResponse(generar(), content_type='text/csv; charset=utf-8')
+    nombre = f"despachos_{timezone.localtime().strftime('%Y%m%d_%H%M')}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
+@login_required
+async def despacho_tablero_eventos(request):
+    """
+    Altas y cambios de estado de despachos en vivo (Server-Sent Events) para
+    el listado. Requiere el servidor ASGI (prjDiscopro/asgi.py); bajo WSGI
+    responde 503 y el navegador no reintenta.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('El tablero en vivo requiere el servidor ASGI', status=503, content_type='text/plain')
+
+    ultimo = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+    ultimo = int(ultimo) if ultimo and ultimo.isdigit() else None
+
+    response = StreamingHttpResponse(flujo_eventos(ultimo), content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no acumular el flujo
+    return response
+
 @login_required
 def despacho_detail(request, pk):
     """Vista detalle de despacho con incidencias"""
     despacho = get_object_or_404(Despacho, id_despacho=pk)
     incidencias = despacho.incidencias.all()
+    eventos = despacho.eventos.select_related('usuario')
     
     # Si es despacho con receta, obtener datos de receta
     receta = None
@@ -406,6 +689,7 @@ def despacho_detail(request, pk):
     context = {
         'despacho': despacho,
         'incidencias': incidencias,
+        'eventos': eventos,
         'receta': receta,
         'despacho_original': despacho_original,
         'incidencia_form': incidencia_form,
@@ -413,6 +697,18 @@ def despacho_detail(request, pk):
     
     return render(request, 'despacho/detail.html', context)
 
+@login_required
+@operadora_o_gerente
+def despacho_recomendar(request):
+    """
+    Motoristas recomendados para un despacho desde la farmacia `farmacia` (GET).
+    Retorna JSON {'recomendaciones': [...]} (ver recomendacion.recomendar_motoristas)
+    """
+    farmacia = request.GET.get('farmacia', '')
+    if not farmacia.isdigit():
+        return JsonResponse({'recomendaciones': []})
+    return JsonResponse({'recomendaciones': recomendar_motoristas(int(farmacia))})
+
 @login_required
 @operadora_o_gerente
 def despacho_directo_create(request):
@@ -421,8 +717,9 @@ def despacho_directo_create(request):
         form = DespachoDirectoForm(request.POST)
         if form.is_valid():
             despacho = form.save(commit=False)
-            despacho.id_tipo_despacho = TipoDespacho.objects.get(nombre_tipo='DESPACHO DIRECTO')
+            despacho.id_tipo_despacho = catalogos.tipo_despacho(TipoDespacho.DIRECTO)
             despacho.estado = 'ASIGNADO'
+            despacho.creado_por = request.user
             despacho.save()
             messages.success(request, f'Despacho #{despacho.id_despacho} creado exitosamente')
             return redirect('despacho_detail', pk=despacho.id_despacho)
@@ -439,8 +736,9 @@ def despacho_receta_create(request):
         form = DespachoConRecetaForm(request.POST)
         if form.is_valid():
             despacho = form.save(commit=False)
-            despacho.id_tipo_despacho = TipoDespacho.objects.get(nombre_tipo='DESPACHO CON RECETA')
+            despacho.id_tipo_despacho = catalogos.tipo_despacho(TipoDespacho.CON_RECETA)
             despacho.estado = 'ASIGNADO'
+            despacho.creado_por = request.user
             despacho.save()
             
             # Crear registro de receta
@@ -467,8 +765,9 @@ def despacho_traslado_create(request):
         form = DespachoConTrasladoForm(request.POST)
         if form.is_valid():
             despacho = form.save(commit=False)
-            despacho.id_tipo_despacho = TipoDespacho.objects.get(nombre_tipo='DESPACHO CON TRASLADO')
+            despacho.id_tipo_despacho = catalogos.tipo_despacho(TipoDespacho.CON_TRASLADO)
             despacho.estado = 'ASIGNADO'
+            despacho.creado_por = request.user
             despacho.save()
             messages.success(request, f'Despacho con traslado #{despacho.id_despacho} creado exitosamente')
             return redirect('despacho_detail', pk=despacho.id_despacho)
@@ -488,7 +787,7 @@ def despacho_reenvio_create(request):
             
             # Crear nuevo despacho basado en el original
             despacho = Despacho.objects.create(
-                id_tipo_despacho=TipoDespacho.objects.get(nombre_tipo='DESPACHO CON REENVIO'),
+                id_tipo_despacho=catalogos.tipo_despacho(TipoDespacho.CON_REENVIO),
                 id_farmacia_origen=despacho_original.id_farmacia_origen,
                 id_farmacia_origen_secundaria=despacho_original.id_farmacia_origen_secundaria,
                 id_motorista=form.cleaned_data['id_motorista'],
@@ -497,16 +796,100 @@ def despacho_reenvio_create(request):
                 estado='ASIGNADO',
                 codigo_orden_farmacia=despacho_original.codigo_orden_farmacia,
                 id_despacho_original=despacho_original,
-                observaciones=form.cleaned_data['observaciones']
+                observaciones=form.cleaned_data['observaciones'],
+                creado_por=request.user
             )
             
             messages.success(request, f'Reenvío #{despacho.id_despacho} creado exitosamente')
             return redirect('despacho_detail', pk=despacho.id_despacho)
     else:
-        form = DespachoConReenvioForm()
+        # Desde la cola de reenvíos: ?original=<id> precarga el despacho y su dirección
+        inicial = {}
+        original = request.GET.get('original', '')
+        if original.isdigit():
+            fila = pendientes_de_reenvio().filter(id_despacho=original).values(
+                'id_despacho', 'direccion_entrega'
+            ).first()
+            if fila:
+                inicial = {
+                    'id_despacho_original': fila['id_despacho'],
+                    'direccion_entrega': fila['direccion_entrega'],
+                }
+        form = DespachoConReenvioForm(initial=inicial)
     
     return render(request, 'despacho/form_reenvio.html', {'form': form})
 
+@login_required
+@operadora_o_gerente
+def despacho_reenvio_cola(request):
+    """
+    Cola de reenvíos: despachos FALLIDO sin reenvío (ver reenvios.py).
+    Filtros GET: q, farmacia, desde, hasta. Paginación por cursor.
+    """
+    queryset = pendientes_de_reenvio().select_related('id_farmacia_origen', 'id_motorista')
+    queryset = filtrar_despachos(queryset, request.GET)
+    pagina = paginar_por_cursor(
+        queryset,
+        despues=decodificar_cursor(request.GET.get('despues')),
+        antes=decodificar_cursor(request.GET.get('antes')),
+        tamano=TAMANO_COLA,
+    )
+    
+    filtros = request.GET.copy()
+    for clave in ('despues', 'antes'):
+        filtros.pop(clave, None)
+    
+    farmacia = request.GET.get('farmacia', '')
+    return render(request, 'despacho/reenvio_cola.html', {
+        'despachos': pagina,
+        'page_obj': pagina,
+        'filtros_url': filtros.urlencode(),
+        'query': request.GET.get('q', ''),
+        'farmacia_filtro': farmacia,
+        'farmacia_etiqueta': FUENTES['farmacia'].etiquetas([farmacia]) if farmacia.isdigit() else [],
+        'desde_filtro': request.GET.get('desde', ''),
+        'hasta_filtro': request.GET.get('hasta', ''),
+    })
+
+@login_required
+@operadora_o_gerente
+@require_POST
+def despacho_lote(request):
+    """
+    Creación masiva de despachos (ver lotes.py).
+    Cuerpo JSON {"despachos": [...], "parcial": false, "simular": false}
+    o formulario multipart con `archivo` (.csv/.json) y los mismos indicadores.
+    Retorna JSON con los ids creados y los errores por fila.
+    """
+    try:
+        if 'archivo' in request.FILES:
+            archivo = request.FILES['archivo']
+            formato = archivo.name.rsplit('.', 1)[-1].lower()
+            filas = leer_lote(io.TextIOWrapper(archivo, encoding='utf-8-sig', newline=''), formato)
+            opciones = request.POST
+        else:
+            opciones = json.loads(request.body or b'{}')
+            if not isinstance(opciones, dict):
+                raise LoteInvalido('Se esperaba un objeto con la lista "despachos"')
+            filas = opciones.get('despachos', [])
+            if not isinstance(filas, list):
+                raise LoteInvalido('"despachos" debe ser una lista')
+    except (LoteInvalido, json.JSONDecodeError, UnicodeDecodeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    resultado = crear_lote(
+        filas,
+        usuario=request.user,
+        parcial=opciones.get('parcial') in (True, '1', 'true'),
+        simular=opciones.get('simular') in (True, '1', 'true'),
+    )
+    if resultado.aplicado:
+        logger.info(
+            f"Lote de despachos por {request.user.nombre_usuario}: "
+            f"{len(resultado.creados)} creados, {len(resultado.errores)} filas con errores"
+        )
+    return JsonResponse(resultado.como_dict(), status=200 if resultado.aplicado or not resultado.errores else 400)
+
 @login_required
 def despacho_update(request, pk):
     """Modificar despacho"""
@@ -523,12 +906,25 @@ def despacho_update(request, pk):
         return redirect('despacho_detail', pk=pk)
     
     if request.method == 'POST':
+        # Estado y versión leídos ahora (el ModelForm sobrescribe el estado al validar)
+        esperado, version_actual = despacho.estado, despacho.version
         form = ModificarDespachoForm(request.POST, instance=despacho)
         if form.is_valid():
-            despacho = form.save(commit=False)
-            if despacho.estado == 'FINALIZADO':
-                despacho.fecha_finalizacion = timezone.now()
-            despacho.save()
+            # El formulario se abrió con otra versión: sus datos iniciales ya no
+            # son los de la fila y guardar pisaría los cambios de otro usuario
+            if form.cleaned_data['version'] != version_actual:
+                messages.error(request, 'Otro usuario modificó el despacho mientras lo editabas; revisa los datos actuales')
+                return redirect('despacho_detail', pk=pk)
+            # Con la misma versión los valores iniciales del formulario son los
+            # que vio el usuario: changed_data es exactamente lo que editó
+            cambios = {
+                campo: form.cleaned_data[campo]
+                for campo in form.changed_data if campo not in ('estado', 'version')
+            }
+            if not transicionar(despacho, form.cleaned_data['estado'], esperado=esperado,
+                                version_esperada=version_actual, usuario=request.user, **cambios):
+                messages.error(request, 'Otro usuario modificó el despacho mientras lo editabas; revisa los datos actuales')
+                return redirect('despacho_detail', pk=pk)
             messages.success(request, 'Despacho modificado exitosamente')
             return redirect('despacho_detail', pk=pk)
     else:
@@ -551,10 +947,14 @@ def despacho_anular(request, pk):
     if request.method == 'POST':
         motivo = request.POST.get('motivo')
         
-        # Cambiar estado a CANCELADO
-        despacho.estado = 'CANCELADO'
-        despacho.observaciones = f"{despacho.observaciones or ''}\n[ANULADO] {motivo}".strip()
-        despacho.save()
+        if 'CANCELADO' not in TRANSICIONES[despacho.estado]:
+            messages.error(request, f'Un despacho {despacho.get_estado_display().lower()} no se puede anular')
+            return redirect('despacho_detail', pk=pk)
+        
+        # Cambiar estado a CANCELADO solo si nadie lo cambió mientras tanto
+        if not transicionar(despacho, 'CANCELADO', usuario=request.user, motivo=motivo):
+            messages.error(request, 'Otro usuario modificó el estado del despacho; revise los datos actuales')
+            return redirect('despacho_detail', pk=pk)
         
         messages.success(request, f'Despacho #{despacho.id_despacho} anulado exitosamente')
         return redirect('despacho_list')
@@ -562,6 +962,210 @@ def despacho_anular(request, pk):
     return render(request, 'despacho/anular.html', {'despacho': despacho})
 
 
+# ============= API JSON v1 =============
+
+def _api_error(mensaje, status, **extra):
+    return JsonResponse({'error': mensaje, **extra}, status=status)
+
+
+def _api_fila(definicion, campos, pk, status=200):
+    """Respuesta con una fila y su ETag (404 si no existe)"""
+    queryset = definicion.queryset()
+    etag = definicion.version_fila(queryset, campos, pk)
+    if etag is None:
+        return _api_error('No encontrado', 404)
+    response = JsonResponse(definicion.filas(queryset, campos, [pk])[0], status=status)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _api_no_modificado(etag):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+def _api_cuerpo(request):
+    """Cuerpo JSON (objeto) de la petición, o None si no es válido"""
+    try:
+        datos = json.loads(request.body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+@api_login_requerido
+def api_lista(request, recurso):
+    """
+    GET  /api/v1/<recurso>/?campos=a,b.c&despues=<id>&tamano=<n>&<filtros>
+         JSON {'resultados': [...], 'siguiente': id | null}, con ETag; 304 si
+         If-None-Match coincide (ver api.py)
+    POST /api/v1/despachos/ crea un despacho; el cuerpo es una fila con el
+         formato de lotes.py. Retorna 201 con el despacho creado.
+    """
+    definicion = RECURSOS.get(recurso)
+    if definicion is None:
+        return _api_error('Recurso desconocido', 404)
+    if request.method == 'POST' and recurso == 'despachos':
+        return _api_crear_despacho(request, definicion)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET', 'POST'] if recurso == 'despachos' else ['GET'])
+
+    despues = request.GET.get('despues', '')
+    tamano = request.GET.get('tamano', '')
+    tamano = min(int(tamano), MAX_TAMANO_PAGINA) if tamano.isdigit() and int(tamano) > 0 else TAMANO_PAGINA
+    try:
+        campos = definicion.elegir(request.GET.get('campos'))
+        queryset = definicion.filtrar(definicion.queryset(), request.GET)
+        etag, claves, siguiente = definicion.version_pagina(
+            queryset, campos, despues=int(despues) if despues.isdigit() else None, tamano=tamano
+        )
+    except CampoInvalido as e:
+        return _api_error(str(e), 400)
+    except (ValueError, ValidationError):
+        return _api_error('Filtro inválido', 400)
+
+    if etag_coincide(request.headers.get('If-None-Match'), etag):
+        return _api_no_modificado(etag)
+    response = JsonResponse({'resultados': definicion.filas(queryset, campos, claves), 'siguiente': siguiente})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_login_requerido
+def api_detalle(request, recurso, pk):
+    """
+    GET    /api/v1/<recurso>/<id>/?campos=...  fila con ETag; 304 si no cambió
+    PATCH  /api/v1/despachos/<id>/  estado, motorista, moto, direccion_entrega,
+           observaciones (mismas reglas que despacho_update)
+    DELETE /api/v1/despachos/<id>/  anula el despacho (solo gerentes; no lo borra)
+    PATCH y DELETE aceptan If-Match con el ETag de la misma URL: si el
+    despacho cambió responden 412 sin modificarlo.
+    """
+    definicion = RECURSOS.get(recurso)
+    if definicion is None:
+        return _api_error('Recurso desconocido', 404)
+    permitidos = ['GET', 'PATCH', 'DELETE'] if recurso == 'despachos' else ['GET']
+    if request.method not in permitidos:
+        return HttpResponseNotAllowed(permitidos)
+    try:
+        campos = definicion.elegir(request.GET.get('campos'))
+    except CampoInvalido as e:
+        return _api_error(str(e), 400)
+
+    etag, version = definicion.etag_y_version(definicion.queryset(), campos, pk)
+    if etag is None:
+        return _api_error('No encontrado', 404)
+    if request.method == 'GET':
+        if etag_coincide(request.headers.get('If-None-Match'), etag):
+            return _api_no_modificado(etag)
+        return _api_fila(definicion, campos, pk)
+
+    # Con If-Match la versión leída junto con el ETag es la condición del
+    # UPDATE: un cambio posterior a esta comprobación también da 412
+    si_coincide = request.headers.get('If-Match')
+    if si_coincide and not etag_coincide(si_coincide, etag):
+        return _api_error('El despacho cambió; vuelva a consultarlo', 412)
+    despacho = Despacho.objects.filter(id_despacho=pk).first()
+    if despacho is None:  # se borró después de leer el ETag
+        return _api_error('No encontrado', 404)
+    condicion = (version, 412) if si_coincide else (despacho.version, 409)
+    if request.method == 'PATCH':
+        return _api_modificar_despacho(request, definicion, campos, despacho, *condicion)
+    return _api_anular_despacho(request, definicion, campos, despacho, *condicion)
+
+
+@api_login_requerido
+def api_cambios(request):
+    """
+    GET /api/v1/cambios/?desde=<cursor>
+    Cambios de despachos, incidencias y asignaciones y lápidas de borrados
+    posteriores al cursor (ver cambios.py), en NDJSON: una línea por cambio y
+    al final {"cursor": ..., "mas": ...}. Sin cursor entrega todo; con `mas`
+    el cliente repite con el cursor recibido. 410 si el cursor es anterior a
+    las lápidas conservadas (sincronizar desde cero).
+    """
+    try:
+        lineas = cambios_desde(decodificar_posiciones(request.GET.get('desde')))
+    except CursorInvalido as e:
+        return _api_error(str(e), 400)
+    except CursorVencido as e:
+        return _api_error(str(e), 410)
+
+    def generar():
+        for linea in lineas:
+            yield json.dumps(linea, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+    response = StreamingHttpResponse(generar(), content_type='application/x-ndjson; charset=utf-8')
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def _api_crear_despacho(request, definicion):
+    if not usuario_puede_crear_despacho(request.user):
+        return _api_error('No tienes permisos para crear despachos', 403)
+    fila = _api_cuerpo(request)
+    if fila is None:
+        return _api_error('Se esperaba un objeto JSON con los campos del despacho', 400)
+
+    resultado = crear_lote([fila], usuario=request.user)
+    if not resultado.aplicado:
+        return _api_error('Datos inválidos', 400, errores=resultado.errores.get(1, []))
+    pk = resultado.creados[0]
+    logger.info(f"Despacho #{pk} creado por API por {request.user.nombre_usuario}")
+    response = _api_fila(definicion, definicion.elegir(request.GET.get('campos')), pk, status=201)
+    response['Location'] = reverse('api_detalle', args=['despachos', pk])
+    return response
+
+
+def _api_modificar_despacho(request, definicion, campos, despacho, version, status_conflicto):
+    if not usuario_puede_modificar_despacho(request.user, despacho):
+        return _api_error('No tienes permisos para modificar este despacho', 403)
+    if despacho.estado in ['FINALIZADO', 'CANCELADO']:
+        return _api_error('No se puede modificar un despacho finalizado o cancelado', 409)
+    datos = _api_cuerpo(request)
+    if datos is None:
+        return _api_error('Se esperaba un objeto JSON con los campos a modificar', 400)
+    if datos.get('estado') == 'CANCELADO' and not usuario_puede_anular_despacho(request.user):
+        return _api_error('No tienes permisos para anular despachos', 403)
+
+    # Los campos omitidos conservan su valor; se valida con el mismo formulario que la vista HTML
+    esperado = despacho.estado
+    form = ModificarDespachoForm({
+        'id_motorista': datos.get('motorista', despacho.id_motorista_id),
+        'id_moto': datos.get('moto', despacho.id_moto_id),
+        'direccion_entrega': datos.get('direccion_entrega', despacho.direccion_entrega),
+        'estado': datos.get('estado', despacho.estado),
+        'observaciones': datos.get('observaciones', despacho.observaciones) or '',
+        'version': version,
+    }, instance=despacho)
+    if not form.is_valid():
+        return _api_error('Datos inválidos', 400, errores=form.errors.get_json_data())
+
+    cambios = {
+        campo: form.cleaned_data[campo]
+        for campo in form.changed_data if campo not in ('estado', 'version')
+    }
+    if not transicionar(despacho, form.cleaned_data['estado'], esperado=esperado, version_esperada=version,
+                        usuario=request.user, motivo=datos.get('motivo'), **cambios):
+        return _api_error('Otro usuario modificó el despacho; vuelva a consultarlo', status_conflicto)
+    return _api_fila(definicion, campos, despacho.id_despacho)
+
+
+def _api_anular_despacho(request, definicion, campos, despacho, version, status_conflicto):
+    if not usuario_puede_anular_despacho(request.user):
+        return _api_error('No tienes permisos para anular despachos', 403)
+    if 'CANCELADO' not in TRANSICIONES[despacho.estado]:
+        return _api_error(f'Un despacho {despacho.get_estado_display().lower()} no se puede anular', 409)
+    motivo = (_api_cuerpo(request) or {}).get('motivo') or request.GET.get('motivo')
+    if not transicionar(despacho, 'CANCELADO', version_esperada=version, usuario=request.user, motivo=motivo):
+        return _api_error('Otro usuario modificó el despacho; vuelva a consultarlo', status_conflicto)
+    logger.info(f"Despacho #{despacho.id_despacho} anulado por API por {request.user.nombre_usuario}")
+    return _api_fila(definicion, campos, despacho.id_despacho)
+
+
 # ============= REPORTES =============
 
 @login_required
@@ -574,31 +1178,18 @@ def reporte_diario(request):
     else:
         fecha_obj = timezone.now().date()
     
-    # Despachos del día
-    despachos = Despacho.objects.filter(fecha_creacion__date=fecha_obj)
-    
-    # Estadísticas
-    total_despachos = despachos.count()
-    despachos_por_estado = despachos.values('estado').annotate(total=Count('id_despacho'))
-    despachos_por_tipo = despachos.values('id_tipo_despacho__nombre_tipo').annotate(total=Count('id_despacho'))
+    # Estadísticas del día
+    reporte = construir_reporte(fecha_obj, fecha_obj)
     
-    # Despachos por región
-    despachos_por_region = despachos.values(
-        'id_farmacia_origen__id_comuna__id_region__nombre_region'
-    ).annotate(total=Count('id_despacho'))
-    
-    # Total de incidencias
-    total_incidencias = Incidencia.objects.filter(
-        id_despacho__fecha_creacion__date=fecha_obj
-    ).count()
+    # Últimos despachos del día
+    inicio, fin = rango_dia(fecha_obj)
+    despachos = Despacho.objects.filter(
+        fecha_creacion__gte=inicio, fecha_creacion__lt=fin
+    ).select_related('id_tipo_despacho', 'id_motorista')
     
     context = {
         'fecha': fecha_obj,
-        'total_despachos': total_despachos,
-        'despachos_por_estado': despachos_por_estado,
-        'despachos_por_tipo': despachos_por_tipo,
-        'despachos_por_region': despachos_por_region,
-        'total_incidencias': total_incidencias,
+        **reporte,
         'despachos': despachos[:10],  # Últimos 10
     }
     
@@ -616,43 +1207,18 @@ def reporte_mensual(request):
         fecha_obj = timezone.now().date()
     
     # Primer y último día del mes
-    primer_dia = fecha_obj.replace(day=1)
-    if fecha_obj.month == 12:
-        ultimo_dia = fecha_obj.replace(year=fecha_obj.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        ultimo_dia = fecha_obj.replace(month=fecha_obj.month + 1, day=1) - timedelta(days=1)
+    primer_dia, ultimo_dia = limites_mes(fecha_obj)
     
-    # Despachos del mes
-    despachos = Despacho.objects.filter(
-        fecha_creacion__date__gte=primer_dia,
-        fecha_creacion__date__lte=ultimo_dia
-    )
-    
-    # Estadísticas
-    total_despachos = despachos.count()
-    despachos_por_estado = despachos.values('estado').annotate(total=Count('id_despacho'))
-    despachos_por_tipo = despachos.values('id_tipo_despacho__nombre_tipo').annotate(total=Count('id_despacho'))
-    
-    # Despachos por región
-    despachos_por_region = despachos.values(
-        'id_farmacia_origen__id_comuna__id_region__nombre_region'
-    ).annotate(total=Count('id_despacho'))
-    
-    # Total de incidencias
-    total_incidencias = Incidencia.objects.filter(
-        id_despacho__fecha_creacion__date__gte=primer_dia,
-        id_despacho__fecha_creacion__date__lte=ultimo_dia
-    ).count()
+    # Estadísticas del mes
+    reporte = construir_reporte(primer_dia, ultimo_dia)
     
     context = {
         'fecha': fecha_obj,
         'primer_dia': primer_dia,
         'ultimo_dia': ultimo_dia,
-        'total_despachos': total_despachos,
-        'despachos_por_estado': despachos_por_estado,
-        'despachos_por_tipo': despachos_por_tipo,
-        'despachos_por_region': despachos_por_region,
-        'total_incidencias': total_incidencias,
+        **reporte,
+        'tiempos_entrega': tiempos_por_dimension(primer_dia, ultimo_dia),
+        'filas_tiempos': FILAS_REPORTE,
     }
     
     return render(request, 'despacho/reporte_mensual.html', context)
@@ -684,45 +1250,29 @@ def generar_pdf_reporte(request):
     
     if tipo_reporte == 'diario':
         title = f"Reporte Diario de Despachos - {fecha.strftime('%d/%m/%Y')}"
-        despachos = Despacho.objects.filter(fecha_creacion__date=fecha)
+        desde = hasta = fecha
     else:
-        primer_dia = fecha.replace(day=1)
-        if fecha.month == 12:
-            ultimo_dia = fecha.replace(year=fecha.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            ultimo_dia = fecha.replace(month=fecha.month + 1, day=1) - timedelta(days=1)
+        desde, hasta = limites_mes(fecha)
         title = f"Reporte Mensual - {fecha.strftime('%B %Y')}"
-        despachos = Despacho.objects.filter(
-            fecha_creacion__date__gte=primer_dia,
-            fecha_creacion__date__lte=ultimo_dia
-        )
+    reporte = construir_reporte(desde, hasta)
     
     elements.append(Paragraph(title, title_style))
     elements.append(Spacer(1, 0.5*inch))
     
     # Estadísticas generales
     data = [['Métrica', 'Valor']]
-    data.append(['Total Despachos', str(despachos.count())])
+    data.append(['Total Despachos', str(reporte['total_despachos'])])
     
     # Por estado
-    for estado in Despacho.ESTADO_CHOICES:
-        count = despachos.filter(estado=estado[0]).count()
-        data.append([f'  {estado[1]}', str(count)])
+    for item in reporte['por_estado']:
+        data.append([f"  {item['nombre']}", str(item['total'])])
     
     # Por tipo
-    for tipo in TipoDespacho.objects.all():
-        count = despachos.filter(id_tipo_despacho=tipo).count()
-        data.append([f'  {tipo.nombre_tipo}', str(count)])
+    for item in reporte['por_tipo']:
+        data.append([f"  {item['nombre']}", str(item['total'])])
     
     # Incidencias
-    if tipo_reporte == 'diario':
-        incidencias = Incidencia.objects.filter(id_despacho__fecha_creacion__date=fecha)
-    else:
-        incidencias = Incidencia.objects.filter(
-            id_despacho__fecha_creacion__date__gte=primer_dia,
-            id_despacho__fecha_creacion__date__lte=ultimo_dia
-        )
-    data.append(['Total Incidencias', str(incidencias.count())])
+    data.append(['Total Incidencias', str(reporte['total_incidencias'])])
     
     # Crear tabla
     table = Table(data, colWidths=[4*inch, 2*inch])
@@ -739,6 +1289,29 @@ def generar_pdf_reporte(request):
     
     elements.append(table)
     
+    # Tiempos de entrega (minutos) de los despachos finalizados
+    for tiempos in tiempos_por_dimension(desde, hasta):
+        if not tiempos['filas']:
+            continue
+        elements.append(Spacer(1, 0.3*inch))
+        elements.append(Paragraph(f"Tiempos de Entrega por {tiempos['titulo']} (minutos)", styles['Heading3']))
+        data = [[tiempos['titulo'], 'Despachos', 'Promedio', 'p50', 'p90', 'p99']]
+        for fila in tiempos['filas'][:FILAS_REPORTE]:
+            data.append([
+                Paragraph(str(fila['nombre']), styles['Normal']), str(fila['total']),
+                str(fila['promedio']), str(fila['p50']), str(fila['p90']), str(fila['p99']),
+            ])
+        table = Table(data, colWidths=[2.5*inch] + [0.8*inch] * 5)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+        ]))
+        elements.append(table)
+    
     # Construir PDF
     doc.build(elements)
     
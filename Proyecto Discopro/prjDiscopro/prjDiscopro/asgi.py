@@ -3,6 +3,10 @@ ASGI config for prjDiscopro project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Además de las vistas normales sirve el tablero de despachos en vivo
+(Server-Sent Events, AppDiscopro/tablero.py), que no funciona bajo WSGI:
+    uvicorn prjDiscopro.asgi:application --workers 2
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
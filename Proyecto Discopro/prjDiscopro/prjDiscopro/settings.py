@@ -31,9 +31,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'AppDiscopro.sesiones.RenovarSesionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'AppDiscopro.autenticacion.RolSesionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -51,14 +53,23 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'AppDiscopro.autenticacion.permisos_rol',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'prjDiscopro.wsgi.application'
+# El tablero de despachos en vivo (SSE, AppDiscopro/tablero.py) necesita el
+# servidor ASGI, p. ej.: uvicorn prjDiscopro.asgi:application
+ASGI_APPLICATION = 'prjDiscopro.asgi.application'
+# Broker que reparte los eventos del tablero a las conexiones del proceso
+TABLERO_BROKER = os.getenv('TABLERO_BROKER', 'AppDiscopro.tablero.BrokerLocal')
 
 # Database
+# Conexiones persistentes (variables en .env):
+#   DB_CONN_MAX_AGE        segundos que se reutiliza una conexión (0 = cerrar en cada request)
+#   DB_CONN_HEALTH_CHECKS  verifica la conexión persistente antes de reutilizarla
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -67,6 +78,8 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', '3030'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '3306'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',
@@ -81,6 +94,9 @@ DATABASES = {
 # quieres autenticar con este modelo.
 AUTH_USER_MODEL = 'AppDiscopro.usuariopersonalizado'
 
+# Carga el usuario de la sesión junto con su rol (una sola consulta)
+AUTHENTICATION_BACKENDS = ['AppDiscopro.autenticacion.BackendUsuarioConRol']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -131,7 +147,14 @@ SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False') == 'True'
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_AGE = 3600 * 4  # 4 horas
-SESSION_SAVE_EVERY_REQUEST = True
+# No se guarda la sesión en cada request: RenovarSesionMiddleware
+# (AppDiscopro/sesiones.py) extiende la expiración solo cuando le quedan
+# menos de SESSION_RENOVAR_SI_QUEDAN segundos de vida.
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_RENOVAR_SI_QUEDAN = int(os.getenv('SESSION_RENOVAR_SI_QUEDAN', str(3600 * 3)))
+# cached_db: lecturas desde caché con respaldo en BD
+# signed_cookies: sin escrituras en BD (la sesión viaja en la cookie firmada)
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
 
 # Seguridad adicional
 SECURE_BROWSER_XSS_FILTER = True
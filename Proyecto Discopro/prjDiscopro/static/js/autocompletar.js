@@ -0,0 +1,130 @@
+/*
+ * Selectores con autocompletado (forms.AutocompletarSelect)
+ *
+ * El <select data-autocompletar data-url="..."> llega solo con la opción
+ * seleccionada. Debajo se agrega un campo de búsqueda que consulta la vista
+ * autocompletar (con espera de 250 ms y paginación por el cursor
+ * `siguiente`); al elegir un resultado se agrega como opción del select y
+ * queda seleccionado, así el formulario se envía igual que antes.
+ *
+ * Otros scripts deben seleccionar valores con
+ *   Autocompletar.seleccionar(select, id, texto)
+ * que agrega la opción si no existe (si no se da texto, lo pide a la vista).
+ */
+(function () {
+    'use strict';
+
+    var ESPERA_MS = 250;
+
+    function pedir(select, params) {
+        return fetch(select.dataset.url + '?' + params.toString(), {
+            headers: {'X-Requested-With': 'XMLHttpRequest'},
+            credentials: 'same-origin'
+        }).then(function (respuesta) { return respuesta.json(); });
+    }
+
+    function seleccionar(select, id, texto) {
+        var valor = String(id);
+        var opcion = Array.prototype.find.call(select.options, function (o) { return o.value === valor; });
+        if (!opcion) {
+            opcion = new Option(texto || valor, valor);
+            select.add(opcion);
+            if (!texto && select.dataset.url) {
+                pedir(select, new URLSearchParams({id: valor})).then(function (datos) {
+                    if (datos.resultados.length) { opcion.text = datos.resultados[0].texto; }
+                });
+            }
+        }
+        select.value = valor;
+        select.dispatchEvent(new Event('change', {bubbles: true}));
+    }
+
+    function iniciar(select) {
+        var contenedor = document.createElement('div');
+        contenedor.className = 'position-relative mt-1';
+        var texto = document.createElement('input');
+        texto.type = 'search';
+        texto.className = 'form-control form-control-sm';
+        texto.placeholder = 'Buscar...';
+        texto.autocomplete = 'off';
+        var lista = document.createElement('div');
+        lista.className = 'list-group position-absolute w-100 shadow-sm';
+        lista.style.zIndex = 1050;
+        lista.style.maxHeight = '18rem';
+        lista.style.overflowY = 'auto';
+        lista.hidden = true;
+        contenedor.appendChild(texto);
+        contenedor.appendChild(lista);
+        select.insertAdjacentElement('afterend', contenedor);
+
+        var siguiente = null;
+        var temporizador = null;
+        var peticion = 0;
+
+        function boton(etiqueta, clase, alHacerClic) {
+            var elemento = document.createElement('button');
+            elemento.type = 'button';
+            elemento.className = 'list-group-item list-group-item-action ' + clase;
+            elemento.textContent = etiqueta;
+            // mousedown para que el blur del campo no oculte la lista antes del clic
+            elemento.addEventListener('mousedown', function (evento) {
+                evento.preventDefault();
+                alHacerClic();
+            });
+            return elemento;
+        }
+
+        function cargar(agregar) {
+            var params = new URLSearchParams();
+            params.set('q', texto.value.trim());
+            if (agregar && siguiente !== null) {
+                params.set('despues', siguiente);
+            }
+            var numero = ++peticion;
+            pedir(select, params).then(function (datos) {
+                // Ignorar respuestas de búsquedas ya reemplazadas
+                if (numero !== peticion) { return; }
+                var mas = lista.querySelector('[data-autocompletar-mas]');
+                if (!agregar) { lista.innerHTML = ''; }
+                if (mas) { mas.remove(); }
+                datos.resultados.forEach(function (resultado) {
+                    lista.appendChild(boton(resultado.texto, 'small', function () {
+                        seleccionar(select, resultado.id, resultado.texto);
+                        texto.value = '';
+                        lista.hidden = true;
+                    }));
+                });
+                siguiente = datos.siguiente;
+                if (siguiente !== null) {
+                    var cargarMas = boton('Cargar más', 'small text-center text-primary', function () { cargar(true); });
+                    cargarMas.setAttribute('data-autocompletar-mas', '');
+                    lista.appendChild(cargarMas);
+                }
+                if (!lista.children.length) {
+                    var vacio = document.createElement('div');
+                    vacio.className = 'list-group-item small text-muted';
+                    vacio.textContent = 'Sin resultados';
+                    lista.appendChild(vacio);
+                }
+                lista.hidden = false;
+            });
+        }
+
+        texto.addEventListener('input', function () {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(function () { cargar(false); }, ESPERA_MS);
+        });
+        texto.addEventListener('focus', function () { cargar(false); });
+        texto.addEventListener('blur', function () { lista.hidden = true; });
+        texto.addEventListener('keydown', function (evento) {
+            // Enter no debe enviar el formulario desde la búsqueda
+            if (evento.key === 'Enter') { evento.preventDefault(); }
+        });
+    }
+
+    window.Autocompletar = {seleccionar: seleccionar};
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocompletar]').forEach(iniciar);
+    });
+})();
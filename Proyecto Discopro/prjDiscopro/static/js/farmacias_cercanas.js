@@ -0,0 +1,73 @@
+/*
+ * Farmacias cercanas en el formulario de despacho con traslado
+ *
+ * Al elegir la farmacia de origen (select name="id_farmacia_origen") pide a
+ * la vista farmacia_cercanas las farmacias más próximas y las muestra en el
+ * panel [data-farmacias-cercanas]. Al hacer clic en una se selecciona como
+ * farmacia secundaria (id_farmacia_origen_secundaria).
+ */
+(function () {
+    'use strict';
+
+    function describir(farmacia) {
+        var partes = [farmacia.distancia_km + ' km'];
+        if (farmacia.horario_apertura && farmacia.horario_cierre) {
+            partes.push(farmacia.horario_apertura + ' - ' + farmacia.horario_cierre);
+        }
+        return partes.join(' · ');
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var panel = document.querySelector('[data-farmacias-cercanas]');
+        var origen = document.querySelector('[name="id_farmacia_origen"]');
+        var secundaria = document.querySelector('[name="id_farmacia_origen_secundaria"]');
+        if (!panel || !origen || !secundaria) { return; }
+        var lista = panel.querySelector('[data-farmacias-cercanas-lista]');
+        var abiertas = panel.querySelector('[data-farmacias-cercanas-abiertas]');
+
+        function cargar() {
+            if (!origen.value) {
+                panel.hidden = true;
+                return;
+            }
+            var url = panel.dataset.url + '?farmacia=' + encodeURIComponent(origen.value) +
+                (abiertas.checked ? '&abiertas=1' : '');
+            fetch(url, {
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+                credentials: 'same-origin'
+            })
+                .then(function (respuesta) { return respuesta.json(); })
+                .then(function (datos) {
+                    lista.innerHTML = '';
+                    datos.farmacias.forEach(function (farmacia) {
+                        var boton = document.createElement('button');
+                        boton.type = 'button';
+                        boton.className = 'list-group-item list-group-item-action';
+                        boton.textContent = farmacia.codigo_farmacia + ' - ' + farmacia.nombre;
+                        var detalle = document.createElement('small');
+                        detalle.className = 'd-block text-muted';
+                        detalle.textContent = describir(farmacia);
+                        boton.appendChild(detalle);
+                        boton.addEventListener('click', function () {
+                            var texto = farmacia.codigo_farmacia + ' - ' + farmacia.nombre;
+                            if (window.Autocompletar) {
+                                window.Autocompletar.seleccionar(secundaria, farmacia.codigo_farmacia, texto);
+                                return;
+                            }
+                            secundaria.value = farmacia.codigo_farmacia;
+                            secundaria.dispatchEvent(new Event('change', {bubbles: true}));
+                        });
+                        lista.appendChild(boton);
+                    });
+                    panel.hidden = false;
+                    if (datos.farmacias.length === 0) {
+                        lista.innerHTML = '<div class="list-group-item text-muted small">Sin farmacias cercanas con ubicación registrada</div>';
+                    }
+                });
+        }
+
+        origen.addEventListener('change', cargar);
+        abiertas.addEventListener('change', cargar);
+        cargar();
+    });
+})();
@@ -0,0 +1,80 @@
+/*
+ * Recomendación de motoristas en los formularios de despacho
+ *
+ * Al elegir la farmacia de origen (select name="id_farmacia_origen") pide a
+ * la vista despacho_recomendar los mejores candidatos y los muestra en el
+ * panel [data-recomendaciones]. Al hacer clic en uno se completan los campos
+ * id_motorista e id_moto del formulario (vía Autocompletar.seleccionar si el
+ * selector tiene autocompletado).
+ */
+(function () {
+    'use strict';
+
+    function describir(candidato) {
+        var partes = [candidato.asignado ? 'asignado a la farmacia' : 'no asignado'];
+        partes.push(candidato.carga + ' en curso');
+        if (candidato.distancia_km !== null && !candidato.asignado) {
+            partes.push(candidato.distancia_km + ' km');
+        }
+        partes.push(candidato.tiene_moto ? 'con moto' : 'sin moto');
+        return partes.join(' · ');
+    }
+
+    function asignar(select, valor, texto) {
+        // Los selectores con autocompletado solo traen la opción seleccionada
+        if (window.Autocompletar) {
+            window.Autocompletar.seleccionar(select, valor, texto);
+            return;
+        }
+        select.value = valor;
+        select.dispatchEvent(new Event('change', {bubbles: true}));
+    }
+
+    function elegir(formulario, candidato) {
+        var motorista = formulario.querySelector('[name="id_motorista"]');
+        var moto = formulario.querySelector('[name="id_moto"]');
+        asignar(motorista, candidato.codigo_motorista, candidato.nombre);
+        if (moto && candidato.codigo_moto !== null) {
+            asignar(moto, candidato.codigo_moto, null);
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var panel = document.querySelector('[data-recomendaciones]');
+        var farmacia = document.querySelector('[name="id_farmacia_origen"]');
+        if (!panel || !farmacia) { return; }
+        var lista = panel.querySelector('[data-recomendaciones-lista]');
+        var formulario = farmacia.form;
+
+        function cargar() {
+            if (!farmacia.value) {
+                panel.hidden = true;
+                return;
+            }
+            fetch(panel.dataset.url + '?farmacia=' + encodeURIComponent(farmacia.value), {
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+                credentials: 'same-origin'
+            })
+                .then(function (respuesta) { return respuesta.json(); })
+                .then(function (datos) {
+                    lista.innerHTML = '';
+                    datos.recomendaciones.forEach(function (candidato) {
+                        var boton = document.createElement('button');
+                        boton.type = 'button';
+                        boton.className = 'list-group-item list-group-item-action';
+                        boton.textContent = candidato.codigo_motorista + ' - ' + candidato.nombre;
+                        var detalle = document.createElement('small');
+                        detalle.className = 'd-block text-muted';
+                        detalle.textContent = describir(candidato);
+                        boton.appendChild(detalle);
+                        boton.addEventListener('click', function () { elegir(formulario, candidato); });
+                        lista.appendChild(boton);
+                    });
+                    panel.hidden = datos.recomendaciones.length === 0;
+                });
+        }
+
+        farmacia.addEventListener('change', cargar);
+        cargar();
+    });
+})();
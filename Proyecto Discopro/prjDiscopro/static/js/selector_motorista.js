@@ -0,0 +1,77 @@
+/*
+ * Selector asíncrono de motoristas
+ *
+ * Marcado esperado:
+ *   <div data-selector-motorista data-url="{% url 'motorista_buscar' %}"
+ *        data-excluir-farmacia="123">
+ *       <input type="search" data-selector-texto>
+ *       <select name="motorista_id" size="8" data-selector-lista required></select>
+ *       <button type="button" data-selector-mas>Cargar más</button>
+ *   </div>
+ *
+ * Los resultados se piden a medida que se escribe (con espera de 250 ms) y se
+ * paginan con el cursor `siguiente` que retorna la vista motorista_buscar.
+ * Si el selector está dentro de un modal, se carga al abrirlo.
+ */
+(function () {
+    'use strict';
+
+    var ESPERA_MS = 250;
+
+    function iniciarSelector(contenedor) {
+        var texto = contenedor.querySelector('[data-selector-texto]');
+        var lista = contenedor.querySelector('[data-selector-lista]');
+        var botonMas = contenedor.querySelector('[data-selector-mas]');
+        var siguiente = null;
+        var temporizador = null;
+        var peticion = 0;
+
+        function cargar(agregar) {
+            var params = new URLSearchParams();
+            params.set('q', texto.value.trim());
+            if (contenedor.dataset.excluirFarmacia) {
+                params.set('excluir_farmacia', contenedor.dataset.excluirFarmacia);
+            }
+            if (agregar && siguiente !== null) {
+                params.set('despues', siguiente);
+            }
+            var numero = ++peticion;
+
+            fetch(contenedor.dataset.url + '?' + params.toString(), {
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+                credentials: 'same-origin'
+            })
+                .then(function (respuesta) { return respuesta.json(); })
+                .then(function (datos) {
+                    // Ignorar respuestas de búsquedas ya reemplazadas
+                    if (numero !== peticion) { return; }
+                    if (!agregar) { lista.innerHTML = ''; }
+                    datos.resultados.forEach(function (motorista) {
+                        lista.add(new Option(motorista.texto, motorista.id));
+                    });
+                    siguiente = datos.siguiente;
+                    botonMas.hidden = siguiente === null;
+                });
+        }
+
+        texto.addEventListener('input', function () {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(function () { cargar(false); }, ESPERA_MS);
+        });
+        botonMas.addEventListener('click', function () { cargar(true); });
+
+        var modal = contenedor.closest('.modal');
+        if (modal) {
+            modal.addEventListener('show.bs.modal', function () {
+                texto.value = '';
+                cargar(false);
+            });
+        } else {
+            cargar(false);
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('[data-selector-motorista]').forEach(iniciarSelector);
+    });
+})();
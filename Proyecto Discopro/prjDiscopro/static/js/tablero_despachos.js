@@ -0,0 +1,71 @@
+/*
+ * Listado de despachos en vivo (vista despacho_tablero_eventos, SSE)
+ *
+ * La tabla <tbody data-tablero data-url="..."> abre un EventSource. Cada
+ * evento trae {id, despacho, anterior, estado, estado_display, ...}:
+ *  - si la fila del despacho está en la página, se actualiza el badge de
+ *    estado (y se quita "Editar" al llegar a un estado final);
+ *  - si es un despacho nuevo (anterior == null), se cuenta en el aviso
+ *    "despachos nuevos" con el enlace para recargar.
+ * El evento `recargar` (conexión atrasada) muestra el mismo aviso. Al
+ * reconectar, el navegador envía Last-Event-ID y el servidor reenvía lo
+ * perdido. Sin servidor ASGI la vista responde 503 y no se reintenta.
+ */
+(function () {
+    'use strict';
+
+    var CLASES = {
+        CREADO: 'bg-secondary',
+        ASIGNADO: 'bg-info',
+        EN_CURSO: 'bg-warning',
+        FINALIZADO: 'bg-success',
+        CANCELADO: 'bg-dark',
+        FALLIDO: 'bg-danger'
+    };
+    var FINALES = ['FINALIZADO', 'CANCELADO'];
+
+    var cuerpo = document.querySelector('tbody[data-tablero]');
+    if (!cuerpo || !window.EventSource) { return; }
+
+    var aviso = document.getElementById('tablero-aviso');
+    var nuevos = 0;
+
+    function mostrarAviso(texto) {
+        if (!aviso) { return; }
+        aviso.querySelector('[data-texto]').textContent = texto;
+        aviso.classList.remove('d-none');
+    }
+
+    function actualizarFila(evento) {
+        var fila = cuerpo.querySelector('tr[data-despacho="' + evento.despacho + '"]');
+        if (!fila) { return; }
+        var badge = fila.querySelector('[data-estado] .badge');
+        if (badge) {
+            badge.className = 'badge ' + (CLASES[evento.estado] || 'bg-secondary');
+            badge.textContent = evento.estado_display;
+        }
+        if (FINALES.indexOf(evento.estado) !== -1) {
+            var editar = fila.querySelector('[data-editar]');
+            if (editar) { editar.remove(); }
+        }
+        fila.classList.add('table-active');
+        setTimeout(function () { fila.classList.remove('table-active'); }, 2000);
+    }
+
+    var fuente = new EventSource(cuerpo.dataset.url);
+
+    fuente.onmessage = function (mensaje) {
+        var evento = JSON.parse(mensaje.data);
+        if (evento.anterior === null) {
+            nuevos += 1;
+            mostrarAviso(nuevos === 1 ? '1 despacho nuevo' : nuevos + ' despachos nuevos');
+        } else {
+            actualizarFila(evento);
+        }
+    };
+
+    fuente.addEventListener('recargar', function () {
+        fuente.close();
+        mostrarAviso('Hay cambios pendientes en el listado');
+    });
+})();